@@ -0,0 +1,284 @@
+#!/usr/bin/env python
+"""Benchmarks of the re-numbering tool on synthetic render folders.
+
+Folders are generated on tmpfs (/dev/shm) when available, with several
+sequences per folder, mixed paddings and the supported extensions. Every
+case is timed per folder size and the results are written to JSON, so runs
+of two commits can be compared:
+
+    python benchmarks/bench_renumber.py --output before.json
+    python benchmarks/bench_renumber.py --output after.json --baseline before.json
+
+Cases:
+    scan            scan_sequences of the folder, without cache
+    scan_cached     scan_sequences with a warm scan cache
+    preview         plans and frame reports shown by the GUI and the dry run
+    rename_cli      rename_files of renumber_tool_cmd
+    rename_gui      renumber_folder of the GUI, skipped without Qt
+    rename_latency  execute_plans with a delay added to every rename, to
+                    mimic network storage, with 1 and --latency-jobs threads
+"""
+# Built-in
+import argparse
+import contextlib
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from importlib.machinery import SourceFileLoader
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, REPO_ROOT)
+
+# Journals and the scan cache of the runs stay in the benchmark folder
+# rather than in the cache of the user. Set before the imports below.
+BENCH_ROOT = tempfile.mkdtemp(prefix='renumber_bench_',
+                              dir='/dev/shm' if os.path.isdir('/dev/shm') else None)
+os.environ['XDG_CACHE_HOME'] = os.path.join(BENCH_ROOT, 'cache')
+
+from renumber_images_tool.core.cache import ScanCache
+from renumber_images_tool.core.executor import delayed_rename, execute_plans
+from renumber_images_tool.core.planner import plan_sequences
+from renumber_images_tool.core.report import report_plans
+from renumber_images_tool.core.scanner import SUPPORTED_EXT, scan_sequences
+
+try:
+    from renumber_images_tool.ui import renumber_images as ui
+except ImportError:
+    ui = None
+
+# =============================================================================
+# GLOBALS
+# =============================================================================
+CLI_PATH = os.path.join(REPO_ROOT, 'renumber_images_tool', 'bin', 'renumber_tool_cmd')
+
+SIZES = [1000, 10000, 100000, 1000000]
+SEQUENCES_PER_FOLDER = 4
+
+# Read-only cases run REPEAT times and keep the best time.
+REPEAT = 3
+
+# Seconds added to every rename in latency mode, and the largest folder
+# timed with it: 10k frames at 1ms is 10s on one thread.
+LATENCY = 0.001
+LATENCY_MAX_FRAMES = 10000
+LATENCY_JOBS = 16
+
+# A case regresses when it is THRESHOLD slower than the baseline and at
+# least MIN_DELTA seconds slower, so millisecond noise is not reported.
+THRESHOLD = 0.2
+MIN_DELTA = 0.005
+
+
+# =============================================================================
+# FUNCTIONS
+# =============================================================================
+def frame_name(index, frame):
+    """Mixed paddings: 4 digits, unpadded, and 4 digits with every 7th
+    frame unpadded, e.g. shot02_beauty.0005.png, shot02_beauty.7.png
+    """
+    style = index % 3
+    if style == 0 or (style == 2 and frame % 7):
+        return '%04d' % frame
+    return str(frame)
+
+
+def make_folder(frames, sequences=SEQUENCES_PER_FOLDER):
+    """Create a folder of empty frames split into several sequences.
+
+    Returns:
+        str: folder path
+    """
+    folder_path = tempfile.mkdtemp(prefix='frames_', dir=BENCH_ROOT)
+    for index in range(sequences):
+        count = frames // sequences + (1 if index < frames % sequences else 0)
+        ext = SUPPORTED_EXT[index % len(SUPPORTED_EXT)]
+        # Odd frames from an offset, so re-numbering moves every frame.
+        for frame in range(index * 7 + 1, index * 7 + 1 + count * 2, 2):
+            name = 'shot{0:02d}_beauty.{1}{2}'.format(index, frame_name(index, frame), ext)
+            os.close(os.open(os.path.join(folder_path, name), os.O_CREAT | os.O_WRONLY, 0o644))
+    return folder_path
+
+
+def best_time(func, repeat=REPEAT):
+    best = None
+    for _ in range(repeat):
+        start_time = time.time()
+        func()
+        elapsed = time.time() - start_time
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def time_once(func):
+    start_time = time.time()
+    func()
+    return time.time() - start_time
+
+
+def load_cli():
+    """
+    Returns:
+        module: renumber_tool_cmd, which has no .py extension
+    """
+    return SourceFileLoader('renumber_tool_cmd', CLI_PATH).load_module()
+
+
+def preview(folder_path):
+    sequences = scan_sequences(folder_path, extensions=SUPPORTED_EXT)
+
+    def run():
+        report_plans(plan_sequences(sequences))
+    return run
+
+
+def rename_latency(folder_path, latency, jobs):
+    plans = plan_sequences(scan_sequences(folder_path, extensions=SUPPORTED_EXT))
+
+    def run():
+        execute_plans(plans, rename_func=delayed_rename(latency), jobs=jobs)
+    return run
+
+
+def run_size(frames, cli, repeat=REPEAT, latency=LATENCY, latency_max_frames=LATENCY_MAX_FRAMES,
+             latency_jobs=LATENCY_JOBS):
+    """Time every case on folders of the given number of frames.
+
+    Returns:
+        dict: seconds by case name, None for skipped cases
+    """
+    results = {}
+    folder_path = make_folder(frames)
+
+    results['scan'] = best_time(lambda: scan_sequences(folder_path, extensions=SUPPORTED_EXT), repeat)
+
+    cache = ScanCache(os.path.join(BENCH_ROOT, 'scan_cache_{}.sqlite'.format(frames)))
+    # Folders modified less than MIN_AGE seconds ago are not cached.
+    os.utime(folder_path, (time.time() - 60, time.time() - 60))
+    scan_sequences(folder_path, extensions=SUPPORTED_EXT, cache=cache)
+    results['scan_cached'] = best_time(
+        lambda: scan_sequences(folder_path, extensions=SUPPORTED_EXT, cache=cache), repeat)
+    cache.close()
+
+    results['preview'] = best_time(preview(folder_path), repeat)
+
+    # Renames change the folder, every rename case gets a new one.
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        results['rename_cli'] = time_once(lambda: cli.rename_files(folder_path))
+    shutil.rmtree(folder_path)
+
+    if ui is None:
+        results['rename_gui'] = None
+    else:
+        folder_path = make_folder(frames)
+        results['rename_gui'] = time_once(
+            lambda: ui.renumber_folder(lambda message: None, folder_path, journal=ui.Journal()))
+        shutil.rmtree(folder_path)
+
+    for jobs in (1, latency_jobs):
+        name = 'rename_latency_j{}'.format(jobs)
+        if frames > latency_max_frames:
+            results[name] = None
+            continue
+        folder_path = make_folder(frames)
+        results[name] = time_once(rename_latency(folder_path, latency, jobs))
+        shutil.rmtree(folder_path)
+
+    return results
+
+
+def get_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT,
+                                       stderr=subprocess.DEVNULL).decode('ascii').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, threshold=THRESHOLD, min_delta=MIN_DELTA):
+    """Compare results with a baseline run.
+
+    Returns:
+        list: (case, baseline seconds, seconds, ratio) of the regressions
+    """
+    regressions = []
+    for key, seconds in sorted(results.items()):
+        base = baseline.get(key)
+        if seconds is None or base is None:
+            continue
+        ratio = seconds / base if base else float('inf')
+        status = ''
+        if ratio > 1.0 + threshold and seconds - base > min_delta:
+            regressions.append((key, base, seconds, ratio))
+            status = 'REGRESSION'
+        print('{0:<32} {1:>10.4f}s {2:>10.4f}s {3:>7.2f}x {4}'.format(key, base, seconds, ratio, status))
+    return regressions
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark scan, preview and rename on synthetic folders.')
+    parser.add_argument('--sizes', type=str, default=','.join(str(size) for size in SIZES),
+                        help='Comma separated numbers of frames per folder. '
+                             'Default is {}'.format(','.join(str(size) for size in SIZES)))
+    parser.add_argument('--repeat', type=int, default=REPEAT,
+                        help='Runs of the read-only cases, the best is kept. Default is {}'.format(REPEAT))
+    parser.add_argument('--latency', type=float, default=LATENCY,
+                        help='Seconds added to every rename in latency mode. Default is {}'.format(LATENCY))
+    parser.add_argument('--latency-max-frames', type=int, default=LATENCY_MAX_FRAMES,
+                        help='Largest folder timed in latency mode. Default is {}'.format(LATENCY_MAX_FRAMES))
+    parser.add_argument('--latency-jobs', type=int, default=LATENCY_JOBS,
+                        help='Threads of the parallel latency case. Default is {}'.format(LATENCY_JOBS))
+    parser.add_argument('-o', '--output', type=str, default=None,
+                        help='Write the results to this JSON file')
+    parser.add_argument('--baseline', type=str, default=None,
+                        help='JSON results of a previous run to compare with')
+    parser.add_argument('--threshold', type=float, default=THRESHOLD,
+                        help='Slowdown ratio over the baseline reported as a regression. '
+                             'Default is {}'.format(THRESHOLD))
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    sizes = [int(size) for size in args.sizes.split(',')]
+    cli = load_cli()
+
+    results = {}
+    try:
+        for frames in sizes:
+            print('{} frames...'.format(frames))
+            for case, seconds in run_size(frames, cli, args.repeat, args.latency, args.latency_max_frames,
+                                          args.latency_jobs).items():
+                results['{0}@{1}'.format(case, frames)] = seconds
+                print('  {0:<20} {1}'.format(case, 'skipped' if seconds is None else '{:.4f}s'.format(seconds)))
+    finally:
+        shutil.rmtree(BENCH_ROOT, ignore_errors=True)
+
+    data = {
+        'created': time.time(),
+        'commit': get_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'latency': args.latency,
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(data, output_file, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        print('\nCompared with {0} ({1}):'.format(args.baseline, baseline.get('commit')))
+        regressions = compare(results, baseline['results'], args.threshold)
+        if regressions:
+            print('{} regressions over {:.0%}'.format(len(regressions), args.threshold))
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,206 @@
+#!/usr/bin/env python
+"""Benchmark of the share_copy replication to other sites.
+
+A share directory is filled with versions of a few snippets, every version
+an edit of the previous one, as an artist copying again after small fixes.
+It is replicated to local directories standing in for the other sites:
+
+    python benchmarks/bench_share_replicate.py
+    python benchmarks/bench_share_replicate.py --sites 3 --versions 20
+
+Steps:
+    chunking    throughput of the gear hash alone, on the snippets
+    initial     first replication of the whole share directory
+    update      replication of new versions only
+    resume      a replication killed midway, then run again
+    verify      the latest versions of every snippet at every site
+                decompress to the bytes of the source
+
+The gear hash of the chunking is pure Python, about 5MB/s of uncompressed
+snippets on one core: it bounds the throughput of the first site, the
+files being chunked once for all the sites.
+
+Exits 1 when a site differs from the source.
+"""
+# Built-in
+import argparse
+import os
+import random
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, REPO_ROOT)
+
+from share_copy import replicate
+from share_copy.store import SnippetStore
+
+# =============================================================================
+# GLOBALS
+# =============================================================================
+SITES = 2
+SNIPPETS = 4
+VERSIONS = 10
+# Raw size of a snippet in KB.
+SIZE = 512
+JOBS = replicate.TRANSFER_JOBS
+
+# Seconds the killed replication runs.
+KILL_AFTER = 0.5
+
+WORDS = [b'opadd', b'opparm', b'opwire', b'null', b'xform', b'attribwrangle', b'merge', b'ropnet', b'tx', b'ty']
+
+
+# =============================================================================
+# FUNCTIONS
+# =============================================================================
+def make_snippet(rng, size):
+    return b' '.join(rng.choice(WORDS) + str(rng.randint(0, 999)).encode('ascii')
+                     for _ in range(size // 8))[:size]
+
+
+def edit_snippet(rng, data):
+    """
+    Returns:
+        bytes: data with a few bytes changed and inserted at one place
+    """
+    offset = rng.randint(0, len(data) - 1)
+    return data[:offset] + b'opparm edited ' + str(rng.random()).encode('ascii') + data[offset + 16:]
+
+
+def publish_versions(store, rng, payloads, versions):
+    for _ in range(versions):
+        for index in range(len(payloads)):
+            payloads[index] = edit_snippet(rng, payloads[index])
+
+            def write(path, payload=payloads[index]):
+                with open(path, 'wb') as snippet_file:
+                    snippet_file.write(payload)
+            store.publish('user{}'.format(index), 'Sop', write)
+
+
+def run_chunking(payloads):
+    """
+    Print the throughput of the gear hash, the bound of a first replication
+    """
+    start_time = time.time()
+    chunks = sum(len(replicate.find_cuts(payload)) for payload in payloads)
+    elapsed = time.time() - start_time
+    size = sum(len(payload) for payload in payloads) / (1024.0 * 1024.0)
+    print('chunking: {0:.2f}MB in {1} chunks, {2:.2f}s ({3:.1f}MB/s)'.format(
+        size, chunks, elapsed, size / (elapsed or 1e-9)))
+
+
+def run_step(label, root, sites, jobs):
+    print(label)
+    for result in replicate.replicate(root, sites, jobs):
+        print('    {}'.format(result))
+
+
+def run_killed(root, sites, jobs):
+    """Run a replication in another process and kill it midway.
+
+    Returns:
+        int: files left in the queues of the sites
+    """
+    process = subprocess.Popen([sys.executable, '-m', 'share_copy.replicate', root] + sites +
+                               ['--jobs', str(jobs)], cwd=REPO_ROOT, stdout=subprocess.PIPE)
+    time.sleep(KILL_AFTER)
+    if process.poll() is None:
+        process.send_signal(signal.SIGKILL)
+    process.communicate()
+
+    left = 0
+    for site in sites:
+        queue = replicate.TransferQueue(os.path.join(root, replicate.QUEUE_DIR,
+                                                     replicate.get_site_id(site) + '.ndjson'))
+        queue.open()
+        left += len(queue.pending())
+        queue.close()
+    return left
+
+
+def read_snippet(store, name):
+    path, temporary = store.extract(name)
+    with open(path, 'rb') as snippet_file:
+        data = snippet_file.read()
+    if temporary:
+        os.remove(path)
+    return data
+
+
+def verify(root, sites):
+    """Check the sites hold the latest versions of every snippet, the older
+    ones being evicted within the quotas of the site.
+
+    Returns:
+        int: number of snippets missing or different at a site
+    """
+    source = SnippetStore(root)
+    bad = checked = 0
+    for site in sites:
+        site_store = SnippetStore(site)
+        listed = set(snippet.name for snippet in site_store.list_snippets())
+        for versions in source.list_history():
+            for snippet in versions[:site_store.ring_size]:
+                checked += 1
+                if snippet.name not in listed or \
+                        read_snippet(site_store, snippet.name) != read_snippet(source, snippet.name):
+                    bad += 1
+    print('verify: {0} snippets checked on {1} sites, {2} bad'.format(checked, len(sites), bad))
+    return bad
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark share_copy replication to other sites.')
+    parser.add_argument('--sites', type=int, default=SITES,
+                        help='Sites to replicate to. Default is {}'.format(SITES))
+    parser.add_argument('--snippets', type=int, default=SNIPPETS,
+                        help='Distinct snippets. Default is {}'.format(SNIPPETS))
+    parser.add_argument('--versions', type=int, default=VERSIONS,
+                        help='Versions of every snippet per step. Default is {}'.format(VERSIONS))
+    parser.add_argument('--size', type=int, default=SIZE,
+                        help='Raw snippet size in KB. Default is {}'.format(SIZE))
+    parser.add_argument('--jobs', type=int, default=JOBS,
+                        help='Threads sending files to a site. Default is {}'.format(JOBS))
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    bench_root = tempfile.mkdtemp(prefix='share_replicate_',
+                                  dir='/dev/shm' if os.path.isdir('/dev/shm') else None)
+    try:
+        root = os.path.join(bench_root, 'source')
+        sites = [os.path.join(bench_root, 'site{}'.format(index)) for index in range(args.sites)]
+        for path in [root] + sites:
+            os.makedirs(path)
+        rng = random.Random(0)
+        # Every version is kept, so they are all replicated.
+        store = SnippetStore(root, ring_size=args.versions * 3 + 1, max_bytes=float('inf'))
+        payloads = [make_snippet(rng, args.size * 1024) for _ in range(args.snippets)]
+        run_chunking(payloads)
+
+        publish_versions(store, rng, payloads, args.versions)
+        run_step('initial', root, sites, args.jobs)
+
+        publish_versions(store, rng, payloads, args.versions)
+        run_step('update', root, sites, args.jobs)
+
+        publish_versions(store, rng, payloads, args.versions)
+        left = run_killed(root, sites, args.jobs)
+        run_step('resume ({} files left by the killed run)'.format(left), root, sites, args.jobs)
+
+        bad = verify(root, sites)
+    finally:
+        shutil.rmtree(bench_root, ignore_errors=True)
+    if bad:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+"""Benchmarks of the share_copy snippet storage.
+
+Synthetic snippets mimic the cpio archives written by opwrite: ASCII
+headers followed by node scripts, with some binary parameter data. Files are
+written on tmpfs (/dev/shm) when available, so the codecs are timed rather
+than the disk.
+
+    python benchmarks/bench_share_store.py
+    python benchmarks/bench_share_store.py --size 64 --copies 50
+
+Cases:
+    codec   compress_file and decompress_file throughput and ratio, for
+            zlib levels 1, 6 and 9 and zstd when zstandard is installed
+    dedup   SnippetStore.publish of the same snippets again and again, bytes
+            written to the share directory against the raw snippets
+"""
+# Built-in
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, REPO_ROOT)
+
+from share_copy import store
+from share_copy.store import SnippetStore, compress_file, decompress_file
+
+# =============================================================================
+# GLOBALS
+# =============================================================================
+# Size of a synthetic snippet in MB.
+SIZE = 16
+# Distinct snippets and publishes of each in the dedup case.
+SNIPPETS = 4
+COPIES = 20
+DEDUP_SIZE = 1
+
+# Cases run REPEAT times and keep the best time.
+REPEAT = 3
+
+NODE_TYPES = ['null', 'xform', 'attribwrangle', 'merge', 'ropnet', 'geometry', 'file', 'filecache']
+PARMS = ['tx', 'ty', 'tz', 'scale', 'snippet', 'sopoutput', 'f1', 'f2', 'f3', 'trange']
+
+
+# =============================================================================
+# FUNCTIONS
+# =============================================================================
+def make_snippet(rng, size):
+    """
+    Returns:
+        bytes: cpio-like content of about size bytes
+    """
+    parts = []
+    total = 0
+    index = 0
+    while total < size:
+        node_type = rng.choice(NODE_TYPES)
+        name = '{0}{1}'.format(node_type, index)
+        script = ['opadd -e -n {0} {1}'.format(node_type, name)]
+        for parm in rng.sample(PARMS, 5):
+            script.append('opparm {0} {1} ( {2:.6f} )'.format(name, parm, rng.uniform(-100, 100)))
+        body = ('\n'.join(script) + '\n').encode('ascii')
+        if rng.random() < 0.1:
+            body += os.urandom(rng.randint(64, 1024))
+        header = '070707{0:06o}{1}.init\0{2:011o}'.format(index, name, len(body)).encode('ascii')
+        parts.append(header + body)
+        total += len(header) + len(body)
+        index += 1
+    return b''.join(parts)[:size]
+
+
+def get_codecs():
+    """
+    Returns:
+        list: (label, codec, level) tuples
+    """
+    codecs = [('zlib-{}'.format(level), store.ZLIB, level) for level in (1, 6, 9)]
+    if store.zstandard is not None:
+        codecs += [('zstd-{}'.format(level), store.ZSTD, level) for level in (1, 3, 9)]
+    return codecs
+
+
+def best_time(func, repeat=REPEAT):
+    times = []
+    for _ in range(repeat):
+        start_time = time.time()
+        func()
+        times.append(time.time() - start_time)
+    return min(times)
+
+
+def bench_codecs(root, size):
+    rng = random.Random(0)
+    raw_path = os.path.join(root, 'snippet.cpio')
+    packed_path = os.path.join(root, 'snippet.packed')
+    unpacked_path = os.path.join(root, 'snippet.unpacked')
+    with open(raw_path, 'wb') as raw_file:
+        raw_file.write(make_snippet(rng, size))
+    megabytes = size / (1024.0 * 1024.0)
+
+    print('codec       compress MB/s  decompress MB/s  ratio')
+    zlib_level, zstd_level = store.ZLIB_LEVEL, store.ZSTD_LEVEL
+    try:
+        for label, codec, level in get_codecs():
+            store.ZLIB_LEVEL = store.ZSTD_LEVEL = level
+            compress_time = best_time(lambda: compress_file(raw_path, packed_path, codec))
+            decompress_time = best_time(lambda: decompress_file(packed_path, unpacked_path, codec))
+            with open(raw_path, 'rb') as raw_file, open(unpacked_path, 'rb') as unpacked_file:
+                if raw_file.read() != unpacked_file.read():
+                    raise RuntimeError('{} round trip differs.'.format(label))
+            print('{0:<11} {1:>13.0f}  {2:>15.0f}  {3:>5.1f}'.format(
+                label, megabytes / compress_time, megabytes / decompress_time,
+                size / float(os.path.getsize(packed_path))))
+    finally:
+        store.ZLIB_LEVEL, store.ZSTD_LEVEL = zlib_level, zstd_level
+
+
+def get_tree_size(path):
+    return sum(os.path.getsize(os.path.join(folder, name))
+               for folder, _, names in os.walk(path) for name in names)
+
+
+def bench_dedup(root, size, snippets, copies):
+    share_dir = os.path.join(root, 'share')
+    os.makedirs(share_dir)
+    rng = random.Random(1)
+    payloads = [make_snippet(rng, size) for _ in range(snippets)]
+    # Every version is kept, so only deduplication saves bytes.
+    snippet_store = SnippetStore(share_dir, ring_size=copies + 1, max_bytes=float('inf'))
+
+    raw = 0
+    start_time = time.time()
+    for copy in range(copies):
+        for index, payload in enumerate(payloads):
+            def write(path, payload=payload):
+                with open(path, 'wb') as snippet_file:
+                    snippet_file.write(payload)
+            snippet_store.publish('user{}'.format(index), 'Sop', write)
+            raw += len(payload)
+    elapsed = time.time() - start_time
+    publishes = snippets * copies
+    stored = get_tree_size(share_dir)
+
+    print('dedup: {0} publishes of {1} snippets in {2:.2f}s ({3:.1f}ms each)'.format(
+        publishes, snippets, elapsed, elapsed * 1000 / publishes))
+    print('raw {0:.1f}MB, share directory {1:.2f}MB ({2:.0f}x smaller)'.format(
+        raw / (1024.0 * 1024.0), stored / (1024.0 * 1024.0), raw / float(stored)))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark share_copy snippet compression and deduplication.')
+    parser.add_argument('--size', type=int, default=SIZE,
+                        help='Snippet size in MB of the codec case. Default is {}'.format(SIZE))
+    parser.add_argument('--snippets', type=int, default=SNIPPETS,
+                        help='Distinct snippets of the dedup case. Default is {}'.format(SNIPPETS))
+    parser.add_argument('--copies', type=int, default=COPIES,
+                        help='Publishes of every snippet in the dedup case. Default is {}'.format(COPIES))
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    root = tempfile.mkdtemp(prefix='share_bench_', dir='/dev/shm' if os.path.isdir('/dev/shm') else None)
+    try:
+        print('default codec: {}'.format(store.CODEC))
+        bench_codecs(root, args.size * 1024 * 1024)
+        print('')
+        bench_dedup(root, DEDUP_SIZE * 1024 * 1024, args.snippets, args.copies)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,245 @@
+#!/usr/bin/env python
+"""Stress test of the share_copy publish protocol.
+
+Writer processes publish snippets of random sizes into a share directory
+on tmpfs, several writers sharing each snippet name, while reader
+processes list the snippets from the index and read them back. Every
+snippet starts with its body size and hash, so a reader opening a half
+written snippet sees a torn read.
+
+    python benchmarks/stress_share_publish.py --writers 16 --readers 8
+    python benchmarks/stress_share_publish.py --mode coalesce --burst 5
+    python benchmarks/stress_share_publish.py --mode direct
+
+Modes:
+    atomic      SnippetStore.publish: compressed object and pointer file
+                renamed into place
+    coalesce    Publisher: bursts of copies, only the last one committed
+    direct      written in place like share_copy used to, torn reads are
+                expected and show the test catches them
+
+Exits 1 on a torn read in atomic and coalesce modes.
+"""
+# Built-in
+import argparse
+import hashlib
+import multiprocessing
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import zlib
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, REPO_ROOT)
+
+from share_copy.store import Publisher, Snippet, SnippetStore, get_snippet_name
+
+# =============================================================================
+# GLOBALS
+# =============================================================================
+ATOMIC = 'atomic'
+COALESCE = 'coalesce'
+DIRECT = 'direct'
+MODES = [ATOMIC, COALESCE, DIRECT]
+
+WRITERS = 8
+READERS = 4
+PUBLISHES = 200
+# Writers share snippets: writer i publishes as user i % USERS.
+USERS = 4
+CATEGORIES = ['Sop', 'Object', 'Driver']
+MAX_SIZE = 256 * 1024
+# Bytes written at once, so a writer is often caught mid-file.
+WRITE_CHUNK = 16 * 1024
+
+BURST = 5
+WINDOW = 0.05
+
+
+# =============================================================================
+# FUNCTIONS
+# =============================================================================
+def make_payload(rng, max_size=MAX_SIZE):
+    body = os.urandom(rng.randint(1, max_size))
+    header = 'SNIP {0} {1}\n'.format(len(body), hashlib.sha1(body).hexdigest()).encode('ascii')
+    return header + body
+
+
+def check_payload(data):
+    """
+    Returns:
+        bool: True if the data is a whole snippet
+    """
+    header, _, body = data.partition(b'\n')
+    parts = header.split()
+    if len(parts) != 3 or parts[0] != b'SNIP':
+        return False
+    return int(parts[1]) == len(body) and hashlib.sha1(body).hexdigest().encode('ascii') == parts[2]
+
+
+def write_chunks(payload):
+    def write(path):
+        with open(path, 'wb') as snippet_file:
+            for offset in range(0, len(payload), WRITE_CHUNK):
+                snippet_file.write(payload[offset:offset + WRITE_CHUNK])
+                snippet_file.flush()
+    return write
+
+
+def publish_direct(store, user, category, write_func):
+    """
+    The protocol share_copy used to have: write in place, then record.
+    """
+    name = get_snippet_name(user, category)
+    path = store.snippet_path(name)
+    write_func(path)
+    file_stat = os.stat(path)
+    store.append([Snippet(user, category, name, file_stat.st_mtime, file_stat.st_size)])
+
+
+def run_writer(root, index, mode, publishes, burst, window, results):
+    rng = random.Random(index)
+    store = SnippetStore(root)
+    publisher = Publisher(store, window) if mode == COALESCE else None
+    user = 'user{}'.format(index % USERS)
+    latencies = []
+
+    count = 0
+    while count < publishes:
+        category = rng.choice(CATEGORIES)
+        # Copies of the same snippet in a row, as an artist copying again
+        # after a small fix.
+        for _ in range(min(burst if mode == COALESCE else 1, publishes - count)):
+            payload = make_payload(rng)
+            start_time = time.time()
+            if mode == COALESCE:
+                publisher.publish(user, category, write_chunks(payload))
+            elif mode == ATOMIC:
+                store.publish(user, category, write_chunks(payload))
+            else:
+                publish_direct(store, user, category, write_chunks(payload))
+            latencies.append(time.time() - start_time)
+            count += 1
+        if mode == COALESCE:
+            time.sleep(window * rng.random() * 2)
+
+    start_time = time.time()
+    if publisher is not None:
+        publisher.flush()
+    results.put(('writer', latencies, publisher.coalesced if publisher else 0, time.time() - start_time))
+
+
+def run_reader(root, stop_event, results):
+    store = SnippetStore(root)
+    reads = torn = 0
+    listings = []
+    while not stop_event.is_set():
+        start_time = time.time()
+        snippets = store.list_snippets()
+        listings.append(time.time() - start_time)
+        for snippet in snippets:
+            try:
+                path, temporary = store.extract(snippet.name)
+            except (IOError, OSError):
+                continue
+            except (ValueError, zlib.error):
+                # Half written pointer or object.
+                reads += 1
+                torn += 1
+                continue
+            with open(path, 'rb') as snippet_file:
+                data = snippet_file.read()
+            if temporary:
+                os.remove(path)
+            reads += 1
+            if not check_payload(data):
+                torn += 1
+    results.put(('reader', reads, torn, listings))
+
+
+def percentile(values, ratio):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(len(values) * ratio), len(values) - 1)]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Stress concurrent share_copy publishes and reads.')
+    parser.add_argument('--mode', choices=MODES, default=ATOMIC,
+                        help='Publish protocol. Default is {}'.format(ATOMIC))
+    parser.add_argument('--writers', type=int, default=WRITERS,
+                        help='Writer processes. Default is {}'.format(WRITERS))
+    parser.add_argument('--readers', type=int, default=READERS,
+                        help='Reader processes. Default is {}'.format(READERS))
+    parser.add_argument('--publishes', type=int, default=PUBLISHES,
+                        help='Publishes per writer. Default is {}'.format(PUBLISHES))
+    parser.add_argument('--burst', type=int, default=BURST,
+                        help='Copies in a row of the same snippet in coalesce mode. Default is {}'.format(BURST))
+    parser.add_argument('--window', type=float, default=WINDOW,
+                        help='Coalesce window in seconds. Default is {}'.format(WINDOW))
+    parser.add_argument('--root', default=None,
+                        help='Share directory to stress, e.g. on NFS. Default is a temporary folder on tmpfs')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    root = args.root or tempfile.mkdtemp(prefix='share_stress_',
+                                         dir='/dev/shm' if os.path.isdir('/dev/shm') else None)
+    results = multiprocessing.Queue()
+    stop_event = multiprocessing.Event()
+
+    readers = [multiprocessing.Process(target=run_reader, args=(root, stop_event, results))
+               for _ in range(args.readers)]
+    writers = [multiprocessing.Process(target=run_writer,
+                                       args=(root, index, args.mode, args.publishes, args.burst, args.window,
+                                             results))
+               for index in range(args.writers)]
+    start_time = time.time()
+    try:
+        for process in readers + writers:
+            process.start()
+        # Results are read before joining: a full queue blocks its writer.
+        collected = [results.get() for _ in writers]
+        elapsed = time.time() - start_time
+        stop_event.set()
+        collected += [results.get() for _ in readers]
+        for process in readers + writers:
+            process.join()
+
+        latencies = []
+        coalesced = 0
+        reads = torn = 0
+        listings = []
+        for result in collected:
+            if result[0] == 'writer':
+                latencies.extend(result[1])
+                coalesced += result[2]
+            else:
+                reads += result[1]
+                torn += result[2]
+                listings.extend(result[3])
+        snippets = SnippetStore(root).list_snippets()
+    finally:
+        if args.root is None:
+            shutil.rmtree(root, ignore_errors=True)
+
+    print('mode: {0}  writers: {1}  readers: {2}'.format(args.mode, args.writers, args.readers))
+    print('publishes: {0} in {1:.2f}s ({2:.0f}/s), {3} coalesced, {4} snippets'.format(
+        len(latencies), elapsed, len(latencies) / elapsed, coalesced, len(snippets)))
+    print('publish latency ms: p50 {0:.2f}  p95 {1:.2f}  p99 {2:.2f}  max {3:.2f}'.format(
+        *[percentile(latencies, ratio) * 1000 for ratio in (0.5, 0.95, 0.99, 1.0)]))
+    print('listing latency ms: p50 {0:.2f}  p95 {1:.2f}  ({2} listings)'.format(
+        percentile(listings, 0.5) * 1000, percentile(listings, 0.95) * 1000, len(listings)))
+    print('reads: {0}  torn reads: {1}'.format(reads, torn))
+
+    if torn and args.mode != DIRECT:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
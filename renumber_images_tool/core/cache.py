@@ -0,0 +1,202 @@
+# Built-in
+import base64
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+from renumber_images_tool.core import instrument
+from renumber_images_tool.core.sequence import Sequence
+
+# =============================================================================
+# GLOBALS
+# =============================================================================
+CACHE_DIR = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'),
+                         'renumber_images_tool')
+CACHE_PATH = os.path.join(CACHE_DIR, 'scan_cache.sqlite')
+
+# Total size of the cached listings before the least recently used go.
+MAX_CACHE_SIZE = 256 * 1024 * 1024
+
+# A folder modified less than this many seconds ago is not cached: on
+# filesystems with coarse timestamps a change within the same tick would
+# not move the mtime.
+MIN_AGE = 2.0
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS folders (
+    path TEXT NOT NULL,
+    extensions TEXT NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    last_used REAL NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (path, extensions)
+);
+CREATE INDEX IF NOT EXISTS folders_last_used ON folders (last_used);
+'''
+
+# Version of the cached data. Entries of another version are misses.
+DATA_VERSION = 2
+
+
+# =============================================================================
+# FUNCTIONS
+# =============================================================================
+def open_cache(path=CACHE_PATH, max_size=MAX_CACHE_SIZE):
+    """
+    Returns:
+        ScanCache: None if the cache cannot be opened, e.g. read-only home
+    """
+    try:
+        return ScanCache(path, max_size)
+    except (OSError, sqlite3.Error):
+        return None
+
+
+def get_extensions_key(extensions):
+    if extensions is None:
+        return '*'
+    return ','.join(sorted(extensions))
+
+
+def encode_bytes(value):
+    if value is None:
+        return None
+    return base64.b64encode(value).decode('ascii')
+
+
+def decode_bytes(value):
+    if value is None:
+        return None
+    return base64.b64decode(value)
+
+
+def encode(sequences, sub_folders):
+    encoded = []
+    for sequence in sequences:
+        data = sequence.to_data()
+        data['frames'] = encode_bytes(data['frames'])
+        data['widths'] = encode_bytes(data['widths'])
+        encoded.append(data)
+
+    data = {
+        'version': DATA_VERSION,
+        'sequences': encoded,
+        'sub_folders': [os.path.basename(path) for path in sub_folders],
+    }
+    return zlib.compress(json.dumps(data, separators=(',', ':')).encode('utf-8'))
+
+
+def decode(folder_path, blob):
+    """
+    Returns:
+        tuple: (sequences, sub folders), None if the data is of another version
+    """
+    data = json.loads(zlib.decompress(blob).decode('utf-8'))
+    if data.get('version') != DATA_VERSION:
+        return None
+
+    sequences = []
+    for sequence_data in data['sequences']:
+        sequence_data['frames'] = decode_bytes(sequence_data['frames'])
+        sequence_data['widths'] = decode_bytes(sequence_data['widths'])
+        sequences.append(Sequence.from_data(folder_path, sequence_data))
+    sub_folders = [os.path.join(folder_path, name) for name in data['sub_folders']]
+    return sequences, sub_folders
+
+
+# =============================================================================
+# CLASSES
+# =============================================================================
+class ScanCache(object):
+    """
+    On-disk cache of folder listings grouped into sequences, keyed by folder
+    path, mtime and inode. A hit costs one stat of the folder and no listing.
+    Entries are evicted least recently used first once the total size goes
+    over max_size.
+    """
+
+    def __init__(self, path=CACHE_PATH, max_size=MAX_CACHE_SIZE):
+        self.path = path
+        self.max_size = max_size
+        self.lock = threading.Lock()
+
+        cache_dir = os.path.dirname(path)
+        if cache_dir and not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        self.connection = sqlite3.connect(path, timeout=10.0, check_same_thread=False)
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+    def get(self, folder_path, extensions=None):
+        """
+        Args:
+            folder_path (str): directory path to images
+            extensions (list): extensions the listing was filtered with
+
+        Returns:
+            tuple: (sequences, sub folders) or None on a miss, and the stat
+                result of the folder to hand to put()
+        """
+        if instrument.ENABLED:
+            instrument.count('stat')
+        stat = os.stat(folder_path)
+        key = (os.path.abspath(folder_path), get_extensions_key(extensions))
+
+        with self.lock:
+            row = self.connection.execute(
+                'SELECT mtime_ns, inode, data FROM folders WHERE path = ? AND extensions = ?',
+                key).fetchone()
+            if row is None or row[0] != stat.st_mtime_ns or row[1] != stat.st_ino:
+                return None, stat
+            with self.connection:
+                self.connection.execute(
+                    'UPDATE folders SET last_used = ? WHERE path = ? AND extensions = ?',
+                    (time.time(),) + key)
+
+        return decode(folder_path, row[2]), stat
+
+    def put(self, folder_path, stat, sequences, sub_folders, extensions=None):
+        """
+        Args:
+            folder_path (str): directory path to images
+            stat (os.stat_result): stat of the folder taken before listing it
+            sequences (list): Sequence objects of the folder
+            sub_folders (list): sub folder paths
+            extensions (list): extensions the listing was filtered with
+        """
+        now = time.time()
+        if now - stat.st_mtime < MIN_AGE:
+            return
+
+        blob = encode(sequences, sub_folders)
+        row = (os.path.abspath(folder_path), get_extensions_key(extensions),
+               stat.st_mtime_ns, stat.st_ino, len(blob), now, sqlite3.Binary(blob))
+        with self.lock:
+            with self.connection:
+                self.connection.execute('INSERT OR REPLACE INTO folders VALUES (?, ?, ?, ?, ?, ?, ?)', row)
+                self.evict()
+
+    def evict(self):
+        """
+        Drop the least recently used entries until the cache fits in max_size.
+        """
+        total = self.connection.execute('SELECT COALESCE(SUM(size), 0) FROM folders').fetchone()[0]
+        if total <= self.max_size:
+            return
+
+        cursor = self.connection.execute('SELECT path, extensions, size FROM folders ORDER BY last_used')
+        evicted = []
+        for path, extensions, size in cursor:
+            if total <= self.max_size:
+                break
+            evicted.append((path, extensions))
+            total -= size
+        self.connection.executemany('DELETE FROM folders WHERE path = ? AND extensions = ?', evicted)
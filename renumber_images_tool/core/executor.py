@@ -0,0 +1,352 @@
+# Built-in
+import itertools
+import os
+import time
+from concurrent import futures
+
+from renumber_images_tool.core import instrument
+
+# =============================================================================
+# GLOBALS
+# =============================================================================
+# Temporary names are hidden so a re-scan never picks them up as frames.
+TEMP_NAME = '.{0}.renumber_tmp'
+
+# Number of renames between two progress reports.
+PROGRESS_STEP = 500
+
+
+# =============================================================================
+# FUNCTIONS
+# =============================================================================
+def get_temp_path(path):
+    directory, name = os.path.split(path)
+    return os.path.join(directory, TEMP_NAME.format(name))
+
+
+def order_renames(renames):
+    """Order renames so that no file is overwritten.
+
+    Every old and every new name appears at most once, so the renames form
+    chains (a -> b -> c where c is free) and cycles (a -> b -> a).
+    A chain is executed from its free end backwards. A cycle is broken by
+    moving one of its files to a temporary name, which is the least number
+    of extra renames possible.
+
+    Args:
+        renames (list): (old path, new path) tuples
+
+    Returns:
+        tuple: chains, each a list of (old path, new path) steps to run in
+            order, and the target paths that must not exist beforehand
+    """
+    new_of = {}
+    old_of = {}
+    for old, new in renames:
+        if old in new_of:
+            raise ValueError('[{}] is renamed more than once.'.format(old))
+        if new in old_of:
+            raise ValueError('[{}] is the target of more than one rename.'.format(new))
+        new_of[old] = new
+        old_of[new] = old
+
+    chains = []
+    targets = []
+    done = set()
+
+    # Chains: start from the renames whose target is not renamed itself.
+    for old, new in renames:
+        if new in new_of:
+            continue
+        chain = []
+        node = old
+        while node is not None:
+            chain.append((node, new_of[node]))
+            done.add(node)
+            node = old_of.get(node)
+        chains.append(chain)
+        targets.append(new)
+
+    # Whatever is left belongs to a cycle.
+    for old, new in renames:
+        if old in done:
+            continue
+        temp = get_temp_path(old)
+        chain = [(old, temp)]
+        done.add(old)
+        node = old_of[old]
+        while node != old:
+            chain.append((node, new_of[node]))
+            done.add(node)
+            node = old_of[node]
+        chain.append((temp, new))
+        chains.append(chain)
+        targets.append(temp)
+
+    return chains, targets
+
+
+def check_targets(targets, result, lexists_func=os.path.lexists):
+    """Make sure none of the targets exists yet, so nothing outside of the
+    plan gets overwritten.
+    """
+    checked = 0
+    try:
+        for target in targets:
+            checked += 1
+            if lexists_func(target):
+                raise OSError('[{}] already exists.'.format(target))
+    finally:
+        result.stats += checked
+        if instrument.ENABLED:
+            instrument.count('stat', checked)
+
+
+def delayed_rename(delay, rename_func=os.rename):
+    """Stand-in for os.rename adding a fixed latency to every call, to mimic
+    a network filesystem locally.
+
+    Args:
+        delay (float): seconds to wait before each rename
+        rename_func (callable): function doing the rename
+
+    Returns:
+        callable
+    """
+    def rename(old, new):
+        time.sleep(delay)
+        rename_func(old, new)
+    return rename
+
+
+def report_progress(rename_func, progress, total, step=PROGRESS_STEP):
+    """Wrap a rename function to call progress(done, total) every step renames.
+    Safe to use from several threads.
+
+    Args:
+        rename_func (callable): function doing the rename
+        progress (callable): called with the number of renames done and total
+        total (int): expected number of renames
+        step (int): number of renames between two calls
+
+    Returns:
+        callable
+    """
+    counter = itertools.count(1)
+
+    def rename(old, new):
+        rename_func(old, new)
+        done = next(counter)
+        if done % step == 0:
+            progress(done, total)
+    return rename
+
+
+def run_chain(chain, rename_func=os.rename, journal=None, offset=0):
+    """Run the steps of a chain in order.
+
+    Args:
+        chain (list): (old path, new path) steps
+        rename_func (callable): function doing the rename
+        journal (Journal): records every step done
+        offset (int): journal index of the first step of the chain
+
+    Returns:
+        int: number of renames done
+    """
+    done = 0
+    try:
+        for index, (old, new) in enumerate(chain):
+            rename_func(old, new)
+            done += 1
+            if journal is not None:
+                journal.done(offset + index)
+    finally:
+        if instrument.ENABLED:
+            instrument.count('rename', done)
+    return done
+
+
+def run_chains(chains, result, rename_func=os.rename, jobs=1, journal=None):
+    """Run the chains one after the other, or on a pool of jobs threads.
+    The steps of one chain always run in order on the same thread, so only
+    independent renames are issued concurrently.
+    """
+    if jobs <= 1:
+        offset = 0
+        for chain in chains:
+            result.renames += run_chain(chain, rename_func, journal, offset)
+            offset += len(chain)
+        return
+
+    # Keep a bounded number of chains in flight instead of queuing them all.
+    max_pending = jobs * 4
+    pending = set()
+    error = None
+    offset = 0
+    with futures.ThreadPoolExecutor(max_workers=jobs) as pool:
+        for chain in chains:
+            if len(pending) >= max_pending:
+                finished, pending = futures.wait(pending, return_when=futures.FIRST_COMPLETED)
+                error = collect_chains(finished, result) or error
+                if error:
+                    break
+            pending.add(pool.submit(run_chain, chain, rename_func, journal, offset))
+            offset += len(chain)
+        error = collect_chains(pending, result) or error
+
+    if error:
+        raise error
+
+
+def collect_chains(finished, result):
+    """Add up the renames of finished chains.
+
+    Returns:
+        Exception: first error raised by a chain, if any
+    """
+    error = None
+    for future in finished:
+        if future.exception() is not None:
+            error = error or future.exception()
+        else:
+            result.renames += future.result()
+    return error
+
+
+def run(chains, targets, frames, rename_func=os.rename, lexists_func=os.path.lexists, jobs=1,
+        progress=None, journal=None):
+    """Check the targets, then run the chains.
+
+    Returns:
+        RenameResult
+    """
+    result = RenameResult()
+    result.frames = frames
+    start_time = time.time()
+
+    check_targets(targets, result, lexists_func)
+
+    if progress is not None:
+        rename_func = report_progress(rename_func, progress, frames)
+
+    if journal is None:
+        run_chains(chains, result, rename_func, jobs)
+    else:
+        journal.start(chains)
+        try:
+            run_chains(chains, result, rename_func, jobs, journal)
+        finally:
+            journal.close()
+
+    result.elapsed = time.time() - start_time
+    return result
+
+
+def execute_renames(renames, rename_func=os.rename, lexists_func=os.path.lexists, jobs=1,
+                    progress=None, journal=None):
+    """Rename files on disk without overwriting any of them.
+
+    Args:
+        renames (list): (old path, new path) tuples
+        rename_func (callable): function doing the rename, os.rename by default
+        lexists_func (callable): function checking a path, os.path.lexists by default
+        jobs (int): number of threads issuing renames
+        progress (callable): called with the number of renames done and total
+        journal (Journal): records the steps so they can be undone or resumed
+
+    Returns:
+        RenameResult
+    """
+    start_time = time.time()
+    chains, targets = order_renames(renames)
+    result = run(chains, targets, len(renames), rename_func, lexists_func, jobs, progress, journal)
+    result.elapsed = time.time() - start_time
+    return result
+
+
+def execute_plans(plans, rename_func=os.rename, lexists_func=os.path.lexists, jobs=1,
+                  progress=None, journal=None):
+    """Execute the rename plans of several sequences.
+
+    Plans with a known order (shifts, steps, compaction) run in a single pass
+    in that order, without temporary names. Only their targets which are not
+    sources of the same plan are checked, one stat per freed name, since a
+    frame written meanwhile or a listing from the scan cache may put a file
+    there. The others go through the dependency graph of order_renames.
+    With several jobs, the ordered plans are split into their independent
+    chains as well.
+
+    Args:
+        plans (list): RenamePlan objects
+        rename_func (callable): function doing the rename, os.rename by default
+        lexists_func (callable): function checking a path, os.path.lexists by default
+        jobs (int): number of threads issuing renames
+        progress (callable): called with the number of renames done and total
+        journal (Journal): records the steps so they can be undone or resumed
+
+    Returns:
+        RenameResult
+    """
+    start_time = time.time()
+
+    chains = []
+    renames = []
+    ordered_targets = []
+    for plan in plans:
+        ordered = plan.ordered_renames()
+        if ordered is None:
+            renames.extend(plan.renames)
+            continue
+        sources = set(old for old, _ in ordered)
+        ordered_targets.extend(new for _, new in ordered if new not in sources)
+        if jobs > 1:
+            chains.extend(order_renames(ordered)[0])
+        elif ordered:
+            chains.append(ordered)
+
+    graph_chains, targets = order_renames(renames)
+    targets.extend(ordered_targets)
+    frames = len(renames) + sum(len(chain) for chain in chains)
+    result = run(graph_chains + chains, targets, frames, rename_func, lexists_func, jobs,
+                 progress, journal)
+    result.elapsed = time.time() - start_time
+    return result
+
+
+# =============================================================================
+# CLASSES
+# =============================================================================
+class RenameResult(object):
+    """
+    Counters of an executed rename plan.
+    """
+
+    def __init__(self):
+        self.frames = 0
+        self.renames = 0
+        self.stats = 0
+        self.elapsed = 0.0
+
+    def __str__(self):
+        return 'Renamed {0} frames with {1} renames ({2} temporary), ' \
+               '{3} syscalls in {4:.2f}s ({5:.0f} renames/s)'.format(self.frames, self.renames,
+                                                                     self.temp_renames, self.syscalls,
+                                                                     self.elapsed, self.rate)
+
+    @property
+    def rate(self):
+        """
+        Renames per second.
+        """
+        if not self.elapsed:
+            return 0.0
+        return self.renames / self.elapsed
+
+    @property
+    def temp_renames(self):
+        return self.renames - self.frames
+
+    @property
+    def syscalls(self):
+        return self.renames + self.stats
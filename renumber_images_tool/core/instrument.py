@@ -0,0 +1,67 @@
+# Built-in
+import sys
+import threading
+from collections import Counter
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# =============================================================================
+# GLOBALS
+# =============================================================================
+# Call sites check ENABLED before counting, so a disabled run only pays for
+# one global lookup per call.
+ENABLED = False
+
+# Number of filesystem calls by kind: listdir, stat, rename, link and read.
+COUNTS = Counter()
+LOCK = threading.Lock()
+
+
+# =============================================================================
+# FUNCTIONS
+# =============================================================================
+def enable():
+    global ENABLED
+    ENABLED = True
+
+
+def disable():
+    global ENABLED
+    ENABLED = False
+
+
+def count(name, number=1):
+    """Count filesystem calls, from any thread.
+
+    Args:
+        name (str): kind of call, e.g. listdir, stat, rename, link or read
+        number (int): number of calls
+    """
+    with LOCK:
+        COUNTS[name] += number
+
+
+def get_counts():
+    """
+    Returns:
+        dict: number of calls by kind since the process started
+    """
+    with LOCK:
+        return dict(COUNTS)
+
+
+def get_peak_memory():
+    """
+    Returns:
+        int: peak resident memory of the process in bytes, None if unknown
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes.
+    if sys.platform == 'darwin':
+        return peak
+    return peak * 1024
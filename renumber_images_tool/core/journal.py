@@ -0,0 +1,346 @@
+# Built-in
+import itertools
+import json
+import os
+import threading
+import time
+
+from renumber_images_tool.core import instrument
+from renumber_images_tool.core.cache import CACHE_DIR
+from renumber_images_tool.core.executor import RenameResult, get_temp_path
+
+# =============================================================================
+# GLOBALS
+# =============================================================================
+JOURNAL_DIR = os.path.join(CACHE_DIR, 'journals')
+JOURNAL_VERSION = 1
+
+# Done records are synced to disk every BATCH_SIZE records or SYNC_INTERVAL
+# seconds, whichever comes first.
+BATCH_SIZE = 1000
+SYNC_INTERVAL = 1.0
+
+# Bytes read at a time when reading a journal backwards.
+READ_BLOCK = 64 * 1024
+
+# Tells apart the journals of one process, e.g. one per folder in recursive mode.
+JOURNAL_COUNTER = itertools.count(1)
+
+
+# =============================================================================
+# FUNCTIONS
+# =============================================================================
+def get_journal_path():
+    """
+    Returns:
+        str: new journal path under the cache folder
+    """
+    name = '{0}_{1}_{2}.ndjson'.format(time.strftime('%Y%m%d_%H%M%S'), os.getpid(),
+                                       next(JOURNAL_COUNTER))
+    return os.path.join(JOURNAL_DIR, name)
+
+
+def list_inodes(folder_path):
+    """
+    Returns:
+        dict: inode of every entry of the folder by name, from a single
+            listing. Empty if the folder does not exist.
+    """
+    if instrument.ENABLED:
+        instrument.count('listdir')
+    try:
+        return {entry.name: entry.inode() for entry in os.scandir(folder_path)}
+    except OSError:
+        return {}
+
+
+def iter_records(path):
+    """
+    Yields:
+        dict: journal records from first to last. A last record cut by a
+            crash is skipped.
+    """
+    with open(path, 'r') as journal_file:
+        for line in journal_file:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                return
+
+
+def iter_records_reversed(path):
+    """
+    Read the journal backwards one block at a time, so the whole journal is
+    never held in memory.
+
+    Yields:
+        dict: journal records from last to first
+    """
+    with open(path, 'rb') as journal_file:
+        journal_file.seek(0, os.SEEK_END)
+        position = journal_file.tell()
+        remainder = b''
+        while position > 0:
+            size = min(READ_BLOCK, position)
+            position -= size
+            journal_file.seek(position)
+            lines = (journal_file.read(size) + remainder).split(b'\n')
+            # The first line may continue in the previous block.
+            remainder = lines.pop(0)
+            for line in reversed(lines):
+                record = parse_record(line)
+                if record is not None:
+                    yield record
+        record = parse_record(remainder)
+        if record is not None:
+            yield record
+
+
+def parse_record(line):
+    if not line.strip():
+        return None
+    try:
+        return json.loads(line.decode('utf-8'))
+    except ValueError:
+        return None
+
+
+def iter_steps(path):
+    """
+    Yields:
+        dict: step records, written before any done record
+    """
+    header = None
+    count = 0
+    for record in iter_records(path):
+        if header is None:
+            header = record
+            continue
+        if count >= header['steps']:
+            return
+        yield record
+        count += 1
+
+
+def read_state(path):
+    """Read the header and the done records of a journal in one pass.
+
+    Returns:
+        tuple: header record, bytearray flagging the steps done, True if the
+            journal was undone
+    """
+    header = None
+    done = None
+    undone = False
+    for record in iter_records(path):
+        if header is None:
+            if record.get('version') != JOURNAL_VERSION:
+                raise ValueError('[{}] is not a re-numbering journal.'.format(path))
+            header = record
+            done = bytearray(header['steps'])
+        elif 'done' in record:
+            done[record['done']] = 1
+        elif 'undone' in record:
+            undone = True
+
+    if header is None:
+        raise ValueError('[{}] is empty.'.format(path))
+    return header, done, undone
+
+
+def resume_journal(path, rename_func=os.rename):
+    """Run the steps of an interrupted re-numbering which are not done yet.
+
+    A step is done when its file is no longer under the old name. Steps are
+    replayed in journal order, which keeps the order of every chain.
+
+    Args:
+        path (str): journal path
+        rename_func (callable): function doing the rename
+
+    Returns:
+        RenameResult
+    """
+    header, done, undone = read_state(path)
+    if undone:
+        raise OSError('[{}] was undone, it cannot be resumed.'.format(path))
+
+    result = RenameResult()
+    start_time = time.time()
+    listings = Listings()
+    journal = Journal(path)
+    journal.reopen()
+    try:
+        for step in iter_steps(path):
+            index = step['step']
+            if done[index]:
+                continue
+            if listings.is_at(step['old'], step['inode'], step['new']):
+                rename_func(step['old'], step['new'])
+                listings.move(step['old'], step['new'])
+                result.renames += 1
+            elif not listings.is_at(step['new'], step['inode'], step['old']):
+                raise OSError('[{}] is missing, the journal cannot be resumed.'.format(step['old']))
+            journal.done(index)
+    finally:
+        journal.close()
+
+    result.frames = result.renames
+    result.elapsed = time.time() - start_time
+    if instrument.ENABLED:
+        instrument.count('rename', result.renames)
+    return result
+
+
+def undo_journal(path, rename_func=os.rename):
+    """Rename back every step of a re-numbering which actually completed,
+    from the last one to the first, streaming the journal backwards.
+
+    Args:
+        path (str): journal path
+        rename_func (callable): function doing the rename
+
+    Returns:
+        RenameResult
+    """
+    header, done, undone = read_state(path)
+    if undone:
+        raise OSError('[{}] was already undone.'.format(path))
+
+    result = RenameResult()
+    start_time = time.time()
+    listings = Listings()
+    for record in iter_records_reversed(path):
+        if 'step' not in record:
+            continue
+        if listings.is_at(record['new'], record['inode'], record['old']):
+            rename_func(record['new'], record['old'])
+            listings.move(record['new'], record['old'])
+            result.renames += 1
+        elif done[record['step']] and not listings.is_at(record['old'], record['inode'], record['new']):
+            # A step not done may have its file further up its chain, e.g.
+            # the last step of a cycle when the temporary rename never ran.
+            raise OSError('[{}] is missing, the journal cannot be undone.'.format(record['new']))
+
+    journal = Journal(path)
+    journal.reopen()
+    journal.write({'undone': time.time()})
+    journal.close()
+
+    result.frames = result.renames
+    result.elapsed = time.time() - start_time
+    if instrument.ENABLED:
+        instrument.count('rename', result.renames)
+    return result
+
+
+# =============================================================================
+# CLASSES
+# =============================================================================
+class Listings(object):
+    """
+    Inodes of the folders touched by a journal, listed once per folder and
+    kept up to date with the renames done.
+    """
+
+    def __init__(self):
+        self.folders = {}
+
+    def get(self, path):
+        folder_path, name = os.path.split(path)
+        if folder_path not in self.folders:
+            self.folders[folder_path] = list_inodes(folder_path)
+        return self.folders[folder_path], name
+
+    def is_at(self, path, inode, other_path):
+        """
+        True if the file is under path. Without a known inode, path has to
+        exist and other_path not.
+        """
+        inodes, name = self.get(path)
+        if inode is not None:
+            return inodes.get(name) == inode
+        other_inodes, other_name = self.get(other_path)
+        return name in inodes and other_name not in other_inodes
+
+    def move(self, old, new):
+        old_inodes, old_name = self.get(old)
+        new_inodes, new_name = self.get(new)
+        new_inodes[new_name] = old_inodes.pop(old_name, None)
+
+
+class Journal(object):
+    """
+    Append-only journal of a re-numbering, one JSON record per line.
+
+    A header and every step (old path, new path and inode of the file) are
+    written and synced before the first rename. Steps done are then appended
+    and synced in batches, so a crash loses at most one batch of done
+    records, which resume and undo recover from the inodes on disk.
+    """
+
+    def __init__(self, path=None, batch_size=BATCH_SIZE, sync_interval=SYNC_INTERVAL):
+        self.path = path or get_journal_path()
+        self.batch_size = batch_size
+        self.sync_interval = sync_interval
+        self.lock = threading.Lock()
+        self.file = None
+        self.pending = 0
+        self.last_sync = time.time()
+
+    def start(self, chains):
+        """
+        Write the header and the steps of the chains, in the order the
+        executor numbers them.
+        """
+        journal_dir = os.path.dirname(self.path)
+        if journal_dir and not os.path.isdir(journal_dir):
+            os.makedirs(journal_dir)
+
+        listings = Listings()
+        temp_inodes = {}
+        self.file = open(self.path, 'w')
+        self.write({'version': JOURNAL_VERSION, 'created': time.time(),
+                    'steps': sum(len(chain) for chain in chains)})
+
+        index = 0
+        for chain in chains:
+            for old, new in chain:
+                if old in temp_inodes:
+                    inode = temp_inodes.pop(old)
+                else:
+                    inodes, name = listings.get(old)
+                    inode = inodes.get(name)
+                if new == get_temp_path(old):
+                    temp_inodes[new] = inode
+                self.write({'step': index, 'old': old, 'new': new, 'inode': inode})
+                index += 1
+
+        self.sync()
+
+    def reopen(self):
+        self.file = open(self.path, 'a')
+
+    def write(self, record):
+        self.file.write(json.dumps(record, separators=(',', ':')) + '\n')
+
+    def done(self, index):
+        with self.lock:
+            self.write({'done': index})
+            self.pending += 1
+            if self.pending >= self.batch_size or time.time() - self.last_sync >= self.sync_interval:
+                self.sync()
+
+    def sync(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.pending = 0
+        self.last_sync = time.time()
+
+    def close(self):
+        if self.file is None:
+            return
+        with self.lock:
+            self.sync()
+            self.file.close()
+            self.file = None
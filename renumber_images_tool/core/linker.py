@@ -0,0 +1,407 @@
+# Built-in
+import errno
+import os
+import re
+import stat
+import threading
+import time
+from concurrent import futures
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from renumber_images_tool.core import instrument
+
+# =============================================================================
+# GLOBALS
+# =============================================================================
+# Ways of materializing a frame in the output folder, cheapest first.
+HARDLINK = 'hardlink'
+REFLINK = 'reflink'
+COPY_RANGE = 'copy_range'
+COPY = 'copy'
+# Targets left as they are: already the same file as their source.
+SKIPPED = 'skipped'
+AUTO = 'auto'
+LINK_MODES = [AUTO, HARDLINK, REFLINK, COPY]
+
+# ioctl sharing the extents of a file on btrfs, XFS and others, from linux/fs.h
+FICLONE = 0x40049409
+
+# Errors meaning a method is not supported between the two folders, as
+# opposed to a failure of one file.
+UNSUPPORTED_ERRORS = {errno.EXDEV, errno.EPERM, errno.EOPNOTSUPP, errno.ENOTTY, errno.EINVAL,
+                      errno.ENOSYS, errno.EBADF, errno.EMLINK}
+
+# Size of the chunks of a plain copy, each chunk copied by a thread.
+CHUNK_SIZE = 16 * 1024 * 1024
+
+# Number of threads linking or copying frames.
+LINK_JOBS = 8
+
+# Frames are written to a hidden temporary name first, so a scan never
+# groups them into a sequence, with the pid so concurrent runs do not
+# share them.
+TEMP_NAME = '.{0}.{1}.tmp'
+TEMP_REGEX = re.compile(r'\..+\.(\d+)\.tmp$')
+
+# Seconds without a change after which the temporary file of another run
+# is taken as left by a run killed midway. Runs of other hosts may be
+# writing to the same folder, so their pid cannot tell.
+STALE_TEMP_AGE = 60 * 60
+
+
+# =============================================================================
+# FUNCTIONS
+# =============================================================================
+def get_methods(mode):
+    """
+    Returns:
+        list: methods tried in order for a link mode
+    """
+    if mode == HARDLINK:
+        return [HARDLINK]
+    if mode == REFLINK:
+        return [REFLINK]
+    if mode == COPY:
+        return [COPY_RANGE, COPY]
+    return [HARDLINK, REFLINK, COPY_RANGE, COPY]
+
+
+def get_output_pairs(plans, output_dir):
+    """
+    Args:
+        plans (list): RenamePlan objects of one folder
+        output_dir (str): folder receiving the re-numbered frames
+
+    Returns:
+        list: (source path, output path) of every frame
+    """
+    if any(os.path.abspath(plan.sequence.directory) == os.path.abspath(output_dir) for plan in plans):
+        raise ValueError('[{}] is the input folder, re-number in place instead.'.format(output_dir))
+    return [(old, os.path.join(output_dir, os.path.basename(new)))
+            for plan in plans for old, new in plan.mappings()]
+
+
+def get_temp_path(target):
+    """
+    Returns:
+        str: name a frame is written to before being renamed to its target,
+            so a failed copy never leaves a partial frame under its name
+    """
+    directory, name = os.path.split(target)
+    return os.path.join(directory, TEMP_NAME.format(name, os.getpid()))
+
+
+def sweep_temps(folder_path, max_age=STALE_TEMP_AGE):
+    """Remove the temporary files left in a folder by runs killed midway.
+    The ctime is checked as a hardlink keeps the mtime of its source.
+
+    Args:
+        folder_path (str): folder receiving frames
+        max_age (float): seconds without a change of a stale temporary file
+
+    Returns:
+        int: number of files removed
+    """
+    if instrument.ENABLED:
+        instrument.count('listdir')
+    removed = 0
+    now = time.time()
+    for entry in os.scandir(folder_path):
+        match = TEMP_REGEX.match(entry.name)
+        if match is None or int(match.group(1)) == os.getpid():
+            continue
+        try:
+            if now - entry.stat(follow_symlinks=False).st_ctime < max_age:
+                continue
+            os.remove(entry.path)
+        except OSError:
+            continue
+        removed += 1
+    return removed
+
+
+def remove_file(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def is_identical(source, target):
+    """
+    Returns:
+        bool: True when target is a link to source, or a copy of it from a
+            previous run, with the same size and modification time
+    """
+    try:
+        target_stat = os.stat(target)
+    except OSError:
+        return False
+    source_stat = os.stat(source)
+    return os.path.samestat(source_stat, target_stat) or \
+        (stat.S_ISREG(target_stat.st_mode) and target_stat.st_size == source_stat.st_size and
+         target_stat.st_mtime_ns == source_stat.st_mtime_ns)
+
+
+def hardlink(source, target):
+    """
+    Returns:
+        int: number of bytes copied, always 0
+    """
+    os.link(source, target)
+    return 0
+
+
+def reflink(source, target):
+    """
+    Returns:
+        int: number of bytes copied, always 0: the extents are shared
+    """
+    if fcntl is None:
+        raise OSError(errno.ENOSYS, 'No ioctl on this platform')
+    with open(source, 'rb') as source_file:
+        target_fd = os.open(target, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+        try:
+            fcntl.ioctl(target_fd, FICLONE, source_file.fileno())
+        except OSError:
+            os.close(target_fd)
+            os.remove(target)
+            raise
+        os.close(target_fd)
+    copy_metadata(source, target)
+    return 0
+
+
+def copy_range(source, target):
+    """Copy in the kernel with copy_file_range, which reflinks or copies on
+    the server side on the filesystems supporting it. When the kernel stops
+    short of the end of the file, the rest is copied in userspace.
+
+    Returns:
+        int: number of bytes copied
+    """
+    if not hasattr(os, 'copy_file_range'):
+        raise OSError(errno.ENOSYS, 'No copy_file_range on this platform')
+    source_fd = os.open(source, os.O_RDONLY)
+    try:
+        size = os.fstat(source_fd).st_size
+        target_fd = os.open(target, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+        try:
+            copied = 0
+            while copied < size:
+                done = os.copy_file_range(source_fd, target_fd, size - copied, copied, copied)
+                if not done:
+                    break
+                copied += done
+        except OSError:
+            os.close(target_fd)
+            os.remove(target)
+            raise
+        os.close(target_fd)
+    finally:
+        os.close(source_fd)
+    if copied < size:
+        copy_chunk(source, target, copied, size - copied)
+    copy_metadata(source, target)
+    return size
+
+
+def copy_chunk(source, target, offset, size):
+    """Copy one chunk of a file with positional reads and writes, so several
+    chunks of the same file can be copied at once.
+
+    Raises:
+        OSError: when the source ends before the chunk, e.g. truncated while
+            being copied
+    """
+    source_fd = os.open(source, os.O_RDONLY)
+    try:
+        target_fd = os.open(target, os.O_WRONLY)
+        try:
+            end = offset + size
+            while offset < end:
+                data = os.pread(source_fd, min(end - offset, 1024 * 1024), offset)
+                if not data:
+                    raise OSError(errno.EIO, 'Unexpected end of [{0}] at {1} bytes'.format(source, offset))
+                os.pwrite(target_fd, data, offset)
+                offset += len(data)
+        finally:
+            os.close(target_fd)
+    finally:
+        os.close(source_fd)
+
+
+def copy_metadata(source, target):
+    source_stat = os.stat(source)
+    os.chmod(target, stat.S_IMODE(source_stat.st_mode))
+    os.utime(target, ns=(source_stat.st_atime_ns, source_stat.st_mtime_ns))
+
+
+def link_sequences(plans, output_dir, mode=AUTO, jobs=LINK_JOBS):
+    """Build the re-numbered sequences in another folder, leaving the
+    originals untouched.
+
+    Args:
+        plans (list): RenamePlan objects of one folder
+        output_dir (str): folder receiving the re-numbered frames
+        mode (str): one of LINK_MODES, AUTO tries the cheapest first
+        jobs (int): number of threads linking or copying frames
+
+    Returns:
+        LinkResult
+    """
+    return Linker(mode, jobs).link(get_output_pairs(plans, output_dir))
+
+
+# =============================================================================
+# CLASSES
+# =============================================================================
+class LinkResult(object):
+    """
+    Counters of a Linker run.
+    """
+
+    def __init__(self):
+        self.frames = 0
+        self.methods = {}
+        self.copied_bytes = 0
+        self.elapsed = 0.0
+
+    def __str__(self):
+        methods = ', '.join('{0} {1}'.format(count, method) for method, count in sorted(self.methods.items()))
+        return 'Linked {0} frames ({1}), {2:.1f}MB copied in {3:.2f}s'.format(
+            self.frames, methods or 'nothing to do', self.copied_bytes / (1024.0 * 1024.0), self.elapsed)
+
+    def add(self, method, count=1):
+        self.methods[method] = self.methods.get(method, 0) + count
+
+
+class Linker(object):
+    """
+    Materialize frames under new names in another folder: hardlinks first,
+    then reflinks, then in-kernel copies, then plain copies split into
+    chunks copied in parallel. A method failing because the filesystem does
+    not support it is not tried again for the next frames.
+
+    Every frame is written to a temporary name then renamed, replacing an
+    older file at the target. Targets already identical to their source,
+    e.g. when running again into the same output folder, are skipped, and
+    the stale temporary files of killed runs are removed.
+    """
+
+    def __init__(self, mode=AUTO, jobs=LINK_JOBS):
+        self.methods = get_methods(mode)
+        self.jobs = jobs
+        self.lock = threading.Lock()
+        self.functions = {HARDLINK: hardlink, REFLINK: reflink, COPY_RANGE: copy_range}
+
+    def link(self, pairs):
+        """
+        Args:
+            pairs (list): (source path, output path) tuples
+
+        Returns:
+            LinkResult
+        """
+        result = LinkResult()
+        start_time = time.time()
+
+        with futures.ThreadPoolExecutor(max_workers=self.jobs) as pool:
+            # Output folders are created in bulk before any frame.
+            folders = set(os.path.dirname(target) for _, target in pairs)
+            for _ in pool.map(self.make_folder, folders):
+                pass
+
+            copies = []
+            for (source, target), (method, copied) in zip(pairs, pool.map(self.link_one, pairs)):
+                if method == COPY:
+                    copies.append((source, target))
+                else:
+                    result.add(method)
+                    result.copied_bytes += copied
+            if instrument.ENABLED:
+                instrument.count('link', len(pairs) - len(copies))
+
+            if copies:
+                result.copied_bytes += self.copy(pool, copies)
+                result.add(COPY, len(copies))
+
+        result.frames = len(pairs)
+        result.elapsed = time.time() - start_time
+        return result
+
+    def make_folder(self, folder_path):
+        if not os.path.isdir(folder_path):
+            os.makedirs(folder_path, exist_ok=True)
+            return
+        sweep_temps(folder_path, STALE_TEMP_AGE)
+
+    def link_one(self, pair):
+        """
+        Returns:
+            tuple: method used, COPY when left to the chunked copy, and
+                number of bytes copied
+        """
+        source, target = pair
+        if is_identical(source, target):
+            return SKIPPED, 0
+        temp_path = get_temp_path(target)
+        for method in list(self.methods):
+            if method == COPY:
+                return COPY, 0
+            # Left by a run killed midway.
+            remove_file(temp_path)
+            try:
+                copied = self.functions[method](source, temp_path)
+            except OSError as error:
+                remove_file(temp_path)
+                if error.errno not in UNSUPPORTED_ERRORS:
+                    raise
+                with self.lock:
+                    if method in self.methods and len(self.methods) > 1:
+                        self.methods.remove(method)
+                continue
+            os.rename(temp_path, target)
+            return method, copied
+        raise OSError(errno.EOPNOTSUPP, 'Cannot link [{0}] to [{1}]'.format(source, target))
+
+    def copy(self, pool, copies):
+        """Copy the files left, every chunk of every file on the pool.
+
+        Returns:
+            int: number of bytes copied
+        """
+        chunks = []
+        total = 0
+        try:
+            for source, target in copies:
+                size = os.stat(source).st_size
+                temp_path = get_temp_path(target)
+                fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+                try:
+                    os.ftruncate(fd, size)
+                finally:
+                    os.close(fd)
+                for offset in range(0, size, CHUNK_SIZE):
+                    chunks.append(pool.submit(copy_chunk, source, temp_path, offset,
+                                              min(CHUNK_SIZE, size - offset)))
+                total += size
+
+            for future in chunks:
+                future.result()
+        except Exception:
+            for future in chunks:
+                future.cancel()
+            futures.wait(chunks)
+            for _, target in copies:
+                remove_file(get_temp_path(target))
+            raise
+        for source, target in copies:
+            temp_path = get_temp_path(target)
+            copy_metadata(source, temp_path)
+            os.rename(temp_path, target)
+        return total
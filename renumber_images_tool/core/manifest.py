@@ -0,0 +1,286 @@
+# Built-in
+import hashlib
+import json
+import os
+import time
+from concurrent import futures
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+from renumber_images_tool.core import instrument
+from renumber_images_tool.core.linker import get_temp_path
+
+# =============================================================================
+# GLOBALS
+# =============================================================================
+MANIFEST_VERSION = 1
+
+# Manifests are hidden files next to the frames, so scans skip them, e.g.
+# .shot_beauty.#.exr.manifest for shot_beauty.0001.exr
+MANIFEST_EXT = '.manifest'
+
+# xxh3 when available, several times faster than blake2b which is the
+# fastest of hashlib. The algorithm is recorded in every manifest.
+XXH3 = 'xxh3_128'
+BLAKE2B = 'blake2b'
+DEFAULT_ALGORITHM = XXH3 if xxhash is not None else BLAKE2B
+
+# Bytes read at once, large enough for sequential disk reads. hashlib and
+# xxhash release the GIL on such buffers, so threads hash in parallel.
+READ_SIZE = 4 * 1024 * 1024
+
+# Number of threads hashing frames.
+HASH_JOBS = 8
+
+# Stat fields of a manifest entry which must all match to reuse its hash.
+REUSE_KEYS = ('size', 'mtime_ns', 'ino', 'ctime_ns')
+
+# Problems of a checked frame.
+MISSING = 'missing'
+SIZE_MISMATCH = 'size mismatch'
+HASH_MISMATCH = 'hash mismatch'
+
+
+# =============================================================================
+# FUNCTIONS
+# =============================================================================
+def new_hash(algorithm):
+    """
+    Returns:
+        hash object with update() and hexdigest()
+    """
+    if algorithm == XXH3:
+        if xxhash is None:
+            raise ValueError('{} manifests need the xxhash module.'.format(XXH3))
+        return xxhash.xxh3_128()
+    if algorithm == BLAKE2B:
+        return hashlib.blake2b(digest_size=16)
+    raise ValueError('Unknown hash algorithm {}.'.format(algorithm))
+
+
+def get_manifest_path(directory, prefix, suffix, ext):
+    return os.path.join(directory, '.{0}#{1}{2}{3}'.format(prefix, suffix, ext, MANIFEST_EXT))
+
+
+def hash_file(path, algorithm=DEFAULT_ALGORITHM, previous=None):
+    """Hash a file with large sequential reads. The hash of the previous
+    entry is reused when the size, mtime, inode and ctime did not change: a
+    file replaced by another one with the same size and mtime, e.g. by
+    cp -p or rsync, has another inode, and writes or renames update the
+    ctime, which cannot be set back.
+
+    Args:
+        path (str): file path
+        algorithm (str): XXH3 or BLAKE2B
+        previous (dict): manifest entry of the file, None to always hash
+
+    Returns:
+        tuple: manifest entry, number of bytes read, True if the previous
+            hash was reused
+    """
+    with open(path, 'rb', buffering=0) as input_file:
+        file_stat = os.fstat(input_file.fileno())
+        if instrument.ENABLED:
+            instrument.count('stat')
+        entry = {'name': os.path.basename(path), 'size': file_stat.st_size, 'mtime_ns': file_stat.st_mtime_ns,
+                 'ino': file_stat.st_ino, 'ctime_ns': file_stat.st_ctime_ns}
+        if previous is not None and all(previous.get(key) == entry[key] for key in REUSE_KEYS):
+            entry['hash'] = previous['hash']
+            return entry, 0, True
+
+        if hasattr(os, 'posix_fadvise'):
+            os.posix_fadvise(input_file.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        digest = new_hash(algorithm)
+        buffer = bytearray(min(READ_SIZE, max(file_stat.st_size, 1)))
+        view = memoryview(buffer)
+        done = 0
+        while True:
+            size = input_file.readinto(buffer)
+            if not size:
+                break
+            digest.update(view[:size])
+            done += size
+    entry['hash'] = digest.hexdigest()
+    return entry, done, False
+
+
+def read_manifest(path):
+    """
+    Returns:
+        tuple: header dict, list of entry dicts in frame order
+    """
+    with open(path) as manifest_file:
+        lines = iter(manifest_file)
+        header = json.loads(next(lines, 'null'))
+        if not isinstance(header, dict) or header.get('version') != MANIFEST_VERSION:
+            raise ValueError('[{}] is not a manifest of this version.'.format(path))
+        return header, [json.loads(line) for line in lines if line.strip()]
+
+
+def write_manifest(path, header, entries):
+    """Write a manifest next to its frames, through a temporary file so a
+    manifest is never half written.
+    """
+    temp_path = get_temp_path(path)
+    with open(temp_path, 'w') as manifest_file:
+        manifest_file.write(json.dumps(header) + '\n')
+        manifest_file.writelines(json.dumps(entry, sort_keys=True) + '\n' for entry in entries)
+    os.rename(temp_path, path)
+
+
+def find_manifests(folder_path):
+    """
+    Returns:
+        list: manifest paths of a folder
+    """
+    if instrument.ENABLED:
+        instrument.count('listdir')
+    return sorted(entry.path for entry in os.scandir(folder_path)
+                  if entry.name.startswith('.') and entry.name.endswith(MANIFEST_EXT))
+
+
+def write_manifests(plans, output_dir=None, jobs=HASH_JOBS, algorithm=DEFAULT_ALGORITHM):
+    """Write the manifest of every re-numbered sequence: new frame name,
+    size, mtime, inode, ctime and hash. Frames of an existing manifest with
+    the same size, mtime, inode and ctime are not read again, so frames
+    renamed since are hashed again.
+
+    Args:
+        plans (list): RenamePlan objects, already executed
+        output_dir (str): folder the sequences were linked into, None if
+            they were re-numbered in place
+        jobs (int): number of threads hashing frames
+        algorithm (str): XXH3 or BLAKE2B
+
+    Returns:
+        ManifestResult
+    """
+    result = ManifestResult()
+    start_time = time.time()
+
+    manifests = []
+    with futures.ThreadPoolExecutor(max_workers=jobs) as pool:
+        for plan in plans:
+            sequence = plan.sequence
+            directory = output_dir or sequence.directory
+            manifest_path = get_manifest_path(directory, sequence.prefix, sequence.suffix, sequence.ext)
+            previous = {}
+            if os.path.isfile(manifest_path):
+                try:
+                    header, entries = read_manifest(manifest_path)
+                except ValueError:
+                    entries = []
+                else:
+                    if header.get('algorithm') == algorithm:
+                        previous = {entry['name']: entry for entry in entries}
+
+            paths = [os.path.join(directory, os.path.basename(new)) for _, new in plan.mappings()]
+            hashed = [pool.submit(hash_file, path, algorithm, previous.get(os.path.basename(path)))
+                      for path in paths]
+            manifests.append((manifest_path, sequence, hashed))
+
+        for manifest_path, sequence, hashed in manifests:
+            entries = []
+            for future in hashed:
+                entry, size, reused = future.result()
+                entries.append(entry)
+                result.add(size, reused)
+            header = {'version': MANIFEST_VERSION, 'algorithm': algorithm, 'prefix': sequence.prefix,
+                      'suffix': sequence.suffix, 'ext': sequence.ext, 'frames': len(entries)}
+            write_manifest(manifest_path, header, entries)
+            result.manifests += 1
+
+    result.elapsed = time.time() - start_time
+    return result
+
+
+def check_entry(path, entry, algorithm):
+    """
+    Returns:
+        tuple: problem, None if the frame matches its entry, and number of
+            bytes read
+    """
+    try:
+        size = os.stat(path).st_size
+    except OSError:
+        return MISSING, 0
+    if instrument.ENABLED:
+        instrument.count('stat')
+    # A size mismatch is known without reading the frame.
+    if size != entry['size']:
+        return SIZE_MISMATCH, 0
+    current, done, _ = hash_file(path, algorithm)
+    if current['hash'] != entry['hash']:
+        return HASH_MISMATCH, done
+    return None, done
+
+
+def check_manifests(folder_path, jobs=HASH_JOBS):
+    """Check the frames of a folder against its manifests, e.g. after a
+    copy to another site.
+
+    Args:
+        folder_path (str): folder holding the frames and their manifests
+        jobs (int): number of threads hashing frames
+
+    Returns:
+        tuple: ManifestResult, dict of problem by path of the bad frames
+    """
+    result = ManifestResult()
+    start_time = time.time()
+    manifest_paths = find_manifests(folder_path)
+    if not manifest_paths:
+        raise ValueError('[{}] has no manifest.'.format(folder_path))
+
+    problems = {}
+    with futures.ThreadPoolExecutor(max_workers=jobs) as pool:
+        checks = []
+        for manifest_path in manifest_paths:
+            header, entries = read_manifest(manifest_path)
+            algorithm = header.get('algorithm')
+            # Fail before reading anything when the hash is not available.
+            new_hash(algorithm)
+            for entry in entries:
+                path = os.path.join(folder_path, entry['name'])
+                checks.append((path, entry, pool.submit(check_entry, path, entry, algorithm)))
+            result.manifests += 1
+
+        for path, entry, future in checks:
+            problem, size = future.result()
+            result.add(size)
+            if problem is not None:
+                problems[path] = problem
+
+    result.elapsed = time.time() - start_time
+    return result, problems
+
+
+# =============================================================================
+# CLASSES
+# =============================================================================
+class ManifestResult(object):
+    """
+    Counters of writing or checking manifests.
+    """
+
+    def __init__(self):
+        self.manifests = 0
+        self.frames = 0
+        self.hashed_bytes = 0
+        self.reused = 0
+        self.elapsed = 0.0
+
+    def __str__(self):
+        rate = self.hashed_bytes / (1024.0 * 1024.0) / self.elapsed if self.elapsed else 0.0
+        reused = ' ({} unchanged)'.format(self.reused) if self.reused else ''
+        return '{0} manifests, {1} frames{2}, {3:.1f}MB hashed in {4:.2f}s ({5:.0f}MB/s)'.format(
+            self.manifests, self.frames, reused, self.hashed_bytes / (1024.0 * 1024.0), self.elapsed, rate)
+
+    def add(self, size, reused=False):
+        self.frames += 1
+        self.hashed_bytes += size
+        if reused:
+            self.reused += 1
@@ -0,0 +1,173 @@
+# Built-in
+import io
+import json
+import os
+import sys
+import threading
+import time
+
+from renumber_images_tool.core import instrument
+from renumber_images_tool.core.executor import execute_renames
+
+# =============================================================================
+# GLOBALS
+# =============================================================================
+PLAN_VERSION = 1
+
+# Size of the write buffer of a plan file.
+WRITE_BUFFER = 1024 * 1024
+
+# Number of mismatching sources listed in the error of check_sources.
+MAX_MISMATCHES = 10
+
+
+# =============================================================================
+# FUNCTIONS
+# =============================================================================
+def read_plan(path):
+    """Read the renames of a plan file, one record at a time.
+
+    Args:
+        path (str): plan file written by PlanWriter, '-' for stdin
+
+    Returns:
+        list: (old path, new path, size, mtime in ns) tuples in plan order
+    """
+    plan_file = sys.stdin if path == '-' else io.open(path, 'r', encoding='utf-8')
+    try:
+        header = json.loads(plan_file.readline() or '{}')
+        if header.get('version') != PLAN_VERSION:
+            raise ValueError('[{}] is not a re-numbering plan.'.format(path))
+
+        renames = []
+        for line in plan_file:
+            record = json.loads(line)
+            if 'old' in record:
+                renames.append((record['old'], record['new'], record['size'], record['mtime_ns']))
+    finally:
+        if plan_file is not sys.stdin:
+            plan_file.close()
+    return renames
+
+
+def check_sources(renames, stat_func=os.lstat):
+    """Make sure the sources of a plan did not change since it was written,
+    with one stat per file and no listing.
+
+    Args:
+        renames (list): (old path, new path, size, mtime in ns) tuples
+        stat_func (callable): function returning the stat of a path
+
+    Returns:
+        int: number of stats done
+    """
+    mismatches = []
+    for old, _, size, mtime_ns in renames:
+        try:
+            stat = stat_func(old)
+        except OSError:
+            mismatches.append('{} is missing'.format(old))
+            continue
+        if stat.st_size != size or stat.st_mtime_ns != mtime_ns:
+            mismatches.append('{} was modified'.format(old))
+
+    if instrument.ENABLED:
+        instrument.count('stat', len(renames))
+
+    if mismatches:
+        more = len(mismatches) - MAX_MISMATCHES
+        lines = mismatches[:MAX_MISMATCHES] + (['... {} more'.format(more)] if more > 0 else [])
+        raise OSError('The plan does not match the files on disk anymore:\n  {}'.format('\n  '.join(lines)))
+    return len(renames)
+
+
+def apply_plan(path, rename_func=os.rename, lexists_func=os.path.lexists, jobs=1,
+               progress=None, journal=None):
+    """Execute a plan file after checking its sources, without scanning.
+
+    Every rename goes through the dependency graph of the executor, so the
+    targets are checked again: files may have appeared since the plan was
+    written.
+
+    Args:
+        path (str): plan file written by PlanWriter, '-' for stdin
+        rename_func (callable): function doing the rename, os.rename by default
+        lexists_func (callable): function checking a path, os.path.lexists by default
+        jobs (int): number of threads issuing renames
+        progress (callable): called with the number of renames done and total
+        journal (Journal): records the steps so they can be undone or resumed
+
+    Returns:
+        RenameResult
+    """
+    start_time = time.time()
+    renames = read_plan(path)
+    stats = check_sources(renames)
+    result = execute_renames([(old, new) for old, new, _, _ in renames], rename_func, lexists_func,
+                             jobs, progress, journal)
+    result.stats += stats
+    result.elapsed = time.time() - start_time
+    return result
+
+
+# =============================================================================
+# CLASSES
+# =============================================================================
+class PlanWriter(object):
+    """
+    Stream rename plans to a file as NDJSON through a large write buffer.
+
+    The first line is a header, then every plan gets a sequence record
+    followed by one record per rename with the size and mtime of the source,
+    so the plan can be checked and applied later without a new scan:
+
+        {"version": 1, "created": 1700000000.0}
+        {"sequence": "/shot/test*.exr", "source": ..., "preview": ..., "renames": 2}
+        {"old": "/shot/test11.exr", "new": "/shot/test01.exr", "size": 1024, "mtime_ns": ...}
+    """
+
+    def __init__(self, path):
+        self.path = path
+        if path == '-':
+            self.file = sys.stdout
+        else:
+            self.file = io.open(path, 'w', encoding='utf-8', buffering=WRITE_BUFFER)
+        # Folders may be planned concurrently, the plans of one sequence stay together.
+        self.lock = threading.Lock()
+        self.write({'version': PLAN_VERSION, 'created': time.time()})
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def write(self, record):
+        self.file.write(json.dumps(record, separators=(',', ':')) + '\n')
+
+    def write_plans(self, plans):
+        """
+        Args:
+            plans (list): RenamePlan objects
+        """
+        with self.lock:
+            self._write_plans(plans)
+
+    def _write_plans(self, plans):
+        abspath = os.path.abspath
+        for plan in plans:
+            self.write({'sequence': abspath(plan.sequence.pattern), 'source': abspath(plan.source),
+                        'preview': abspath(plan.preview), 'renames': len(plan)})
+            # Paths are absolute so the plan can be applied from anywhere.
+            for old, new in plan:
+                stat = os.lstat(old)
+                self.write({'old': abspath(old), 'new': abspath(new),
+                            'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns})
+            if instrument.ENABLED:
+                instrument.count('stat', len(plan))
+
+    def close(self):
+        if self.file is sys.stdout:
+            self.file.flush()
+        else:
+            self.file.close()
@@ -0,0 +1,184 @@
+# Built-in
+import itertools
+import os
+
+from renumber_images_tool.core.sequence import format_token
+
+# =============================================================================
+# GLOBALS
+# =============================================================================
+# Minimum number of digits of a re-numbered frame.
+MIN_PADDING = 2
+
+# Order in which the renames of a plan can run without overwriting a frame.
+ASCENDING = 'ascending'
+DESCENDING = 'descending'
+
+
+# =============================================================================
+# FUNCTIONS
+# =============================================================================
+def get_padding(last_frame):
+    """Padding is based on the last new frame number. Minimum is 2 digits.
+    """
+    return max(MIN_PADDING, len(str(last_frame)))
+
+
+def plan_sequences(sequences, start=1, step=1, padding=None):
+    """Build the rename plan of every sequence.
+
+    Args:
+        sequences (list): Sequence objects
+        start (int): first new frame
+        step (int): increment between new frames
+        padding (int): number of digits, based on the last frame if None
+
+    Returns:
+        list: RenamePlan objects
+    """
+    return [RenamePlan(sequence, start=start, step=step, padding=padding) for sequence in sequences]
+
+
+# =============================================================================
+# CLASSES
+# =============================================================================
+class RenamePlan(object):
+    """
+    Rename plan of one sequence: frames sorted by their integer value and
+    re-numbered from start by step. Identity renames are left out.
+    No filesystem call is made while planning.
+    """
+
+    def __init__(self, sequence, start=1, step=1, padding=None):
+        if start < 0:
+            raise ValueError('Start frame must be positive, got {}.'.format(start))
+        if step < 1:
+            raise ValueError('Step must be at least 1, got {}.'.format(step))
+
+        self.sequence = sequence
+        self.first = start
+        self.step = step
+        self.last = start + max(len(sequence) - 1, 0) * step
+        self.padding = padding or get_padding(self.last)
+        # Frames sorted by value with their widths, and ASCENDING, DESCENDING
+        # or None when the renames need the dependency graph of the executor.
+        # Set by build().
+        self.frames = None
+        self.widths = None
+        self.order = None
+        self.renames = self.build()
+
+    def __len__(self):
+        return len(self.renames)
+
+    def __iter__(self):
+        return iter(self.renames)
+
+    @property
+    def preview(self):
+        """
+        Wildcard path of the result, e.g. /path/test[01-03].exr
+        """
+        return self.sequence.path('[{0}-{1}]'.format(self.format_frame(self.first),
+                                                     self.format_frame(self.last)))
+
+    @property
+    def frame_count(self):
+        return len(self.frames)
+
+    @property
+    def source(self):
+        """
+        Wildcard path of the sequence with its frame range, e.g. /path/test[11-2340].exr
+        """
+        if not self.frames:
+            return self.sequence.pattern
+        return self.sequence.path('[{0}-{1}]'.format(self.old_token(0), self.old_token(-1)))
+
+    def format_frame(self, frame):
+        return format_token(frame, self.padding)
+
+    def old_token(self, index):
+        """
+        Frame token of the index-th frame, in frame order, before re-numbering.
+        """
+        if self.widths is None:
+            return format_token(self.frames[index], self.sequence.padding)
+        return format_token(self.frames[index], self.widths[index])
+
+    def old_name(self, index):
+        """
+        File name of the index-th frame, in frame order, before re-numbering.
+        """
+        return self.sequence.filename(self.old_token(index))
+
+    def new_name(self, index):
+        """
+        File name of the index-th frame, in frame order, after re-numbering.
+        """
+        return self.sequence.filename(self.format_frame(self.first + index * self.step))
+
+    def build(self):
+        """
+        Returns:
+            list: (old path, new path) tuples in frame order
+        """
+        sequence = self.sequence
+        head = os.path.join(sequence.directory, sequence.prefix)
+        tail = sequence.suffix + sequence.ext
+        self.frames, self.widths = sequence.sorted_frames()
+
+        widths = self.widths
+        if widths is None:
+            widths = itertools.repeat(sequence.padding)
+        new_frames = itertools.count(self.first, self.step)
+
+        renames = []
+        moves_up = moves_down = duplicated = False
+        previous = None
+        for frame, width, new_frame in zip(self.frames, widths, new_frames):
+            moves_up = moves_up or new_frame > frame
+            moves_down = moves_down or new_frame < frame
+            duplicated = duplicated or frame == previous
+            previous = frame
+
+            token = '%0*d' % (width, frame)
+            new_token = '%0*d' % (self.padding, new_frame)
+            if new_token == token:
+                continue
+            renames.append((head + token + tail, head + new_token + tail))
+
+        # New frames keep the old frame order, so when every frame moves the
+        # same way, renaming from the far end never overwrites a frame that
+        # is still to be renamed. New names of frames that are not part of the
+        # sequence are free as of the scan.
+        if not duplicated:
+            if not moves_up:
+                self.order = ASCENDING
+            elif not moves_down:
+                self.order = DESCENDING
+
+        return renames
+
+    def mappings(self):
+        """
+        Yields:
+            tuple: (old path, new path) of every frame in frame order,
+                identity renames included, e.g. to build a copy of the
+                sequence elsewhere
+        """
+        for index in range(len(self.frames)):
+            yield (self.sequence.path(self.old_token(index)),
+                   self.sequence.path(self.format_frame(self.first + index * self.step)))
+
+    def ordered_renames(self):
+        """
+        Returns:
+            list: renames in the order they can safely run in, None if the
+                plan has no such order
+        """
+        if self.order == ASCENDING:
+            return self.renames
+        if self.order == DESCENDING:
+            return self.renames[::-1]
+        return None
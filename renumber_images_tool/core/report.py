@@ -0,0 +1,202 @@
+# Built-in
+import collections
+import itertools
+import operator
+
+# =============================================================================
+# GLOBALS
+# =============================================================================
+# Frame ranges accepted by the framerangevalidator of the GUI: 105-110x2, or 105-110:2
+FRAME_RANGE_SYNTAX = r'((\d+(,|\-\d+(,|x\d+,)))*)|((\d+\-\d+(:\d+)))*'
+
+
+# =============================================================================
+# FUNCTIONS
+# =============================================================================
+def unique(sorted_frames):
+    """
+    Drop the repeated frames (test1.exr, test01.exr) of sorted frames.
+
+    Returns:
+        list: frames sorted by value, each once
+    """
+    return list(map(operator.itemgetter(0), itertools.groupby(sorted_frames)))
+
+
+def get_runs(sorted_frames):
+    """Runs of equal differences between consecutive frames, found by map and
+    groupby rather than a Python loop over the frames. Ranges, gaps and the
+    step are then found with one Python step per run, not per frame.
+
+    Args:
+        sorted_frames (list): frames sorted by value
+
+    Returns:
+        tuple: the frames each once, and a list of (difference, count) runs
+    """
+    runs = [(delta, len(list(run))) for delta, run in
+            itertools.groupby(map(operator.sub, itertools.islice(sorted_frames, 1, None), sorted_frames))]
+    if any(delta == 0 for delta, _ in runs):
+        sorted_frames = unique(sorted_frames)
+        return get_runs(sorted_frames)
+    return sorted_frames, runs
+
+
+def iter_ranges(sorted_frames, runs=None):
+    """Compact sorted frames into (start, end, step) ranges.
+
+    A stepped range needs at least three frames, so 1, 5 gives two single
+    frames rather than 1-5x4.
+
+    Args:
+        sorted_frames (list): frames sorted by value
+        runs (list): runs of the frames given by get_runs, the frames must
+            already be unique then
+
+    Yields:
+        tuple: start, end, step
+    """
+    if runs is None:
+        sorted_frames, runs = get_runs(sorted_frames)
+    if not len(sorted_frames):
+        return
+
+    start = 0
+    end = 0
+    for delta, count in runs:
+        end += count
+        while start < end:
+            if end - start == 1 and delta != 1:
+                # Two frames do not make a stepped range, the second one may
+                # start the next range.
+                yield sorted_frames[start], sorted_frames[start], 1
+                start = end
+            else:
+                yield sorted_frames[start], sorted_frames[end], delta
+                start = end + 1
+    if start == end:
+        yield sorted_frames[end], sorted_frames[end], 1
+
+
+def get_step(runs):
+    """Step of the sequence: the most common difference between its frames,
+    so a sequence rendered on twos is not reported as missing every other frame.
+    A difference seen once (1, 5) is a gap rather than a step.
+
+    Args:
+        runs (list): runs of the frames given by get_runs
+
+    Returns:
+        int: step
+    """
+    counts = collections.Counter()
+    for delta, count in runs:
+        counts[delta] += count
+    if not counts:
+        return 1
+    step, count = max(counts.items(), key=lambda item: (item[1], -item[0]))
+    return step if count > 1 else 1
+
+
+def iter_gaps(sorted_frames, step=1, runs=None):
+    """Missing frames between the first and the last frame: frames expected
+    every step after a frame and before the next one, so 1, 5 on ones misses
+    2-4 and 1, 6 on twos misses 3-5x2.
+
+    Args:
+        sorted_frames (list): frames sorted by value
+        step (int): step of the sequence
+        runs (list): runs of the frames given by get_runs, the frames must
+            already be unique then
+
+    Yields:
+        tuple: start, end, step of every run of missing frames
+    """
+    if runs is None:
+        sorted_frames, runs = get_runs(sorted_frames)
+    if not runs:
+        return
+
+    index = 0
+    for delta, count in runs:
+        if delta > step:
+            for previous in sorted_frames[index:index + count]:
+                yield previous + step, previous + (delta - 1) // step * step, step
+        index += count
+
+
+def format_ranges(ranges):
+    """Format ranges with the framerangevalidator syntax of the GUI,
+    e.g. 1-10,12,20-30x2, where every range ends with a comma.
+    """
+    parts = []
+    for start, end, step in ranges:
+        if start == end:
+            parts.append(str(start))
+        elif step == 1:
+            parts.append('{0}-{1}'.format(start, end))
+        else:
+            parts.append('{0}-{1}x{2}'.format(start, end, step))
+    return ''.join(part + ',' for part in parts)
+
+
+def report_plans(plans):
+    """
+    Args:
+        plans (list): RenamePlan objects, their frames are already sorted
+
+    Returns:
+        list: SequenceReport objects
+    """
+    return [SequenceReport(plan.sequence, plan.frames) for plan in plans]
+
+
+def report_sequences(sequences, step=None):
+    """
+    Args:
+        sequences (list): Sequence objects
+        step (int): expected step between the frames, the most common one if None
+
+    Returns:
+        list: SequenceReport objects
+    """
+    return [SequenceReport(sequence, step=step) for sequence in sequences]
+
+
+# =============================================================================
+# CLASSES
+# =============================================================================
+class SequenceReport(object):
+    """
+    Frame ranges and gaps of a sequence.
+    """
+
+    def __init__(self, sequence, sorted_frames=None, step=None):
+        if sorted_frames is None:
+            sorted_frames = sequence.sorted_frames()[0]
+        frames, runs = get_runs(sorted_frames)
+
+        self.sequence = sequence
+        self.count = len(sorted_frames)
+        self.first = sorted_frames[0] if self.count else None
+        self.last = sorted_frames[-1] if self.count else None
+        self.step = step or get_step(runs)
+        self.ranges = list(iter_ranges(frames, runs))
+        self.gaps = list(iter_gaps(frames, self.step, runs))
+        self.missing = sum(len(range(start, end + 1, step)) for start, end, step in self.gaps)
+        self.duplicates = self.count - len(frames)
+
+    def __str__(self):
+        step = 'x{}'.format(self.step) if self.step > 1 else ''
+        lines = ['{0}: {1} frames, {2}-{3}{4}'.format(self.sequence.pattern, self.count,
+                                                      self.first, self.last, step),
+                 '  frames:  {}'.format(format_ranges(self.ranges))]
+        if self.gaps:
+            lines.append('  missing: {0} ({1} frames)'.format(format_ranges(self.gaps), self.missing))
+        if self.duplicates:
+            lines.append('  duplicated frames: {}'.format(self.duplicates))
+        return '\n'.join(lines)
+
+    @property
+    def is_complete(self):
+        return not self.gaps and not self.duplicates
@@ -0,0 +1,175 @@
+# Built-in
+import errno
+import os
+import re
+import stat
+import time
+from concurrent import futures
+
+from renumber_images_tool.core import instrument
+from renumber_images_tool.core.sequence import Sequence
+
+# =============================================================================
+# GLOBALS
+# =============================================================================
+# The frame token is the last run of digits before the extension.
+FRAME_REGEX = re.compile(r'(\d+)(\D*)$')
+
+# Image extensions picked up by the GUI.
+SUPPORTED_EXT = ['.exr', '.jpg', '.tex', '.png', '.tif', '.tiff', '.rat']
+
+# Number of threads listing directories in recursive mode.
+WALK_JOBS = 8
+
+
+# =============================================================================
+# FUNCTIONS
+# =============================================================================
+def split_frame(filename):
+    """Split a file name into (prefix, frame token, suffix, extension).
+
+    Args:
+        filename (str): file name without directory
+
+    Returns:
+        tuple: None if the name does not carry a frame number
+    """
+    stem, ext = os.path.splitext(filename)
+    match = FRAME_REGEX.search(stem)
+    if not match:
+        return None
+    return stem[:match.start()], match.group(1), match.group(2), ext
+
+
+def scan_sequences(folder_path, extensions=None, cache=None, stop_event=None):
+    """Group the files of a folder into sequences in a single directory pass.
+
+    Hidden files are ignored.
+
+    Args:
+        folder_path (str): directory path to images
+        extensions (list): only keep files with these extensions, all if None
+        cache (ScanCache): reuse the listing of unchanged folders
+        stop_event (threading.Event): stops the listing with an ECANCELED
+            OSError once set
+
+    Returns:
+        list: Sequence objects sorted by pattern
+    """
+    if cache is None:
+        if instrument.ENABLED:
+            instrument.count('stat')
+        if not os.path.isdir(folder_path):
+            raise OSError('[{}] does not exist.'.format(folder_path))
+
+    return scan_folder(folder_path, extensions, cache, stop_event)[0]
+
+
+def scan_folder(folder_path, extensions=None, cache=None, stop_event=None):
+    """Single directory pass returning both the sequences and the sub folders.
+
+    Args:
+        folder_path (str): directory path to images
+        extensions (list): only keep files with these extensions, all if None
+        cache (ScanCache): reuse the listing of unchanged folders
+        stop_event (threading.Event): stops the listing with an ECANCELED
+            OSError once set, nothing is cached then
+
+    Returns:
+        tuple: list of Sequence objects sorted by pattern, list of sub folder
+            paths. Hidden and symlinked folders are not returned.
+    """
+    if cache is None:
+        return list_folder(folder_path, extensions, stop_event)
+
+    # The folder is stat-ed before being listed, so a change during the
+    # listing makes the cached entry stale rather than wrong.
+    try:
+        cached, folder_stat = cache.get(folder_path, extensions)
+    except OSError:
+        raise OSError('[{}] does not exist.'.format(folder_path))
+    if not stat.S_ISDIR(folder_stat.st_mode):
+        raise OSError('[{}] does not exist.'.format(folder_path))
+    if cached is not None:
+        return cached
+
+    sequences, sub_folders = list_folder(folder_path, extensions, stop_event)
+    cache.put(folder_path, folder_stat, sequences, sub_folders, extensions)
+    return sequences, sub_folders
+
+
+def list_folder(folder_path, extensions=None, stop_event=None):
+    sequences = {}
+    sub_folders = []
+    if instrument.ENABLED:
+        instrument.count('listdir')
+    for entry in os.scandir(folder_path):
+        if stop_event is not None and stop_event.is_set():
+            raise OSError(errno.ECANCELED, 'Scan cancelled', folder_path)
+        name = entry.name
+        if name.startswith('.'):
+            continue
+        if entry.is_dir(follow_symlinks=False):
+            sub_folders.append(entry.path)
+            continue
+        if not entry.is_file():
+            continue
+
+        parts = split_frame(name)
+        if parts is None:
+            continue
+        prefix, token, suffix, ext = parts
+        if extensions is not None and ext not in extensions:
+            continue
+
+        key = (prefix, suffix, ext)
+        sequence = sequences.get(key)
+        if sequence is None:
+            sequence = sequences[key] = Sequence(folder_path, prefix, suffix, ext)
+        sequence.add(token)
+
+    return sorted(sequences.values(), key=lambda seq: seq.pattern), sub_folders
+
+
+def _timed_scan_folder(folder_path, extensions, cache):
+    start_time = time.time()
+    sequences, sub_folders = scan_folder(folder_path, extensions, cache)
+    return folder_path, sequences, sub_folders, time.time() - start_time
+
+
+def walk_sequences(root_path, extensions=None, jobs=WALK_JOBS, cache=None):
+    """Walk a folder tree with a pool of threads listing folders in parallel.
+
+    Sequences are yielded as soon as their folder is listed, so the caller can
+    plan and rename while the walk goes on. Folders that cannot be listed are
+    yielded with the error instead of stopping the walk.
+
+    Args:
+        root_path (str): top folder of the tree
+        extensions (list): only keep files with these extensions, all if None
+        jobs (int): number of threads listing folders
+        cache (ScanCache): reuse the listing of unchanged folders
+
+    Yields:
+        tuple: folder path, list of Sequence objects, seconds spent listing
+            the folder, exception or None
+    """
+    if instrument.ENABLED:
+        instrument.count('stat')
+    if not os.path.isdir(root_path):
+        raise OSError('[{}] does not exist.'.format(root_path))
+
+    with futures.ThreadPoolExecutor(max_workers=jobs) as pool:
+        pending = {pool.submit(_timed_scan_folder, root_path, extensions, cache): root_path}
+        while pending:
+            finished, _ = futures.wait(pending, return_when=futures.FIRST_COMPLETED)
+            for future in finished:
+                folder_path = pending.pop(future)
+                try:
+                    folder_path, sequences, sub_folders, elapsed = future.result()
+                except OSError as error:
+                    yield folder_path, [], 0.0, error
+                    continue
+                for sub_folder in sub_folders:
+                    pending[pool.submit(_timed_scan_folder, sub_folder, extensions, cache)] = sub_folder
+                yield folder_path, sequences, elapsed, None
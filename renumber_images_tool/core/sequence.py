@@ -0,0 +1,164 @@
+# Built-in
+import os
+from array import array
+
+# =============================================================================
+# GLOBALS
+# =============================================================================
+# Padding bound of a sequence made of unpadded frames only, e.g. 5, 10, 100.
+NO_PADDING_LIMIT = 1 << 30
+
+
+# =============================================================================
+# FUNCTIONS
+# =============================================================================
+def format_token(frame, width):
+    return '%0*d' % (width, frame)
+
+
+def get_width_bounds(token):
+    """Range of paddings which give back the token from its integer frame.
+
+    '0011' only comes from a padding of 4, '11' from a padding of 1 or 2.
+    """
+    if len(token) > 1 and token[0] == '0':
+        return len(token), len(token)
+    return 1, len(token)
+
+
+# =============================================================================
+# CLASSES
+# =============================================================================
+class Sequence(object):
+    """
+    A group of image files sharing the same directory, prefix, suffix and
+    extension, and differing only by their frame number.
+
+    test0011.exr -> prefix 'test', frame 11, padding 4, suffix '', ext '.exr'
+
+    Frames are kept as 64-bit integers in an array and the directory, prefix,
+    suffix, extension and padding are stored once, so a million frame
+    sequence costs about 8MB instead of a million path strings. File names are
+    built on demand. Sequences mixing paddings (test5.exr, test0010.exr) keep
+    one extra byte per frame for its width.
+    """
+    __slots__ = ('directory', 'prefix', 'suffix', 'ext', 'frames', 'widths',
+                 '_min_padding', '_max_padding')
+
+    def __init__(self, directory, prefix, suffix, ext):
+        self.directory = directory
+        self.prefix = prefix
+        self.suffix = suffix
+        self.ext = ext
+        self.frames = array('q')
+        # Width of every frame token, only used when the paddings are mixed.
+        self.widths = None
+        # Paddings giving back every token seen so far.
+        self._min_padding = 1
+        self._max_padding = NO_PADDING_LIMIT
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __iter__(self):
+        for index in range(len(self.frames)):
+            yield self.token(index)
+
+    def __repr__(self):
+        return '<Sequence {0} ({1} frames)>'.format(self.pattern, len(self))
+
+    @property
+    def pattern(self):
+        """
+        Wildcard path of the sequence, e.g. /path/test*.exr
+        """
+        return self.path('*')
+
+    @property
+    def padding(self):
+        """
+        Padding shared by every frame, None when the paddings are mixed.
+        """
+        if self.widths is not None:
+            return None
+        return self._min_padding
+
+    def add(self, token):
+        frame = int(token)
+        self.frames.append(frame)
+
+        if self.widths is not None:
+            self.widths.append(len(token))
+            return
+
+        min_padding, max_padding = get_width_bounds(token)
+        min_padding = max(min_padding, self._min_padding)
+        max_padding = min(max_padding, self._max_padding)
+        if min_padding <= max_padding:
+            self._min_padding = min_padding
+            self._max_padding = max_padding
+            return
+
+        # Mixed paddings: remember the width of every frame from now on.
+        self.widths = array('B', (len(format_token(previous, self._min_padding))
+                                  for previous in self.frames[:-1]))
+        self.widths.append(len(token))
+
+    def width(self, index):
+        if self.widths is not None:
+            return self.widths[index]
+        return self._min_padding
+
+    def token(self, index):
+        return format_token(self.frames[index], self.width(index))
+
+    def filename(self, token):
+        return '{0}{1}{2}{3}'.format(self.prefix, token, self.suffix, self.ext)
+
+    def path(self, token):
+        return os.path.join(self.directory, self.filename(token))
+
+    def paths(self):
+        return [self.path(token) for token in self]
+
+    def sorted_frames(self):
+        """
+        Frames sorted once with the built-in sort. The range queries (ranges,
+        gaps and step in core.report, new frames in core.planner) work on
+        this array rather than on the Sequence.
+
+        Returns:
+            tuple: frames sorted by their integer value, as an array, and
+                their widths in the same order, None when the padding is shared
+        """
+        if self.widths is None:
+            return array('q', sorted(self.frames)), None
+
+        # Ties (test1.exr, test01.exr) fall back to the token width so the
+        # order is stable across runs.
+        pairs = sorted(zip(self.frames, self.widths))
+        return array('q', (frame for frame, _ in pairs)), array('B', (width for _, width in pairs))
+
+    def to_data(self):
+        """
+        Returns:
+            dict: compact description of the sequence, frames and widths as raw bytes
+        """
+        return {
+            'prefix': self.prefix,
+            'suffix': self.suffix,
+            'ext': self.ext,
+            'frames': self.frames.tobytes(),
+            'widths': self.widths.tobytes() if self.widths is not None else None,
+            'padding': [self._min_padding, self._max_padding],
+        }
+
+    @classmethod
+    def from_data(cls, directory, data):
+        sequence = cls(directory, data['prefix'], data['suffix'], data['ext'])
+        sequence.frames.frombytes(data['frames'])
+        if data['widths'] is not None:
+            sequence.widths = array('B')
+            sequence.widths.frombytes(data['widths'])
+        sequence._min_padding, sequence._max_padding = data['padding']
+        return sequence
@@ -0,0 +1,140 @@
+# Built-in
+import time
+from collections import OrderedDict
+
+from renumber_images_tool.core import instrument
+
+
+# =============================================================================
+# CLASSES
+# =============================================================================
+class Summary(object):
+    """
+    Counters and per phase timings of a re-numbering run.
+    """
+
+    def __init__(self):
+        self.folders = 0
+        self.sequences = 0
+        self.frames = 0
+        self.renames = 0
+        self.temp_renames = 0
+        self.syscalls = 0
+        # Frames materialized in an output folder and bytes copied to do so.
+        self.links = 0
+        self.copied_bytes = 0
+        # Frames found empty, truncated or of the wrong format by --verify.
+        self.bad_frames = 0
+        self.failures = []
+        self.phases = OrderedDict()
+        self.start_time = time.time()
+        self.elapsed = 0.0
+        # Filesystem calls by kind and peak memory, only with instrumentation
+        # enabled. Calls are counted from the start of the summary.
+        self.calls = {}
+        self.peak_memory = None
+        self._start_calls = instrument.get_counts() if instrument.ENABLED else {}
+
+    def __str__(self):
+        lines = ['Folders: {0}  Sequences: {1}  Frames: {2}  Renames: {3} ({4} temporary)  '
+                 'Syscalls: {5}  Failures: {6}'.format(self.folders, self.sequences, self.frames,
+                                                       self.renames, self.temp_renames, self.syscalls,
+                                                       len(self.failures))]
+        if self.links:
+            lines.append('  Linked: {0} frames, {1:.1f}MB copied'.format(self.links,
+                                                                    self.copied_bytes / (1024.0 * 1024.0)))
+        if self.bad_frames:
+            lines.append('  Bad frames: {}'.format(self.bad_frames))
+        for phase, seconds in self.phases.items():
+            lines.append('  {0:<8} {1:.3f}s'.format(phase, seconds))
+        lines.append('  {0:<8} {1:.3f}s'.format('total', self.elapsed))
+        if instrument.ENABLED:
+            lines.append('  {}'.format(self.format_calls()))
+        for folder_path, error in self.failures:
+            lines.append('  FAILED {0}: {1}'.format(folder_path, error))
+        return '\n'.join(lines)
+
+    def format_calls(self):
+        """
+        One line of filesystem calls and peak memory, e.g.
+        listdir: 1  stat: 3  rename: 120  link: 0  read: 0  peak memory: 42.1MB
+        """
+        parts = ['{0}: {1}'.format(name, self.calls.get(name, 0))
+                 for name in ('listdir', 'stat', 'rename', 'link', 'read')]
+        if self.peak_memory is not None:
+            parts.append('peak memory: {:.1f}MB'.format(self.peak_memory / (1024.0 * 1024.0)))
+        return '  '.join(parts)
+
+    def format_phases(self):
+        """
+        One line of phase timings, e.g. scan 0.120s  plan 0.010s
+        """
+        return '  '.join('{0} {1:.3f}s'.format(phase, seconds) for phase, seconds in self.phases.items())
+
+    def to_data(self):
+        """
+        Returns:
+            dict: counters, timings and calls, ready to dump as JSON
+        """
+        return {
+            'folders': self.folders,
+            'sequences': self.sequences,
+            'frames': self.frames,
+            'renames': self.renames,
+            'temp_renames': self.temp_renames,
+            'syscalls': self.syscalls,
+            'links': self.links,
+            'copied_bytes': self.copied_bytes,
+            'bad_frames': self.bad_frames,
+            'failures': [[folder_path, str(error)] for folder_path, error in self.failures],
+            'phases': dict(self.phases),
+            'elapsed': self.elapsed,
+            'calls': self.calls,
+            'peak_memory': self.peak_memory,
+        }
+
+    def add_time(self, phase, seconds):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def add_result(self, result):
+        """
+        Add the counters of a RenameResult.
+        """
+        self.renames += result.renames
+        self.temp_renames += result.temp_renames
+        self.syscalls += result.syscalls
+
+    def merge(self, other):
+        """
+        Add the counters, timings and failures of another Summary. Calls are
+        not added: they are counted process wide, see stop().
+        """
+        self.folders += other.folders
+        self.sequences += other.sequences
+        self.frames += other.frames
+        self.renames += other.renames
+        self.temp_renames += other.temp_renames
+        self.syscalls += other.syscalls
+        self.links += other.links
+        self.copied_bytes += other.copied_bytes
+        self.bad_frames += other.bad_frames
+        self.failures.extend(other.failures)
+        for phase, seconds in other.phases.items():
+            self.add_time(phase, seconds)
+
+    def add_link_result(self, result):
+        """
+        Add the counters of a LinkResult.
+        """
+        self.links += result.frames
+        self.copied_bytes += result.copied_bytes
+
+    def add_failure(self, folder_path, error):
+        self.failures.append((folder_path, error))
+
+    def stop(self):
+        self.elapsed = time.time() - self.start_time
+        if instrument.ENABLED:
+            counts = instrument.get_counts()
+            self.calls = {name: number - self._start_calls.get(name, 0) for name, number in counts.items()}
+            self.peak_memory = instrument.get_peak_memory()
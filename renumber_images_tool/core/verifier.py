@@ -0,0 +1,248 @@
+# Built-in
+import errno
+import itertools
+import os
+import struct
+from concurrent import futures
+
+from renumber_images_tool.core import instrument
+
+# =============================================================================
+# GLOBALS
+# =============================================================================
+# Bytes read from the start of a frame, enough for most headers. Larger
+# OpenEXR headers are read again in full.
+HEAD_SIZE = 4096
+TAIL_SIZE = 64
+MAX_HEADER_SIZE = 1024 * 1024
+
+# Number of threads checking frames, and frames checked per task so 100k
+# frames do not make 100k futures.
+VERIFY_JOBS = 8
+BATCH_SIZE = 512
+
+EXR_MAGIC = b'\x76\x2f\x31\x01'
+EXR_TILED = 0x200
+EXR_DEEP = 0x800
+EXR_MULTIPART = 0x1000
+# Scanlines per chunk by OpenEXR compression: none, rle, zips, zip, piz,
+# pxr24, b44, b44a, dwaa, dwab.
+EXR_LINES = [1, 1, 1, 16, 32, 16, 32, 32, 32, 256]
+
+PNG_MAGIC = b'\x89PNG\r\n\x1a\n'
+PNG_END = b'\x00\x00\x00\x00IEND\xaeB`\x82'
+JPEG_MAGIC = b'\xff\xd8\xff'
+JPEG_END = b'\xff\xd9'
+TIFF_MAGICS = {b'II*\x00': '<', b'MM\x00*': '>'}
+BIGTIFF_MAGICS = {b'II+\x00': '<', b'MM\x00+': '>'}
+
+
+# =============================================================================
+# FUNCTIONS
+# =============================================================================
+def read_at(fd, size, offset):
+    if instrument.ENABLED:
+        instrument.count('read')
+    return os.pread(fd, size, offset)
+
+
+def check_exr(fd, size, head):
+    """Walk the header attributes, then check the offset table and the last
+    chunk of scanline images lie within the file.
+    """
+    if not head.startswith(EXR_MAGIC):
+        return 'not an OpenEXR file'
+    flags = struct.unpack_from('<i', head, 4)[0]
+
+    attributes = {}
+    position = 8
+    while True:
+        name_end = head.find(b'\0', position)
+        if name_end == position:
+            position += 1
+            break
+        type_end = head.find(b'\0', name_end + 1) if name_end >= 0 else -1
+        if type_end < 0 or type_end + 5 > len(head):
+            if len(head) >= min(size, MAX_HEADER_SIZE):
+                return 'truncated header'
+            # The header goes past what was read, read it all.
+            head = read_at(fd, min(size, MAX_HEADER_SIZE), 0)
+            continue
+        length = struct.unpack_from('<i', head, type_end + 1)[0]
+        value_start = type_end + 5
+        if value_start + length > len(head):
+            if len(head) >= min(size, MAX_HEADER_SIZE):
+                return 'truncated header'
+            head = read_at(fd, min(size, MAX_HEADER_SIZE), 0)
+            continue
+        attributes[head[position:name_end]] = head[value_start:value_start + length]
+        position = value_start + length
+
+    if flags & (EXR_TILED | EXR_DEEP | EXR_MULTIPART):
+        return None if size > position else 'truncated'
+
+    data_window = attributes.get(b'dataWindow')
+    compression = attributes.get(b'compression')
+    if data_window is None or compression is None or ord(compression[:1]) >= len(EXR_LINES):
+        return None if size > position else 'truncated'
+    _, y_min, _, y_max = struct.unpack('<4i', data_window)
+    lines = EXR_LINES[ord(compression[:1])]
+    chunks = (y_max - y_min + lines) // lines
+
+    table = read_at(fd, chunks * 8, position)
+    if len(table) < chunks * 8:
+        return 'truncated offset table'
+    offsets = struct.unpack('<{}q'.format(chunks), table)
+    if 0 in offsets:
+        return 'incomplete, missing chunks'
+    last = max(offsets)
+    chunk_head = read_at(fd, 8, last)
+    if len(chunk_head) < 8:
+        return 'truncated'
+    if last + 8 + struct.unpack_from('<i', chunk_head, 4)[0] > size:
+        return 'truncated'
+    return None
+
+
+def check_png(fd, size, head):
+    if not head.startswith(PNG_MAGIC):
+        return 'not a PNG file'
+    if read_at(fd, len(PNG_END), size - len(PNG_END)) != PNG_END:
+        return 'truncated, no IEND chunk'
+    return None
+
+
+def check_jpeg(fd, size, head):
+    if not head.startswith(JPEG_MAGIC):
+        return 'not a JPEG file'
+    # Some writers pad the end of the file with zeros.
+    tail = read_at(fd, TAIL_SIZE, max(size - TAIL_SIZE, 0)).rstrip(b'\0')
+    if not tail.endswith(JPEG_END):
+        return 'truncated, no end of image marker'
+    return None
+
+
+def check_tiff(fd, size, head):
+    """Check the first image file directory lies within the file.
+    """
+    magic = head[:4]
+    if magic in TIFF_MAGICS:
+        order = TIFF_MAGICS[magic]
+        offset = struct.unpack_from(order + 'I', head, 4)[0]
+        count_format, entry_size, next_size = 'H', 12, 4
+    elif magic in BIGTIFF_MAGICS:
+        order = BIGTIFF_MAGICS[magic]
+        offset = struct.unpack_from(order + 'Q', head, 8)[0]
+        count_format, entry_size, next_size = 'Q', 20, 8
+    else:
+        return 'not a TIFF file'
+
+    count_size = struct.calcsize(count_format)
+    data = read_at(fd, count_size, offset)
+    if len(data) < count_size:
+        return 'truncated, first directory missing'
+    count = struct.unpack(order + count_format, data)[0]
+    if offset + count_size + count * entry_size + next_size > size:
+        return 'truncated directory'
+    return None
+
+
+def check_texture(fd, size, head):
+    """RenderMan .tex and Houdini .rat may be TIFF or OpenEXR based, or of a
+    format of their own which is only checked for being non empty.
+    """
+    if head.startswith(EXR_MAGIC):
+        return check_exr(fd, size, head)
+    if head[:4] in TIFF_MAGICS or head[:4] in BIGTIFF_MAGICS:
+        return check_tiff(fd, size, head)
+    return None
+
+
+CHECKS = {
+    '.exr': check_exr,
+    '.png': check_png,
+    '.jpg': check_jpeg,
+    '.jpeg': check_jpeg,
+    '.tif': check_tiff,
+    '.tiff': check_tiff,
+    '.tex': check_texture,
+    '.rat': check_texture,
+}
+
+
+def check_frame(path):
+    """Check a frame from its header and last bytes, never its pixels.
+
+    Returns:
+        str: the problem of the frame, None if it looks complete
+    """
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError as error:
+        return error.strerror.lower()
+    try:
+        size = os.fstat(fd).st_size
+        if instrument.ENABLED:
+            instrument.count('stat')
+        if not size:
+            return 'empty'
+        check = CHECKS.get(os.path.splitext(path)[1].lower())
+        if check is None:
+            return None
+        return check(fd, size, read_at(fd, HEAD_SIZE, 0))
+    except (OSError, struct.error) as error:
+        return 'unreadable: {}'.format(error)
+    finally:
+        os.close(fd)
+
+
+def check_frames(paths, stop_event=None):
+    """
+    Args:
+        paths (list): frame paths
+        stop_event (threading.Event): stops the checks with an ECANCELED
+            OSError once set
+
+    Returns:
+        list: (path, problem) of the bad frames
+    """
+    problems = []
+    for path in paths:
+        if stop_event is not None and stop_event.is_set():
+            raise OSError(errno.ECANCELED, 'Verify cancelled', path)
+        problem = check_frame(path)
+        if problem is not None:
+            problems.append((path, problem))
+    return problems
+
+
+def verify_paths(paths, jobs=VERIFY_JOBS, stop_event=None):
+    """Check frames on a pool of threads.
+
+    Args:
+        paths (list): frame paths
+        jobs (int): number of threads checking frames
+        stop_event (threading.Event): stops the checks with an ECANCELED
+            OSError once set
+
+    Returns:
+        dict: problem by path of the bad frames only
+    """
+    batches = [paths[index:index + BATCH_SIZE] for index in range(0, len(paths), BATCH_SIZE)]
+    with futures.ThreadPoolExecutor(max_workers=jobs) as pool:
+        return dict(problem for problems in pool.map(check_frames, batches, itertools.repeat(stop_event))
+                    for problem in problems)
+
+
+def verify_sequences(sequences, jobs=VERIFY_JOBS, stop_event=None):
+    """
+    Args:
+        sequences (list): Sequence objects
+        jobs (int): number of threads checking frames
+        stop_event (threading.Event): stops the checks with an ECANCELED
+            OSError once set
+
+    Returns:
+        dict: problem by path of the bad frames only
+    """
+    return verify_paths([path for sequence in sequences for path in sequence.paths()], jobs, stop_event)
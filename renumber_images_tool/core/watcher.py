@@ -0,0 +1,490 @@
+# Built-in
+import bisect
+import ctypes
+import ctypes.util
+import errno
+import heapq
+import os
+import select
+import struct
+import time
+from array import array
+
+from renumber_images_tool.core import instrument
+from renumber_images_tool.core.executor import execute_renames
+from renumber_images_tool.core.journal import Journal, undo_journal
+from renumber_images_tool.core.scanner import split_frame
+from renumber_images_tool.core.sequence import Sequence, format_token
+
+# =============================================================================
+# GLOBALS
+# =============================================================================
+# Seconds to keep collecting new frames after the first one before renaming.
+BATCH_WINDOW = 2.0
+
+# Seconds between two listings of the polling watcher.
+POLL_INTERVAL = 1.0
+
+# Padding of the re-numbered frames in watch mode. It cannot follow the
+# last frame as usual: every new digit would rename the whole sequence.
+WATCH_PADDING = 4
+
+# inotify constants, from sys/inotify.h
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+INOTIFY_EVENT = struct.Struct('iIII')
+READ_SIZE = 64 * 1024
+
+
+# =============================================================================
+# FUNCTIONS
+# =============================================================================
+def load_inotify():
+    """
+    Returns:
+        ctypes.CDLL: C library with inotify, None if not available
+    """
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        libc.inotify_init1
+        libc.inotify_add_watch
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+
+def open_watcher(folder_path, poll_interval=POLL_INTERVAL):
+    """
+    Returns:
+        InotifyWatcher or PollingWatcher when inotify is not available,
+            e.g. macOS or a filesystem refusing the watch
+    """
+    libc = load_inotify()
+    if libc is not None:
+        try:
+            return InotifyWatcher(folder_path, libc)
+        except OSError:
+            pass
+    return PollingWatcher(folder_path, poll_interval)
+
+
+def run_journaled(execute_func):
+    """Run renames under a new journal. When one of them fails, the ones
+    already done are renamed back, so the folder is as before the call.
+
+    Args:
+        execute_func (callable): called with the Journal, runs the renames
+
+    Returns:
+        tuple: RenameResult, journal path
+
+    Raises:
+        OSError: error of the failed rename, once the others are renamed back
+    """
+    journal = Journal()
+    try:
+        return execute_func(journal), journal.path
+    except OSError:
+        # Without a journal, or an empty one, nothing was renamed.
+        if os.path.isfile(journal.path):
+            try:
+                undo_journal(journal.path)
+            except ValueError:
+                pass
+        raise
+
+
+def watch_folder(folder_path, start=1, step=1, padding=WATCH_PADDING, batch_window=BATCH_WINDOW,
+                 poll_interval=POLL_INTERVAL, jobs=1, callback=None, error_callback=None, stop_event=None):
+    """Re-number a folder, then keep re-numbering the frames landing in it.
+
+    The folder is listed once. From then on an in-memory index of every
+    sequence tells where new frames go, so a batch of k new frames costs
+    O(k) renames and no listing, as long as frames land in order. A frame
+    landing before frames already re-numbered shifts those up by one: a
+    batch costs O(k + frames after its first frame), up to the whole
+    folder when a first frame lands last.
+
+    When the renderer writes frame tokens formatted like the new ones, the
+    two share their names: a frame is never renamed to a name the renderer
+    may still write, i.e. a frame number it has not written yet, from its
+    lowest one. Such frames are held until the frames before them land.
+    Frames already at their new name are not renamed.
+
+    Every batch is journaled, so it can be undone with --undo. A batch
+    failing to rename is renamed back, then its new frames are renamed one
+    at a time: the ones failing again are reported and left as they are,
+    and the watch goes on.
+
+    Args:
+        folder_path (str): directory path to images
+        start (int): first new frame
+        step (int): increment between new frames
+        padding (int): number of digits of the new frames
+        batch_window (float): seconds to collect new frames before renaming
+        poll_interval (float): seconds between listings without inotify
+        jobs (int): number of threads issuing renames
+        callback (callable): called with the RenameResult and the journal
+            path of every batch
+        error_callback (callable): called with the path and the error of
+            every new frame skipped
+        stop_event (threading.Event): stops watching once set
+    """
+    index = SequenceIndex(folder_path, start, step, padding)
+
+    def rename_arrivals(names):
+        renames, pending = index.plan_arrivals(names)
+        if not renames:
+            index.commit(pending)
+            return
+        result, journal_path = run_journaled(lambda journal: execute_renames(renames, jobs=jobs,
+                                                                             journal=journal))
+        index.commit(pending)
+        if callback is not None:
+            callback(result, journal_path)
+
+    def rename_batch(names):
+        try:
+            rename_arrivals(names)
+        except OSError:
+            index.forget_removed()
+            for name in sorted(set(names)):
+                try:
+                    rename_arrivals([name])
+                except OSError as error:
+                    index.skip(name)
+                    if error_callback is not None:
+                        error_callback(os.path.join(folder_path, name), error)
+
+    # The watch starts before the first renames so no frame is missed; the
+    # renamed frames are recognized as outputs of the index. The frames
+    # already there are the first batch.
+    watcher = open_watcher(folder_path, poll_interval)
+    try:
+        rename_batch(index.list_arrivals())
+
+        while stop_event is None or not stop_event.is_set():
+            names = watcher.read(poll_interval)
+            if names is None:
+                names = index.list_arrivals()
+            if not names:
+                continue
+
+            # Let the rest of the batch land.
+            deadline = time.time() + batch_window
+            while time.time() < deadline:
+                more = watcher.read(deadline - time.time())
+                if more is None:
+                    names = index.list_arrivals()
+                elif more:
+                    names.extend(more)
+
+            rename_batch(names)
+    finally:
+        watcher.close()
+
+
+# =============================================================================
+# CLASSES
+# =============================================================================
+class InotifyWatcher(object):
+    """
+    New file names of a folder from inotify: files closed after writing and
+    files moved in, e.g. renderers writing to a temporary name first.
+    """
+
+    def __init__(self, folder_path, libc):
+        self.folder_path = folder_path
+        self.libc = libc
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        watch = libc.inotify_add_watch(self.fd, os.fsencode(folder_path), IN_CLOSE_WRITE | IN_MOVED_TO)
+        if watch < 0:
+            error = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(error, 'Cannot watch [{}]'.format(folder_path))
+
+    def read(self, timeout):
+        """
+        Returns:
+            list: names of the new files, None when events were lost and the
+                folder has to be listed again
+        """
+        if not select.select([self.fd], [], [], max(timeout, 0))[0]:
+            return []
+        try:
+            data = os.read(self.fd, READ_SIZE)
+        except OSError as error:
+            if error.errno == errno.EAGAIN:
+                return []
+            raise
+
+        names = []
+        offset = 0
+        while offset < len(data):
+            _, mask, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+            offset += INOTIFY_EVENT.size
+            if mask & IN_Q_OVERFLOW:
+                return None
+            names.append(os.fsdecode(data[offset:offset + length].rstrip(b'\0')))
+            offset += length
+        return names
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher(object):
+    """
+    New file names of a folder from listing it every interval. Each listing
+    is O(folder size), only the new names are handed over.
+    """
+
+    def __init__(self, folder_path, interval=POLL_INTERVAL):
+        self.folder_path = folder_path
+        self.interval = interval
+        self.known = set(self.list())
+        self.last_poll = time.time()
+
+    def list(self):
+        if instrument.ENABLED:
+            instrument.count('listdir')
+        return os.listdir(self.folder_path)
+
+    def read(self, timeout):
+        wait = self.last_poll + self.interval - time.time()
+        if wait > timeout:
+            time.sleep(max(timeout, 0))
+            return []
+        time.sleep(max(wait, 0))
+        self.last_poll = time.time()
+
+        names = self.list()
+        new_names = [name for name in names if name not in self.known]
+        self.known = set(names)
+        return new_names
+
+    def close(self):
+        pass
+
+
+class WatchedSequence(object):
+    """
+    A re-numbered sequence: the original frames it was made of, sorted, and
+    its new frames start, start + step, ... one per original frame.
+
+    Frames whose new name the renderer may still write are held, sorted,
+    until the frames before them land.
+    """
+
+    def __init__(self, sequence, start, step, padding):
+        # Only used to build file names.
+        self.sequence = sequence
+        self.start = start
+        self.step = step
+        self.padding = padding
+        self.originals = array('q')
+        # (frame, path, shaped) of the held frames, by path.
+        self.held = {}
+        # Lowest frame with a token formatted like the new ones, and True
+        # once such a frame had to be renamed: the renderer then writes in
+        # the names of the new frames.
+        self.lowest_shaped = None
+        self.shared = False
+
+    def output_path(self, rank):
+        return self.sequence.path(format_token(self.start + rank * self.step, self.padding))
+
+    def is_shaped(self, token):
+        """
+        True if the frame token is formatted like the new frames.
+        """
+        return token == format_token(int(token), self.padding)
+
+    def is_output(self, token):
+        """
+        True if the frame token is one of the new frames of the sequence.
+        """
+        if not self.is_shaped(token):
+            return False
+        rank, remainder = divmod(int(token) - self.start, self.step)
+        return not remainder and 0 <= rank < len(self.originals)
+
+    def has_original(self, frame):
+        rank = bisect.bisect_left(self.originals, frame)
+        return rank < len(self.originals) and self.originals[rank] == frame
+
+    def may_be_written(self, frame, frames):
+        """
+        True if the renderer may still write the name of the new frame,
+        the original frames being the ones indexed and the arrivals.
+        """
+        if not self.shared or frame < self.lowest_shaped:
+            return False
+        rank = bisect.bisect_left(frames, frame)
+        return not (rank < len(frames) and frames[rank] == frame) and not self.has_original(frame)
+
+    def plan(self, arrivals):
+        """Renames placing new frames among the re-numbered ones, in
+        O(arrivals + frames shifted).
+
+        Args:
+            arrivals (list): sorted (original frame, path, shaped) of new
+                frames, none of them re-numbered already
+
+        Returns:
+            tuple: renames, and the first rank shifted with the sorted
+                original frames from there, None if a new name may still
+                be written by the renderer
+        """
+        frames = [frame for frame, _, _ in arrivals]
+        originals = self.originals
+        first = bisect.bisect_right(originals, frames[0])
+
+        # Frames already re-numbered after the first arrival move up by the
+        # number of arrivals before them.
+        renames = []
+        targets = []
+        for rank in range(first, len(originals)):
+            shift = bisect.bisect_left(frames, originals[rank])
+            if shift:
+                renames.append((self.output_path(rank), self.output_path(rank + shift)))
+                targets.append(rank + shift)
+        for count, (frame, path, shaped) in enumerate(arrivals):
+            rank = bisect.bisect_right(originals, frame) + count
+            target = self.output_path(rank)
+            # Already at its new name.
+            if target == path:
+                continue
+            self.shared = self.shared or shaped
+            renames.append((path, target))
+            targets.append(rank)
+
+        if any(self.may_be_written(self.start + rank * self.step, frames) for rank in targets):
+            return None
+        return renames, (first, list(heapq.merge(originals[first:], frames)))
+
+    def plan_arrivals(self, arrivals):
+        """Plan the new frames with the held ones: all of them, or else the
+        most of the lowest ones which can be renamed, holding the others.
+
+        Args:
+            arrivals (list): (original frame, path, shaped) of new frames
+
+        Returns:
+            tuple: renames, and the changes to hand to commit()
+        """
+        for frame, _, shaped in arrivals:
+            if shaped and (self.lowest_shaped is None or frame < self.lowest_shaped):
+                self.lowest_shaped = frame
+        candidates = sorted(list(self.held.values()) + arrivals)
+        planned = self.plan(candidates)
+        accepted = len(candidates)
+        if planned is None:
+            planned = [], None
+            accepted = 0
+            for count in range(1, len(candidates)):
+                prefix = self.plan(candidates[:count])
+                if prefix is None:
+                    break
+                planned = prefix
+                accepted = count
+        renames, changes = planned
+        return renames, (changes, candidates[accepted:])
+
+    def commit(self, pending):
+        changes, held = pending
+        if changes is not None:
+            first, tail = changes
+            del self.originals[first:]
+            self.originals.extend(tail)
+        self.held = dict((arrival[1], arrival) for arrival in held)
+
+
+class SequenceIndex(object):
+    """
+    In-memory index of the re-numbered sequences of a watched folder.
+    """
+
+    def __init__(self, folder_path, start=1, step=1, padding=WATCH_PADDING):
+        self.folder_path = folder_path
+        self.start = start
+        self.step = step
+        self.padding = padding
+        self.sequences = {}
+        # New files which failed to rename, left as they are.
+        self.skipped = set()
+
+    def get(self, prefix, suffix, ext):
+        key = (prefix, suffix, ext)
+        watched = self.sequences.get(key)
+        if watched is None:
+            sequence = Sequence(self.folder_path, prefix, suffix, ext)
+            watched = self.sequences[key] = WatchedSequence(sequence, self.start, self.step, self.padding)
+        return watched
+
+    def skip(self, name):
+        self.skipped.add(name)
+
+    def forget_removed(self):
+        """
+        Stop holding the frames removed since they landed.
+        """
+        for watched in self.sequences.values():
+            watched.held = dict((path, arrival) for path, arrival in watched.held.items()
+                                if os.path.isfile(path))
+
+    def list_arrivals(self):
+        """
+        Names of the folder which are not re-numbered yet, after events
+        were lost.
+        """
+        if instrument.ENABLED:
+            instrument.count('listdir')
+        return os.listdir(self.folder_path)
+
+    def plan_arrivals(self, names):
+        """
+        Args:
+            names (list): names of the new files of the folder
+
+        Returns:
+            tuple: renames of the batch, and the pending index changes to
+                commit once the renames are done
+        """
+        arrivals = {}
+        for name in set(names):
+            if name.startswith('.') or name in self.skipped:
+                continue
+            parts = split_frame(name)
+            if parts is None:
+                continue
+            prefix, token, suffix, ext = parts
+            watched = self.get(prefix, suffix, ext)
+            # Our own renames, and re-rendered frames which already have a
+            # new frame: they are left as they are rather than overwriting it.
+            path = os.path.join(self.folder_path, name)
+            if watched.is_output(token) or watched.has_original(int(token)) or path in watched.held:
+                continue
+            # Frames gone since their event.
+            if instrument.ENABLED:
+                instrument.count('stat')
+            if not os.path.isfile(path):
+                continue
+            arrivals.setdefault(watched, []).append((int(token), path, watched.is_shaped(token)))
+
+        renames = []
+        pending = []
+        for watched, frames in arrivals.items():
+            sequence_renames, changes = watched.plan_arrivals(frames)
+            renames.extend(sequence_renames)
+            pending.append((watched, changes))
+        return renames, pending
+
+    def commit(self, pending):
+        for watched, changes in pending:
+            watched.commit(changes)
@@ -1,12 +1,21 @@
 # Built-in
-import glob
-import math
 import os
-import re
-import sys
+import threading
+import time
 
 from Qt_py.Qt import QtWidgets, QtCore, QtGui
 
+from renumber_images_tool.core import instrument
+from renumber_images_tool.core.cache import open_cache
+from renumber_images_tool.core.executor import execute_plans
+from renumber_images_tool.core.journal import Journal, undo_journal
+from renumber_images_tool.core.linker import link_sequences
+from renumber_images_tool.core.planner import plan_sequences
+from renumber_images_tool.core.report import FRAME_RANGE_SYNTAX, report_plans
+from renumber_images_tool.core.scanner import SUPPORTED_EXT, scan_sequences
+from renumber_images_tool.core.summary import Summary
+from renumber_images_tool.core.verifier import verify_sequences
+
 # =============================================================================
 # GLOBALS
 # =============================================================================
@@ -30,7 +39,15 @@ QT_BACKGROUND_COLOR = QtGui.QColor(R * .5, G * .5, B * .5)
 QT_FOREGROUND_COLOR = QtGui.QColor(210, 210, 210)
 QT_WARNING_COLOR = QtGui.QColor(220, 10, 10)
 
-SUPPORTED_EXT = ['.exr', '.jpg', '.tex', '.png', '.tif', '.tiff', '.rat']
+# Milliseconds to wait after the last keystroke before scanning.
+SCAN_DELAY = 300
+
+# Number of frame rows added each time a sequence row asks for more.
+FETCH_SIZE = 1000
+
+# Set to count the filesystem calls and show them in the status, as --stats
+# does for the command line.
+STATS = bool(os.environ.get('RENUMBER_IMAGES_STATS'))
 
 
 # =============================================================================
@@ -46,23 +63,141 @@ def set_look(pal):
     pal.setColor(QtGui.QPalette.ButtonText, QT_TEXT_COLOR)
     return pal
 
-def get_sequence_regex(folder_path):
-    """This generates a list of image regex.
-    Frames are replaced with the wildcard for finding the same sequence pattern.
+def count_bad_frames(plans, problems):
     """
-    if not os.path.isdir(folder_path):
-        raise OSError('[{}] does not exist.'.format(folder_path))
-
-    seq_regex_set = set()
-    image_list = os.listdir(folder_path)
-    for image in image_list:
-        if os.path.isfile(os.path.join(folder_path,image)) and os.path.splitext(image)[-1] in SUPPORTED_EXT:
-            regex = re.compile('[0-9]+')
-            replaced_filename = regex.sub('*', image)
-            regex_filepath = os.path.join(folder_path, replaced_filename)
-            seq_regex_set.add(regex_filepath)
+    Returns:
+        list: number of bad frames of every plan
+    """
+    if not problems:
+        return [0] * len(plans)
+    return [sum(1 for path in plan.sequence.paths() if path in problems) for plan in plans]
 
-    return list(seq_regex_set)
+def get_folder_mtime(folder_path):
+    """
+    Returns:
+        int: modification time of the folder in nanoseconds, it changes with
+            every file added, removed or renamed in the folder
+    """
+    if instrument.ENABLED:
+        instrument.count('stat')
+    return os.stat(folder_path).st_mtime_ns
+
+def load_folder(progress, folder_path, cache=None, verify=False, stop_event=None, **plan_options):
+    """Scan, plan and report the sequences of a folder. Runs on a worker thread.
+
+    Args:
+        progress (callable): called with a status message
+        folder_path (str): directory path to images
+        cache (ScanCache): reuse the listing of unchanged folders
+        verify (bool): check the header and end of every frame
+        stop_event (threading.Event): stops the scan and the checks with an
+            ECANCELED OSError once set
+        plan_options: start, step and padding passed to plan_sequences
+
+    Returns:
+        tuple: Sequence objects, RenamePlan objects, SequenceReport objects,
+            problem by path of the bad frames, number of bad frames of every
+            plan, modification time of the folder before the scan, Summary
+            with the timings and filesystem calls
+    """
+    summary = Summary()
+    progress('Scanning {}...'.format(folder_path))
+    start_time = time.time()
+    # Taken first, so a change during the scan makes the plans stale.
+    folder_mtime = get_folder_mtime(folder_path)
+    sequences = scan_sequences(folder_path, extensions=SUPPORTED_EXT, cache=cache, stop_event=stop_event)
+    summary.add_time('scan', time.time() - start_time)
+
+    problems = {}
+    if verify:
+        progress('Verifying {} frames...'.format(sum(len(sequence) for sequence in sequences)))
+        start_time = time.time()
+        problems = verify_sequences(sequences, stop_event=stop_event)
+        summary.bad_frames += len(problems)
+        summary.add_time('verify', time.time() - start_time)
+
+    progress('Planning {} sequences...'.format(len(sequences)))
+    start_time = time.time()
+    plans = plan_sequences(sequences, **plan_options)
+    summary.add_time('plan', time.time() - start_time)
+
+    start_time = time.time()
+    bad_frames = count_bad_frames(plans, problems)
+    summary.add_time('verify', time.time() - start_time)
+
+    start_time = time.time()
+    reports = report_plans(plans)
+    summary.add_time('report', time.time() - start_time)
+
+    summary.folders += 1
+    summary.sequences += len(sequences)
+    summary.frames += sum(len(sequence) for sequence in sequences)
+    summary.stop()
+    return sequences, plans, reports, problems, bad_frames, folder_mtime, summary
+
+def renumber_folder(progress, folder_path, preview=None, cache=None, jobs=1, journal=None, output_dir=None,
+                    verify=False, **plan_options):
+    """Re-number the sequences of a folder on disk. Runs on a worker thread.
+
+    Args:
+        progress (callable): called with a status message
+        folder_path (str): directory path to images
+        preview (tuple): RenamePlan objects, problem by path of the bad
+            frames and folder modification time of the scan shown to the
+            user, reused if the folder did not change since
+        cache (ScanCache): reuse the listing of unchanged folders
+        jobs (int): number of threads issuing renames
+        journal (Journal): records the renames so they can be undone
+        output_dir (str): link the re-numbered frames into this folder instead of renaming
+        verify (bool): check the frames first, nothing is renamed if one is bad
+        plan_options: start, step and padding passed to plan_sequences
+
+    Returns:
+        tuple: RenameResult or LinkResult, Summary with the timings and
+            filesystem calls
+    """
+    if preview is not None and get_folder_mtime(folder_path) == preview[2]:
+        plans, problems, _ = preview
+        summary = Summary()
+        summary.folders += 1
+        summary.sequences += len(plans)
+        summary.frames += sum(plan.frame_count for plan in plans)
+    else:
+        _, plans, _, problems, _, _, summary = load_folder(progress, folder_path, cache, verify, **plan_options)
+    if problems:
+        raise ValueError('{} bad frames, nothing renamed'.format(len(problems)))
+
+    if output_dir:
+        progress('Linking into {}...'.format(output_dir))
+        start_time = time.time()
+        result = link_sequences(plans, output_dir)
+        summary.add_time('link', time.time() - start_time)
+        summary.add_link_result(result)
+        summary.stop()
+        return result, summary
+
+    def report(done, total):
+        progress('Re-numbering... {0}/{1} frames'.format(done, total))
+
+    start_time = time.time()
+    result = execute_plans(plans, jobs=jobs, progress=report, journal=journal)
+    summary.add_time('rename', time.time() - start_time)
+    summary.add_result(result)
+    summary.stop()
+    return result, summary
+
+def undo_renumber(progress, journal_path):
+    """Rename back the files of a journal. Runs on a worker thread.
+
+    Args:
+        progress (callable): called with a status message
+        journal_path (str): journal of the re-numbering to undo
+
+    Returns:
+        RenameResult
+    """
+    progress('Undoing re-numbering...')
+    return undo_journal(journal_path)
 
 # =============================================================================
 # CLASSES
@@ -223,8 +358,7 @@ class LineEdit(QtWidgets.QLineEdit, BaseWidget):
         """
         if not syntax:
             if validator_type == 'framerangevalidator':
-                # 105-110x2 or 105-110:2
-                syntax = "((\d+(,|\-\d+(,|x\d+,)))*)|((\d+\-\d+(:\d+)))*"
+                syntax = FRAME_RANGE_SYNTAX
             elif validator_type == 'digitvalidator':
                 syntax = "\d+"
             elif validator_type == 'digit1validator':
@@ -277,14 +411,12 @@ class InputWidgetsFrame(QtWidgets.QFrame):
     def __init__(self, parent=None):
         super(InputWidgetsFrame, self).__init__(parent)
         self.parent = parent
+        self.scan_cache = open_cache()
         self.build_widgets()
 
     @property
-    def input_paths(self):
-        input_folder = str(self.input_path_widget.get_value())
-        input_paths = get_sequence_regex(input_folder)
-        input_paths = [path.strip() for path in input_paths]
-        return input_paths
+    def input_folder(self):
+        return str(self.input_path_widget.get_value()).strip()
 
     def build_widgets(self):
         self.main_layout = QtWidgets.QHBoxLayout(self)
@@ -302,7 +434,7 @@ class InputWidgetsFrame(QtWidgets.QFrame):
         self.main_layout.addWidget(file_dialog_button)
 
     def input_changed_cb(self):
-        self.value_changed.emit(self.input_paths)
+        self.value_changed.emit(self.input_folder)
 
     def open_file_dialog(self):
         dir_path = os.path.expanduser('~')
@@ -311,6 +443,275 @@ class InputWidgetsFrame(QtWidgets.QFrame):
             self.input_path_widget.set_value(str(folder_path))
 
 
+class OutputWidgetsFrame(QtWidgets.QFrame):
+    """
+    Class of the output folder widgets grouping frame. Empty means the
+    frames are re-numbered in place.
+    """
+    def __init__(self, parent=None):
+        super(OutputWidgetsFrame, self).__init__(parent)
+        self.parent = parent
+        self.build_widgets()
+
+    @property
+    def output_folder(self):
+        return str(self.output_path_widget.get_value()).strip()
+
+    def build_widgets(self):
+        self.main_layout = QtWidgets.QHBoxLayout(self)
+        self.main_layout.setAlignment(QT_ALIGN_LEFTCENTER)
+
+        # Output folder widget
+        self.main_layout.addWidget(QtWidgets.QLabel("Output Folder:"))
+        self.output_path_widget = LineEdit(parent=self)
+        self.output_path_widget.setPlaceholderText('re-number in place')
+        self.main_layout.addWidget(self.output_path_widget)
+
+        # File browser button
+        file_dialog_button = QtWidgets.QPushButton('Browse')
+        file_dialog_button.pressed.connect(self.open_file_dialog)
+        self.main_layout.addWidget(file_dialog_button)
+
+    def open_file_dialog(self):
+        dir_path = os.path.expanduser('~')
+        folder_path = QtWidgets.QFileDialog.getExistingDirectory(self, 'Choose Output Path', dir_path)
+        if folder_path:
+            self.output_path_widget.set_value(str(folder_path))
+
+
+class OptionsWidgetsFrame(QtWidgets.QFrame):
+    value_changed = QtCore.Signal(object)
+    """
+    Class of re-numbering options widgets grouping frame.
+    This Qt frame contains several widgets, This is how we grouping
+    widgets.
+    """
+    def __init__(self, parent=None):
+        super(OptionsWidgetsFrame, self).__init__(parent)
+        self.parent = parent
+        self.build_widgets()
+
+    @property
+    def options(self):
+        """
+        Keyword arguments of plan_sequences. Empty fields use the defaults.
+        """
+        padding = self.padding_widget.get_value()
+        return {
+            'start': int(self.start_widget.get_value() or 1),
+            'step': max(int(self.step_widget.get_value() or 1), 1),
+            'padding': int(padding) if padding and int(padding) else None,
+        }
+
+    @property
+    def jobs(self):
+        return max(int(self.jobs_widget.get_value() or 1), 1)
+
+    @property
+    def verify(self):
+        return self.verify_widget.isChecked()
+
+    def build_widgets(self):
+        self.main_layout = QtWidgets.QHBoxLayout(self)
+        self.main_layout.setAlignment(QT_ALIGN_LEFTCENTER)
+
+        # Start frame widget
+        self.main_layout.addWidget(QtWidgets.QLabel("Start:"))
+        self.start_widget = LineEdit(parent=self, default='1', width=60, validator='digitvalidator')
+        self.start_widget.value_changed.connect(self.options_changed_cb)
+        self.main_layout.addWidget(self.start_widget)
+
+        # Step widget
+        self.main_layout.addWidget(QtWidgets.QLabel("Step:"))
+        self.step_widget = LineEdit(parent=self, default='1', width=60, validator='digitvalidator')
+        self.step_widget.value_changed.connect(self.options_changed_cb)
+        self.main_layout.addWidget(self.step_widget)
+
+        # Padding widget, empty means based on the last frame
+        self.main_layout.addWidget(QtWidgets.QLabel("Padding:"))
+        self.padding_widget = LineEdit(parent=self, default='', width=60, validator='digitvalidator')
+        self.padding_widget.setPlaceholderText('auto')
+        self.padding_widget.value_changed.connect(self.options_changed_cb)
+        self.main_layout.addWidget(self.padding_widget)
+
+        # Number of concurrent renames, for network storage
+        self.main_layout.addWidget(QtWidgets.QLabel("Jobs:"))
+        self.jobs_widget = LineEdit(parent=self, default='1', width=60, validator='digitvalidator')
+        self.main_layout.addWidget(self.jobs_widget)
+
+        # Check the header and end of every frame before re-numbering
+        self.verify_widget = QtWidgets.QCheckBox('Verify', parent=self)
+        self.verify_widget.stateChanged.connect(self.options_changed_cb)
+        self.main_layout.addWidget(self.verify_widget)
+
+    def options_changed_cb(self):
+        self.value_changed.emit(self.options)
+
+
+class SequenceItem(object):
+    """
+    Top level row of the SequenceModel, holding the plan of one sequence,
+    the number of frame rows fetched so far and of bad frames.
+    """
+    def __init__(self, row, plan, bad_frames=0):
+        self.row = row
+        self.plan = plan
+        self.fetched = 0
+        self.bad_frames = bad_frames
+
+    @property
+    def frame_count(self):
+        return self.plan.frame_count
+
+
+class SequenceModel(QtCore.QAbstractItemModel):
+    """
+    Two column model (images to convert, preview result) with one collapsed
+    row per sequence. Frame rows are fetched in chunks when a sequence is
+    expanded and every name is computed from the plan when it is displayed,
+    so only the visible rows cost anything. Bad frames found by the verify
+    option are shown in red with their problem.
+    """
+    HEADERS = ['Images to Convert', 'Preview Result']
+
+    def __init__(self, parent=None):
+        super(SequenceModel, self).__init__(parent)
+        self.items = []
+        self.problems = {}
+
+    def set_plans(self, plans, problems=None, bad_frames=None):
+        """
+        Args:
+            plans (list): RenamePlan objects
+            problems (dict): problem by path of the bad frames
+            bad_frames (list): number of bad frames of every plan, counted
+                by the worker
+        """
+        self.beginResetModel()
+        self.problems = problems or {}
+        bad_frames = bad_frames or [0] * len(plans)
+        self.items = [SequenceItem(row, plan, count) for row, (plan, count) in enumerate(zip(plans, bad_frames))]
+        self.endResetModel()
+
+    def problem(self, item, row):
+        """
+        Returns:
+            str: problem of a frame row, None if the frame is fine
+        """
+        if not self.problems:
+            return None
+        plan = item.plan
+        return self.problems.get(os.path.join(plan.sequence.directory, plan.old_name(row)))
+
+    def item(self, index):
+        """
+        Returns:
+            SequenceItem: the sequence of a sequence row or of a frame row
+        """
+        parent_item = index.internalPointer()
+        if parent_item is not None:
+            return parent_item
+        return self.items[index.row()]
+
+    def is_sequence(self, index):
+        return index.isValid() and index.internalPointer() is None
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        return len(self.HEADERS)
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if not parent.isValid():
+            return len(self.items)
+        if self.is_sequence(parent) and parent.column() == 0:
+            return self.items[parent.row()].fetched
+        return 0
+
+    def hasChildren(self, parent=QtCore.QModelIndex()):
+        if not parent.isValid():
+            return bool(self.items)
+        if self.is_sequence(parent) and parent.column() == 0:
+            return self.items[parent.row()].frame_count > 0
+        return False
+
+    def canFetchMore(self, parent):
+        if not self.is_sequence(parent):
+            return False
+        item = self.items[parent.row()]
+        return item.fetched < item.frame_count
+
+    def fetchMore(self, parent):
+        item = self.items[parent.row()]
+        count = min(FETCH_SIZE, item.frame_count - item.fetched)
+        if count <= 0:
+            return
+        self.beginInsertRows(parent, item.fetched, item.fetched + count - 1)
+        item.fetched += count
+        self.endInsertRows()
+
+    def index(self, row, column, parent=QtCore.QModelIndex()):
+        if not self.hasIndex(row, column, parent):
+            return QtCore.QModelIndex()
+        if not parent.isValid():
+            return self.createIndex(row, column)
+        return self.createIndex(row, column, self.items[parent.row()])
+
+    def parent(self, index):
+        if not index.isValid() or index.internalPointer() is None:
+            return QtCore.QModelIndex()
+        return self.createIndex(index.internalPointer().row, 0)
+
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        if orientation == QtCore.Qt.Horizontal and role == QtCore.Qt.DisplayRole:
+            return self.HEADERS[section]
+        return None
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid() or role not in (QtCore.Qt.DisplayRole, QtCore.Qt.ForegroundRole,
+                                               QtCore.Qt.ToolTipRole):
+            return None
+
+        item = self.item(index)
+        plan = item.plan
+        if self.is_sequence(index):
+            if role == QtCore.Qt.ForegroundRole:
+                return QtGui.QBrush(QT_WARNING_COLOR) if item.bad_frames else None
+            if role == QtCore.Qt.ToolTipRole:
+                return '{} bad frames'.format(item.bad_frames) if item.bad_frames else None
+            if index.column() == 0:
+                if item.bad_frames:
+                    return '{0} ({1} frames, {2} bad)'.format(plan.source, item.frame_count, item.bad_frames)
+                return '{0} ({1} frames)'.format(plan.source, item.frame_count)
+            return plan.preview
+
+        problem = self.problem(item, index.row())
+        if role == QtCore.Qt.ForegroundRole:
+            return QtGui.QBrush(QT_WARNING_COLOR) if problem else None
+        if role == QtCore.Qt.ToolTipRole:
+            return problem
+        if index.column() == 0:
+            if problem:
+                return '{0}  [{1}]'.format(plan.old_name(index.row()), problem)
+            return plan.old_name(index.row())
+        return plan.new_name(index.row())
+
+    def paths(self, indexes):
+        """
+        Returns:
+            list: old and new paths of the given rows. A sequence row stands
+                for the wildcard path of its whole sequence.
+        """
+        paths = []
+        for index in indexes:
+            plan = self.item(index).plan
+            if self.is_sequence(index):
+                paths.append((plan.source, plan.preview))
+            else:
+                directory = plan.sequence.directory
+                paths.append((os.path.join(directory, plan.old_name(index.row())),
+                              os.path.join(directory, plan.new_name(index.row()))))
+        return paths
+
+
 class ImageListWidgetsFrame(QtWidgets.QFrame):
     """
     Class of image list widgets grouping frame.
@@ -322,33 +723,99 @@ class ImageListWidgetsFrame(QtWidgets.QFrame):
         self.parent = parent
         self.build_widgets()
 
+    @property
+    def selected_paths(self):
+        indexes = self.sequence_view.selectionModel().selectedRows(0)
+        return self.sequence_model.paths(indexes)
+
     @property
     def file_paths(self):
-        return self.file_list_widget.get_value()
+        return [old for old, _ in self.selected_paths]
 
     @property
     def preview_paths(self):
-        return self.preview_list_widget.get_value()
+        return [new for _, new in self.selected_paths]
 
     def build_widgets(self):
         self.main_layout = QtWidgets.QHBoxLayout(self)
         self.main_layout.setAlignment(QT_ALIGN_LEFTTOP)
 
-        # File list widget
-        l_side_layout = QtWidgets.QVBoxLayout()
-        l_side_layout.setAlignment(QT_ALIGN_LEFTTOP)
-        self.main_layout.addLayout(l_side_layout)
-        self.file_list_widget = ListWidget(parent=self)
-        l_side_layout.addWidget(QtWidgets.QLabel('Images to Convert:'))
-        l_side_layout.addWidget(self.file_list_widget)
+        # Sequence list widget, with the preview result next to each image
+        self.sequence_model = SequenceModel(parent=self)
+        self.sequence_view = QtWidgets.QTreeView(parent=self)
+        self.sequence_view.setModel(self.sequence_model)
+        self.sequence_view.setSelectionMode(QtWidgets.QAbstractItemView.ExtendedSelection)
+        self.sequence_view.setUniformRowHeights(True)
+        self.sequence_view.setPalette(set_look(self.sequence_view.palette()))
+        self.main_layout.addWidget(self.sequence_view)
 
-        # Preview result widget
-        r_side_layout = QtWidgets.QVBoxLayout()
-        r_side_layout.setAlignment(QT_ALIGN_LEFTBTM)
-        self.main_layout.addLayout(r_side_layout)
-        self.preview_list_widget = ListWidget(parent=self)
-        r_side_layout.addWidget(QtWidgets.QLabel('Preview Result:'))
-        r_side_layout.addWidget(self.preview_list_widget)
+    def set_plans(self, plans, problems=None, bad_frames=None):
+        self.sequence_model.set_plans(plans, problems, bad_frames)
+        self.sequence_view.resizeColumnToContents(0)
+
+
+class ReportWidgetsFrame(QtWidgets.QFrame):
+    """
+    Class of frame report widgets grouping frame: frame ranges and missing
+    frames of every sequence, in the framerangevalidator syntax.
+    """
+    def __init__(self, parent=None):
+        super(ReportWidgetsFrame, self).__init__(parent)
+        self.parent = parent
+        self.build_widgets()
+
+    def build_widgets(self):
+        self.main_layout = QtWidgets.QVBoxLayout(self)
+        self.main_layout.setAlignment(QT_ALIGN_LEFTTOP)
+
+        self.main_layout.addWidget(QtWidgets.QLabel('Frame Report:'))
+        self.report_widget = QtWidgets.QPlainTextEdit(parent=self)
+        self.report_widget.setReadOnly(True)
+        self.report_widget.setMaximumHeight(120)
+        self.report_widget.setPalette(set_look(self.report_widget.palette()))
+        self.main_layout.addWidget(self.report_widget)
+
+    def set_reports(self, reports):
+        self.report_widget.setPlainText('\n'.join(str(report) for report in reports))
+
+
+class WorkerSignals(QtCore.QObject):
+    """
+    Signals of a Worker. A QRunnable is not a QObject, so it cannot have
+    signals of its own.
+    """
+    progress = QtCore.Signal(object)
+    finished = QtCore.Signal(object, object)
+    failed = QtCore.Signal(object, object)
+
+
+class Worker(QtCore.QRunnable):
+    """
+    Run a function on a QThreadPool and send its result back through signals.
+    The function gets a progress callable as first argument.
+    The generation lets the receiver drop the results of stale workers, and
+    cancel stops the functions given a stop_event keyword argument.
+    """
+    def __init__(self, generation, func, *args, **kwargs):
+        super(Worker, self).__init__()
+        self.generation = generation
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.signals = WorkerSignals()
+
+    def cancel(self):
+        stop_event = self.kwargs.get('stop_event')
+        if stop_event is not None:
+            stop_event.set()
+
+    def run(self):
+        try:
+            result = self.func(self.signals.progress.emit, *self.args, **self.kwargs)
+        except Exception as error:
+            self.signals.failed.emit(self.generation, error)
+        else:
+            self.signals.finished.emit(self.generation, result)
 
 
 class RenumberWidget(QtWidgets.QDialog, BaseWidget):
@@ -357,12 +824,40 @@ class RenumberWidget(QtWidgets.QDialog, BaseWidget):
     def __init__(self, *args, **kwargs):
         super(RenumberWidget, self).__init__()
         set_look(self.palette())
-        self.sequence_regex = []
+        self.sequences = []
+        self.plans = []
+
+        # Scans run one at a time. Each input change bumps the generation so
+        # the results of scans started before are dropped.
+        self.scan_generation = 0
+        # A quiet scan refreshes the lists without touching the status.
+        self.scan_quiet = False
+        self.scan_pool = QtCore.QThreadPool(self)
+        self.scan_pool.setMaxThreadCount(1)
+        # Worker of the last scan, cancelled by the next input change.
+        self.scan_worker = None
+        # Plans, problems and folder modification time of the last scan,
+        # re-numbered as they are while the folder does not change.
+        self.preview = None
+        self.scan_timer = QtCore.QTimer(self)
+        self.scan_timer.setSingleShot(True)
+        self.scan_timer.setInterval(SCAN_DELAY)
+        self.scan_timer.timeout.connect(self.start_scan)
+
+        # Count the filesystem calls to show them in the status.
+        if STATS:
+            instrument.enable()
+
+        self.rename_pool = QtCore.QThreadPool(self)
+        self.rename_pool.setMaxThreadCount(1)
+        # Journal of the last re-numbering, for the undo button.
+        self.journal_path = None
+
         self.build_widgets()
 
     @property
     def input_path(self):
-        return self.control_frame.file_path
+        return self.input_frame.input_folder
 
     def build_widgets(self):
         self.main_layout = QtWidgets.QVBoxLayout(self)
@@ -373,15 +868,34 @@ class RenumberWidget(QtWidgets.QDialog, BaseWidget):
         self.input_frame.value_changed.connect(self.input_changed_cb)
         self.main_layout.addWidget(self.input_frame)
 
+        # Output folder widget, hardlinks the re-numbered frames elsewhere
+        self.output_frame = OutputWidgetsFrame(parent=self)
+        self.main_layout.addWidget(self.output_frame)
+
+        # Re-numbering options widget
+        self.options_frame = OptionsWidgetsFrame(parent=self)
+        self.options_frame.value_changed.connect(self.options_changed_cb)
+        self.main_layout.addWidget(self.options_frame)
+
         # Image list widget
         self.control_frame = ImageListWidgetsFrame(parent=self)
         self.main_layout.addWidget(self.control_frame)
 
+        # Frame report widget
+        self.report_frame = ReportWidgetsFrame(parent=self)
+        self.main_layout.addWidget(self.report_frame)
+
         # Convert button
         self.convert_btn = QtWidgets.QPushButton('Do it!')
         self.convert_btn.pressed.connect(self.convert_pressed_cb)
         self.main_layout.addWidget(self.convert_btn)
 
+        # Undo button
+        self.undo_btn = QtWidgets.QPushButton('Undo')
+        self.undo_btn.setEnabled(False)
+        self.undo_btn.pressed.connect(self.undo_pressed_cb)
+        self.main_layout.addWidget(self.undo_btn)
+
         # Status
         self.status = QtWidgets.QLabel('Ready.', self)
         self.main_layout.addWidget(self.status)
@@ -390,58 +904,139 @@ class RenumberWidget(QtWidgets.QDialog, BaseWidget):
         self.status.setText('Starting re-numbering sequences...')
         self.rename_files()
 
-    def preview_files(self, seq_regex_list):
-        new_list = []
+    def undo_pressed_cb(self):
+        self.status.setText('Undoing re-numbering...')
+        self.undo_files()
 
-        for seq_pattern in seq_regex_list:
-            same_seq_list = glob.glob(seq_pattern)
-            same_seq_list.sort()
+    def options_changed_cb(self, options):
+        self.request_scan()
 
-            # padding is based on the length of sequence. minimum is 2 digits.
-            if int(math.log10(len(same_seq_list)) + 1) < 2:
-                padding = '%02d'
-            else:
-                padding = '%0{}d'.format(int(math.log10(len(same_seq_list)) + 1))
+    def input_changed_cb(self, folder_path):
+        self.request_scan()
 
-            new_list.append(
-                seq_pattern.replace('*', '[{0}-{1}]'.format(padding % 1, padding % (len(same_seq_list)))))
+    def request_scan(self, quiet=False):
+        """
+        Debounce the scan: it starts once the input stopped changing.
+        """
+        self.scan_quiet = quiet
+        self.scan_generation += 1
+        self.preview = None
+        self.scan_pool.clear()
+        if self.scan_worker is not None:
+            self.scan_worker.cancel()
+            self.scan_worker = None
+        self.scan_timer.start()
+
+    def start_scan(self):
+        folder_path = self.input_path
+        if not os.path.isdir(folder_path):
+            self.set_sequences([], [], [])
+            self.status.setText('[{}] does not exist.'.format(folder_path))
+            return
 
-        return new_list
+        worker = Worker(self.scan_generation, load_folder, folder_path,
+                        cache=self.input_frame.scan_cache, verify=self.options_frame.verify,
+                        stop_event=threading.Event(), **self.options_frame.options)
+        worker.signals.progress.connect(self.scan_progress_cb)
+        worker.signals.finished.connect(self.scan_finished_cb)
+        worker.signals.failed.connect(self.scan_failed_cb)
+        self.scan_worker = worker
+        self.scan_pool.start(worker)
 
-    def input_changed_cb(self, file_patterns):
-        files = []
-        for file_pattern in file_patterns:
-            files.extend(
-                filter(lambda x: os.path.splitext(x)[-1] in SUPPORTED_EXT,
-                       glob.glob(file_pattern))
-            )
-        files = list(set(files))
-        files.sort()
-        self.control_frame.file_list_widget.set_value(files)
+    def is_stale(self, generation):
+        return generation != self.scan_generation
 
-        new_image_list = self.preview_files(file_patterns)
-        self.control_frame.preview_list_widget.set_value(new_image_list)
+    def scan_progress_cb(self, message):
+        if not self.scan_quiet:
+            self.status.setText(message)
 
-    def rename_files(self):
-        seq_regex_list = self.input_frame.input_paths
+    def rename_progress_cb(self, message):
+        self.status.setText(message)
 
-        for seq_pattern in seq_regex_list:
-            same_seq_list = glob.glob(seq_pattern)
-            same_seq_list.sort()
+    def scan_finished_cb(self, generation, result):
+        if self.is_stale(generation):
+            return
+        self.scan_worker = None
+        sequences, plans, reports, problems, bad_frames, folder_mtime, summary = result
+        self.set_sequences(sequences, plans, reports, problems, bad_frames)
+        self.preview = (plans, problems, folder_mtime)
+        if self.scan_quiet:
+            return
+        bad_frames = ', {} bad'.format(summary.bad_frames) if summary.bad_frames else ''
+        self.status.setText('Found {0} sequences, {1} frames{2}.\n{3}'.format(
+            summary.sequences, summary.frames, bad_frames, self.format_summary(summary)))
 
-            # padding is based on the length of sequence. minimum is 2 digits.
-            if int(math.log10(len(same_seq_list)) + 1) < 2:
-                padding = '%02d'
-            else:
-                padding = '%0{}d'.format(int(math.log10(len(same_seq_list)) + 1))
+    def scan_failed_cb(self, generation, error):
+        if self.is_stale(generation):
+            return
+        self.scan_worker = None
+        self.set_sequences([], [], [])
+        self.status.setText(str(error))
 
-            for image in same_seq_list:
-                frame_regex = re.compile('[0-9]+.')
-                new_image_name = frame_regex.sub('{}.'.format(padding % (same_seq_list.index(image) + 1)), image)
-                # print new_image_name
-                os.rename(image, new_image_name)
+    def format_summary(self, summary):
+        """
+        Timings of a summary, and its filesystem calls with STATS, on one line.
+        """
+        text = '{0}  total {1:.3f}s'.format(summary.format_phases(), summary.elapsed)
+        if instrument.ENABLED:
+            text += '  {}'.format(summary.format_calls())
+        return text
 
-        self.status.setText('Done re-numbering images!')
+    def set_sequences(self, sequences, plans, reports, problems=None, bad_frames=None):
+        self.sequences = sequences
+        self.plans = plans
+        self.control_frame.set_plans(plans, problems, bad_frames)
+        self.report_frame.set_reports(reports)
+
+    def rename_files(self):
+        self.convert_btn.setEnabled(False)
+        self.undo_btn.setEnabled(False)
+
+        journal = Journal()
+        self.journal_path = journal.path
+        worker = Worker(None, renumber_folder, self.input_path, preview=self.preview,
+                        cache=self.input_frame.scan_cache, jobs=self.options_frame.jobs,
+                        journal=journal, output_dir=self.output_frame.output_folder or None,
+                        verify=self.options_frame.verify, **self.options_frame.options)
+        worker.signals.progress.connect(self.rename_progress_cb)
+        worker.signals.finished.connect(self.rename_finished_cb)
+        worker.signals.failed.connect(self.rename_failed_cb)
+        self.rename_pool.start(worker)
+
+    def rename_finished_cb(self, generation, result):
+        self.convert_btn.setEnabled(True)
+        self.undo_btn.setEnabled(os.path.isfile(self.journal_path))
+        result, summary = result
+        self.status.setText('Done re-numbering images! {0}\n{1}'.format(result, self.format_summary(summary)))
+        self.request_scan(quiet=True)
+
+    def rename_failed_cb(self, generation, error):
+        self.convert_btn.setEnabled(True)
+        # Whatever was renamed before the failure can still be undone.
+        self.undo_btn.setEnabled(os.path.isfile(self.journal_path))
+        self.status.setText('Re-numbering failed: {}'.format(error))
+        self.request_scan(quiet=True)
+
+    def undo_files(self):
+        self.convert_btn.setEnabled(False)
+        self.undo_btn.setEnabled(False)
+
+        worker = Worker(None, undo_renumber, self.journal_path)
+        worker.signals.progress.connect(self.rename_progress_cb)
+        worker.signals.finished.connect(self.undo_finished_cb)
+        worker.signals.failed.connect(self.undo_failed_cb)
+        self.rename_pool.start(worker)
+
+    def undo_finished_cb(self, generation, result):
+        self.convert_btn.setEnabled(True)
+        self.journal_path = None
+        self.status.setText('Undone! {}'.format(result))
+        self.request_scan(quiet=True)
+
+    def undo_failed_cb(self, generation, error):
+        self.convert_btn.setEnabled(True)
+        self.status.setText('Undo failed: {}'.format(error))
+        self.request_scan(quiet=True)
 
 
 class RenumberDialog(QtWidgets.QDialog):
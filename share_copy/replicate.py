@@ -0,0 +1,692 @@
+# Built-in
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from share_copy.store import (COMPACT_SLACK, OBJECTS_DIR, STAGING_DIR, ZLIB_LEVEL, SnippetStore,
+                              get_compressor, get_decompressor, get_staging_name, make_dirs, replace_file)
+
+# =============================================================================
+# GLOBALS
+# =============================================================================
+# Chunks received by a site are recorded in its catalog, next to the files
+# they make. Chunks of a file still being sent wait in the spool, so an
+# interrupted transfer resumes from its last chunk.
+REPLICA_DIR = ".replica"
+CATALOG_NAME = "catalog.ndjson"
+SPOOL_DIR = "chunks"
+
+# Files left to send to every site, journaled in the source directory.
+QUEUE_DIR = ".replicate"
+
+# Content-defined chunks: a cut where the rolling hash of the last 64 bytes
+# has its AVERAGE_BITS high bits at zero, i.e. every 8KB on average. An
+# edit only changes the chunks around it. Objects are chunked uncompressed:
+# an edit changes every compressed byte after it, so the chunks of two
+# versions of a compressed object hardly ever match. Chunks are compressed
+# on their own when sent instead.
+MIN_CHUNK = 2 * 1024
+MAX_CHUNK = 64 * 1024
+AVERAGE_BITS = 13
+HASH_BITS = 64
+HASH_LIMIT = (1 << HASH_BITS) - 1
+CUT_MASK = ((1 << AVERAGE_BITS) - 1) << (HASH_BITS - AVERAGE_BITS)
+# Gear table of the rolling hash, the same on every host.
+GEAR = [int(hashlib.sha1(str(index).encode("ascii")).hexdigest()[:16], 16) for index in range(256)]
+
+# Number of threads sending files to a site.
+TRANSFER_JOBS = 8
+
+# Bytes of decompressed objects a site keeps in memory to read the chunks
+# it has.
+PAYLOAD_CACHE = 64 * 1024 * 1024
+
+# =============================================================================
+# FUNCTIONS
+# =============================================================================
+def get_site_id(root):
+    """
+    Name of the queue of a site, stable for a path
+    :param root: share directory of the site
+    """
+    root = os.path.abspath(root)
+    return "{0}.{1}".format(os.path.basename(root) or "root",
+                            hashlib.sha1(root.encode("utf-8")).hexdigest()[:12])
+
+def get_path(root, name):
+    """
+    :param name: path relative to a share directory, with forward slashes
+    """
+    return os.path.join(root, *name.split("/"))
+
+def get_codec(name):
+    """
+    :param name: file name relative to a share directory
+    :return: codec of an object file, None for the other files
+    """
+    if not name.startswith(OBJECTS_DIR + "/"):
+        return None
+    return name.rsplit(".", 1)[-1]
+
+def decompress(data, codec):
+    decompressor = get_decompressor(codec)
+    payload = decompressor.decompress(data)
+    flush = getattr(decompressor, "flush", None)
+    if flush is not None:
+        payload += flush()
+    return payload
+
+def find_cuts(data):
+    """
+    Ends of the content-defined chunks of some data, with a gear rolling
+    hash. The MIN_CHUNK first bytes of a chunk are never cut, so they are
+    not hashed. Pure Python, about 5MB/s on one core.
+    :param data: bytes
+    :return: list of chunk end offsets, the last one being len(data)
+    """
+    data = bytearray(data)
+    size = len(data)
+    gear = GEAR
+    cuts = []
+    start = 0
+    while start < size:
+        end = min(start + MAX_CHUNK, size)
+        cut = end
+        rolling = 0
+        index = start + MIN_CHUNK
+        # Iterating a slice is faster than indexing every byte.
+        for byte in data[index:end]:
+            index += 1
+            rolling = ((rolling << 1) + gear[byte]) & HASH_LIMIT
+            if not rolling & CUT_MASK:
+                cut = index
+                break
+        cuts.append(cut)
+        start = cut
+    return cuts
+
+def split_chunks(data):
+    """
+    :param data: bytes
+    :return: list of (sha1 hex digest, offset, size) of the chunks
+    """
+    chunks = []
+    start = 0
+    for cut in find_cuts(data):
+        chunks.append((hashlib.sha1(data[start:cut]).hexdigest(), start, cut - start))
+        start = cut
+    return chunks
+
+def get_object_file(object_name):
+    """
+    :param object_name: object file name of a snippet, e.g. <sha1>.zlib
+    :return: name of the object file relative to the share directory
+    """
+    return "/".join([OBJECTS_DIR, object_name[:2], object_name])
+
+def list_source_files(snippets):
+    """
+    Files to replicate of a share directory: objects and raw snippets
+    first, then the pointers to them, so a site never lists a snippet
+    whose content is missing
+    :param snippets: dict of Snippet by name, from SnippetStore.load
+    :return: tuple, list of data file names and list of pointer names
+    """
+    data_names = set()
+    pointer_names = []
+    for name, snippet in snippets.items():
+        if snippet.object_name is None:
+            data_names.add(name)
+            continue
+        data_names.add(get_object_file(snippet.object_name))
+        pointer_names.append(name)
+    return sorted(data_names), sorted(pointer_names)
+
+def replicate(root, site_roots, jobs=TRANSFER_JOBS):
+    """
+    Mirror the snippets of a share directory to other sites
+    :param root: share directory
+    :param site_roots: share directories of the other sites
+    :param jobs: number of threads sending files
+    :return: list of ReplicationResult, one per site
+    """
+    replicator = Replicator(root, jobs)
+    return [replicator.replicate(site_root) for site_root in site_roots]
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Mirror a share_copy directory to other sites.")
+    parser.add_argument("root", help="Share directory to replicate")
+    parser.add_argument("sites", nargs="+", help="Share directories of the other sites")
+    parser.add_argument("-j", "--jobs", type=int, default=TRANSFER_JOBS,
+                        help="Threads sending files to a site. Default is {}".format(TRANSFER_JOBS))
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    failed = False
+    for result in replicate(args.root, args.sites, args.jobs):
+        print(result)
+        for name, error in result.failures:
+            print("    FAILED {0}: {1}".format(name, error))
+        failed = failed or bool(result.failures)
+    if failed:
+        sys.exit(1)
+
+# =============================================================================
+# CLASSES
+# =============================================================================
+class ReplicationResult(object):
+    """
+    Counters of replicating to one site. Source bytes are the uncompressed
+    bytes of the files chunked, sent bytes the compressed chunks written to
+    the site. Deduplicated bytes are the uncompressed ones of the chunks the
+    site had already, so they were not sent. Files which failed to send
+    are listed with their error, they stay queued for the next run.
+    """
+    def __init__(self, site_root):
+        self.site_root = site_root
+        self.files = 0
+        self.skipped = 0
+        self.source_bytes = 0
+        self.sent_bytes = 0
+        self.deduplicated_bytes = 0
+        self.elapsed = 0.0
+        self.failures = []
+
+    def __str__(self):
+        megabyte = 1024.0 * 1024.0
+        elapsed = self.elapsed or 1e-9
+        saved = 100.0 * self.deduplicated_bytes / self.source_bytes if self.source_bytes else 0.0
+        return ("{0}: {1} files ({2} already there), {3:.2f}MB in {4:.2f}s ({5:.1f}MB/s), "
+                "{6:.2f}MB sent ({7:.1f}MB/s), {8:.2f}MB saved by chunk dedup ({9:.0f}%)").format(
+            self.site_root, self.files, self.skipped, self.source_bytes / megabyte, self.elapsed,
+            self.source_bytes / megabyte / elapsed, self.sent_bytes / megabyte,
+            self.sent_bytes / megabyte / elapsed, self.deduplicated_bytes / megabyte, saved) + \
+            (", {} failed".format(len(self.failures)) if self.failures else "")
+
+    def add(self, counters):
+        """
+        :param counters: tuple returned by Replicator.send, objects the site
+            had already only count as files
+        """
+        source_bytes, sent_bytes, deduplicated_bytes, skipped = counters
+        self.files += 1
+        self.source_bytes += source_bytes
+        self.sent_bytes += sent_bytes
+        self.deduplicated_bytes += deduplicated_bytes
+        if skipped:
+            self.skipped += 1
+
+    def add_failure(self, name, error):
+        self.failures.append((name, error))
+
+class Site(object):
+    """
+    Share directory of another site, receiving chunks. A local or mounted
+    directory: sending a chunk is writing it compressed to the spool of the
+    site, while the chunks the site has already are read from its own
+    files, decompressing its objects.
+
+    Files are assembled from their chunks in the staging folder of the
+    site, checked against the hash of the source file, then renamed into
+    place, so the snippets of a site are never half written either.
+    """
+    def __init__(self, root):
+        self.root = root
+        self.replica_dir = os.path.join(root, REPLICA_DIR)
+        self.spool_dir = os.path.join(self.replica_dir, SPOOL_DIR)
+        self.catalog_path = os.path.join(self.replica_dir, CATALOG_NAME)
+        self.lock = threading.Lock()
+        # Location of every known chunk, (file name, offset, size) by hash.
+        self.chunks = {}
+        self.files = {}
+        # Last decompressed objects, by name.
+        self.payloads = OrderedDict()
+        self.payload_bytes = 0
+        # True once files were dropped from the catalog.
+        self.catalog_changed = False
+
+    def load(self):
+        """
+        Read the catalog, forgetting the files removed since, e.g. evicted
+        by the site. Rewritten once it holds COMPACT_SLACK dead records.
+        """
+        make_dirs(self.spool_dir)
+        records = 0
+        files = {}
+        if os.path.isfile(self.catalog_path):
+            with open(self.catalog_path) as catalog_file:
+                for line in catalog_file:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # Torn last line of an interrupted run.
+                        continue
+                    files[record["name"]] = record["chunks"]
+                    records += 1
+        self.files = dict((name, chunks) for name, chunks in files.items()
+                          if os.path.isfile(get_path(self.root, name)))
+        self.chunks = {}
+        for name, chunks in self.files.items():
+            for digest, offset, size in chunks:
+                self.chunks[digest] = (name, offset, size)
+        if records - len(self.files) > COMPACT_SLACK:
+            self.write_catalog()
+
+    def write_catalog(self):
+        temp_path = os.path.join(self.replica_dir, get_staging_name(CATALOG_NAME))
+        with open(temp_path, "w") as catalog_file:
+            for name, chunks in sorted(self.files.items()):
+                catalog_file.write(json.dumps({"name": name, "chunks": chunks}) + "\n")
+        replace_file(temp_path, self.catalog_path)
+
+    def has_file(self, name):
+        return os.path.isfile(get_path(self.root, name))
+
+    def spool_path(self, digest):
+        return os.path.join(self.spool_dir, digest)
+
+    def has_chunk(self, digest):
+        """
+        True if the site has a chunk in one of its files or in its spool
+        """
+        with self.lock:
+            location = self.chunks.get(digest)
+        if location is not None and self.has_file(location[0]):
+            return True
+        return os.path.isfile(self.spool_path(digest))
+
+    def read_payload(self, name):
+        """
+        Uncompressed content of an object of the site, kept for the next
+        chunks read from it
+        """
+        with self.lock:
+            payload = self.payloads.get(name)
+        if payload is None:
+            with open(get_path(self.root, name), "rb") as input_file:
+                payload = decompress(input_file.read(), get_codec(name))
+            with self.lock:
+                if name not in self.payloads:
+                    self.payloads[name] = payload
+                    self.payload_bytes += len(payload)
+                while self.payload_bytes > PAYLOAD_CACHE and len(self.payloads) > 1:
+                    self.payload_bytes -= len(self.payloads.popitem(last=False)[1])
+        return payload
+
+    def drop_file(self, name):
+        """
+        Forget the chunks of a file which no longer matches its catalog
+        record, e.g. rewritten at the site, so they are sent again
+        """
+        with self.lock:
+            if self.files.pop(name, None) is None:
+                return
+            for digest, location in list(self.chunks.items()):
+                if location[0] == name:
+                    del self.chunks[digest]
+            payload = self.payloads.pop(name, None)
+            if payload is not None:
+                self.payload_bytes -= len(payload)
+            self.catalog_changed = True
+
+    def read_chunk(self, digest):
+        """
+        Read a chunk from the file the catalog locates it in, else from the
+        spool. A file whose bytes do not hash to the chunk is dropped from
+        the catalog.
+        :raise IOError: if the site does not have the chunk
+        """
+        with self.lock:
+            location = self.chunks.get(digest)
+        if location is not None:
+            name, offset, size = location
+            try:
+                if get_codec(name) is not None:
+                    data = self.read_payload(name)[offset:offset + size]
+                else:
+                    with open(get_path(self.root, name), "rb") as input_file:
+                        input_file.seek(offset)
+                        data = input_file.read(size)
+                if len(data) == size and hashlib.sha1(data).hexdigest() == digest:
+                    return data
+            except (IOError, OSError, zlib.error):
+                pass
+            self.drop_file(name)
+        with open(self.spool_path(digest), "rb") as chunk_file:
+            return zlib.decompress(chunk_file.read())
+
+    def put_chunk(self, digest, data):
+        """
+        Send a chunk to the spool, compressed, through a staging file so the
+        spool only holds whole chunks
+        :return: number of bytes sent
+        """
+        temp_path = os.path.join(self.spool_dir, get_staging_name(digest))
+        data = zlib.compress(data, ZLIB_LEVEL)
+        with open(temp_path, "wb") as chunk_file:
+            chunk_file.write(data)
+        replace_file(temp_path, self.spool_path(digest))
+        return len(data)
+
+    def assemble(self, name, digest, chunks):
+        """
+        Write a file from chunks the site has, then record its chunks.
+        Objects are compressed again at the site: they are named after
+        their uncompressed content, which is what is checked.
+        :param name: file name relative to the share directory
+        :param digest: sha1 of the whole file, uncompressed for objects
+        :param chunks: list of (chunk hash, offset, size)
+        """
+        staging_dir = os.path.join(self.root, STAGING_DIR)
+        make_dirs(staging_dir)
+        temp_path = os.path.join(staging_dir, get_staging_name(os.path.basename(name)))
+        codec = get_codec(name)
+        compressor = get_compressor(codec) if codec is not None else None
+        file_hash = hashlib.sha1()
+        try:
+            with open(temp_path, "wb") as output_file:
+                for chunk_digest, _, _ in chunks:
+                    data = self.read_chunk(chunk_digest)
+                    file_hash.update(data)
+                    output_file.write(compressor.compress(data) if compressor is not None else data)
+                if compressor is not None:
+                    output_file.write(compressor.flush())
+            if file_hash.hexdigest() != digest:
+                raise ValueError("{0} differs from its source once assembled.".format(name))
+            path = get_path(self.root, name)
+            make_dirs(os.path.dirname(path))
+            replace_file(temp_path, path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        with self.lock:
+            self.files[name] = [list(chunk) for chunk in chunks]
+            for chunk in chunks:
+                self.chunks[chunk[0]] = (name, chunk[1], chunk[2])
+            with open(self.catalog_path, "a") as catalog_file:
+                catalog_file.write(json.dumps({"name": name, "chunks": self.files[name]}) + "\n")
+
+    def clean_spool(self):
+        """
+        Remove the spooled chunks, once every file using them is assembled
+        """
+        for name in os.listdir(self.spool_dir):
+            try:
+                os.remove(os.path.join(self.spool_dir, name))
+            except OSError:
+                continue
+
+class TransferQueue(object):
+    """
+    Files to send to a site, as an append-only journal of queued and sent
+    records. A run killed midway leaves the queued files without a sent
+    record, which the next run sends first. Only one run per site holds
+    the lock of the journal.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.journal = None
+        # Record of every known file by name: size, mtime and sent flag.
+        self.entries = {}
+
+    def open(self):
+        make_dirs(os.path.dirname(self.path))
+        self.journal = open(self.path, "a")
+        if fcntl is not None:
+            try:
+                fcntl.flock(self.journal.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except (IOError, OSError):
+                self.journal.close()
+                raise ValueError("Another replication to this site is running ({}).".format(self.path))
+        self.entries = {}
+        with open(self.path) as journal_file:
+            for line in journal_file:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                self.entries[record["name"]] = record
+
+    def close(self):
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+
+    def write(self, records):
+        with self.lock:
+            self.journal.write("".join(json.dumps(record, sort_keys=True) + "\n" for record in records))
+            self.journal.flush()
+            for record in records:
+                self.entries[record["name"]] = record
+
+    def add(self, root, names):
+        """
+        Queue the files not sent yet, or changed since they were sent
+        :param root: source share directory
+        :param names: file names relative to it
+        """
+        records = []
+        for name in names:
+            try:
+                file_stat = os.stat(get_path(root, name))
+            except OSError:
+                continue
+            entry = self.entries.get(name)
+            if entry is not None and entry["size"] == file_stat.st_size and entry["mtime"] == file_stat.st_mtime:
+                continue
+            records.append({"name": name, "size": file_stat.st_size, "mtime": file_stat.st_mtime, "sent": False})
+        if records:
+            self.write(records)
+
+    def mark_sent(self, name):
+        record = dict(self.entries[name])
+        record["sent"] = True
+        self.write([record])
+
+    def pending(self):
+        return sorted(name for name, entry in self.entries.items() if not entry["sent"])
+
+    def compact(self, names):
+        """
+        Rewrite the journal with the sent records of the given files only,
+        once nothing is pending
+        :param names: file names still in the source directory
+        """
+        with self.lock:
+            self.entries = dict((name, self.entries[name]) for name in names if name in self.entries)
+            temp_path = "{0}.{1}.tmp".format(self.path, os.getpid())
+            with open(temp_path, "w") as journal_file:
+                for name in sorted(self.entries):
+                    journal_file.write(json.dumps(self.entries[name], sort_keys=True) + "\n")
+            # The lock is held on the open journal, the new one is locked
+            # before the rename so no other run takes it meanwhile.
+            new_journal = open(temp_path, "a")
+            if fcntl is not None:
+                fcntl.flock(new_journal.fileno(), fcntl.LOCK_EX)
+            replace_file(temp_path, self.path)
+            self.journal.close()
+            self.journal = new_journal
+
+class Replicator(object):
+    """
+    Mirror a share directory to other sites. Files are split into
+    content-defined chunks and only the chunks a site does not have are
+    sent, by a pool of threads. Every file is queued in a journal before
+    any is sent, so a run killed midway is resumed by the next one, and
+    chunks already spooled at the site are not sent again. A file failing
+    to send does not stop the others, it stays queued, and so do the
+    pointers to an object which failed.
+
+    Snippets published at a site are left alone: the sites share the
+    snippet names and objects, never overwrite them.
+    """
+    def __init__(self, root, jobs=TRANSFER_JOBS):
+        self.root = root
+        self.jobs = jobs
+        self.store = SnippetStore(root)
+        # Chunks of the files sent, by name, size and mtime, so a file is
+        # only chunked once for all the sites.
+        self.chunk_cache = {}
+        self.cache_lock = threading.Lock()
+
+    def replicate(self, site_root):
+        """
+        :param site_root: share directory of the other site
+        :return: ReplicationResult
+        """
+        result = ReplicationResult(site_root)
+        start_time = time.time()
+        site = Site(site_root)
+        site.load()
+        queue = TransferQueue(os.path.join(self.root, QUEUE_DIR, get_site_id(site_root) + ".ndjson"))
+        queue.open()
+        try:
+            snippets = self.store.load()
+            data_names, pointer_names = list_source_files(snippets)
+            queue.add(self.root, data_names + pointer_names)
+
+            pending = set(queue.pending())
+            failed = self.send_all(site, queue, [name for name in data_names if name in pending], result)
+            # Pointers only once their object is there.
+            pointers = []
+            for name in sorted(pending.difference(data_names)):
+                snippet = snippets.get(name)
+                if snippet is not None and get_object_file(snippet.object_name) in failed:
+                    result.add_failure(name, ValueError("Its object was not replicated."))
+                else:
+                    pointers.append(name)
+            self.send_all(site, queue, pointers, result)
+            if site.catalog_changed:
+                site.write_catalog()
+
+            # Index the new snippets at the site, and evict there within its
+            # own quotas.
+            sent = [snippet for name, snippet in snippets.items()
+                    if name in pending and site.has_file(name)]
+            if sent:
+                site_store = SnippetStore(site_root)
+                site_store.append(sent)
+                site_store.collect()
+
+            if not queue.pending():
+                queue.compact(data_names + pointer_names)
+                site.clean_spool()
+        finally:
+            queue.close()
+        result.elapsed = time.time() - start_time
+        return result
+
+    def send_all(self, site, queue, names, result):
+        """
+        Send files on up to self.jobs threads, recording the errors of the
+        ones failing
+        :param names: file names relative to the share directory
+        :param result: ReplicationResult receiving the counters and failures
+        :return: set of the names which failed
+        """
+        names = sorted(names)
+        remaining = list(reversed(names))
+        outcomes = {}
+        lock = threading.Lock()
+
+        def work():
+            while True:
+                with lock:
+                    if not remaining:
+                        return
+                    name = remaining.pop()
+                try:
+                    outcome = self.send(site, queue, name), None
+                except Exception as error:
+                    outcome = None, error
+                with lock:
+                    outcomes[name] = outcome
+
+        workers = [threading.Thread(target=work) for _ in range(min(self.jobs, len(names)))]
+        for worker in workers:
+            worker.daemon = True
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        failed = set()
+        for name in names:
+            counters, error = outcomes[name]
+            if error is not None:
+                result.add_failure(name, error)
+                failed.add(name)
+            elif counters is not None:
+                result.add(counters)
+        return failed
+
+    def send(self, site, queue, name):
+        """
+        Send the chunks of a file the site does not have, then assemble it
+        there. Objects are chunked uncompressed.
+        :return: tuple, uncompressed source bytes, bytes sent, bytes
+            deduplicated and True if the site had the file already, None if
+            the file was removed from the source meanwhile
+        """
+        path = get_path(self.root, name)
+        try:
+            with open(path, "rb") as input_file:
+                file_stat = os.fstat(input_file.fileno())
+                data = input_file.read()
+        except (IOError, OSError):
+            queue.mark_sent(name)
+            return None
+
+        # Objects are named after their content.
+        codec = get_codec(name)
+        if codec is not None and site.has_file(name):
+            queue.mark_sent(name)
+            return 0, 0, 0, True
+        if codec is not None:
+            data = decompress(data, codec)
+
+        key = (name, file_stat.st_size, file_stat.st_mtime)
+        with self.cache_lock:
+            cached = self.chunk_cache.get(key)
+        if cached is None:
+            cached = split_chunks(data), hashlib.sha1(data).hexdigest()
+            with self.cache_lock:
+                self.chunk_cache[key] = cached
+        chunks, file_digest = cached
+        sent = deduplicated = 0
+        for digest, offset, size in chunks:
+            if site.has_chunk(digest):
+                deduplicated += size
+                continue
+            sent += site.put_chunk(digest, data[offset:offset + size])
+        try:
+            site.assemble(name, file_digest, chunks)
+        except (IOError, OSError):
+            # Chunks found changed at the site were dropped from its
+            # catalog: send them and assemble once more.
+            missing = [chunk for chunk in chunks if not site.has_chunk(chunk[0])]
+            if not missing:
+                raise
+            for digest, offset, size in missing:
+                deduplicated -= size
+                sent += site.put_chunk(digest, data[offset:offset + size])
+            site.assemble(name, file_digest, chunks)
+        queue.mark_sent(name)
+        return len(data), sent, deduplicated, False
+
+if __name__ == "__main__":
+    main()
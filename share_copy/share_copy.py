@@ -15,6 +15,8 @@ try:
 except ImportError:
    IN_HOU = False
 
+from share_copy.store import SnippetStore, get_publisher
+
 # =============================================================================
 # GLOBALS
 # =============================================================================
@@ -67,20 +69,26 @@ def parent_hou(widget):
 def share_copy():
     """
     Get the selected nodes and network items and save them as cpio file to
-    the share directory
+    the share directory. The file is written aside and renamed into place
+    shortly after, copies made meanwhile replace it.
     """
     items = hou.selectedItems(True)
 
     if len(items) > 0:
         first_node = None
+        node_count = 0
 
         for i in items:
             if i.networkItemType() == hou.networkItemType.Node:
                 first_node = i
+                node_count += 1
         if first_node:
             node_category_type = first_node.type().category().name()
-            file_name = "{0}/{1}_{2}.cpio".format(SHARE_DIR, os.getenv("USER"), node_category_type)
-            first_node.parent().saveItemsToFile(items, file_name, save_hda_fallbacks=True)
+
+            def save(file_name):
+                first_node.parent().saveItemsToFile(items, file_name, save_hda_fallbacks=True)
+
+            get_publisher(SHARE_DIR).publish(os.getenv("USER"), node_category_type, save, node_count)
     else:
         message = "Please select node(s)."
         hou.ui.displayMessage(message)
@@ -219,35 +227,39 @@ class SharePasteWidget(QtWidgets.QDialog, BaseWidget):
     def get_share_files(self):
         """
         Get the same category (destination) file list and sort them based on
-        modified time from nearest to furthest.
+        modified time from nearest to furthest. Read from the index of the
+        share directory, which is only scanned when the index is stale.
+        Older versions of a snippet are listed indented under the latest one.
         """
         paste_category_type = self.destination.childTypeCategory().name()
+        # Our own copies still waiting to be published go first. If they fail
+        # to publish, they stay pending and the snippets already published
+        # are listed anyway.
+        try:
+            get_publisher(SHARE_DIR).flush()
+        except Exception as error:
+            hou.ui.displayMessage("Your last copies could not be shared yet, they are retried on the next "
+                                  "copy or paste:\n{}".format(error))
         now = time.time()
 
-        dir_list = os.listdir(SHARE_DIR)
-        new_list = []
-
-        for i in range(0, len(dir_list)):
-            # get the file's last modified time and calculate the age
-            mod_time = os.path.getmtime(SHARE_DIR + dir_list[i])
-            age = now - mod_time
-            entry = {"item": dir_list[i], "age": age}
-            new_list.append(entry)
-        new_list.sort(key=lambda entry: entry["age"])
-
         paste_list = []
 
-        for shared_item in new_list:
-            (username, cat) = shared_item.get("item").split(".")[0].split("_")
-            if cat == paste_category_type:
-                if cat in CATEGORY_TRANSLATE:
-                    cat = CATEGORY_TRANSLATE[cat]
-                formatted_age = self.format_age(shared_item.get("age"))
+        for versions in SnippetStore(SHARE_DIR).list_history(paste_category_type):
+            for back, snippet in enumerate(versions):
+                cat = CATEGORY_TRANSLATE.get(snippet.category, snippet.category)
+                formatted_age = self.format_age(now - snippet.mtime)
                 # the display name is refomatted to example like:
-                # 'amychu: Rop (7 minutes)'
-                name = "{0}: {1} ({2})".format(username, cat, formatted_age)
+                # 'amychu: Rop (7 minutes)', or 'amychu: Rop, 3 nodes (7 minutes)'
+                # when the node count was recorded, and older versions like
+                # '    amychu: Rop (2.5 hours, -1)'
+                if snippet.nodes:
+                    cat = "{0}, {1} nodes".format(cat, snippet.nodes)
+                if back:
+                    name = "    {0}: {1} ({2}, -{3})".format(snippet.user, cat, formatted_age, back)
+                else:
+                    name = "{0}: {1} ({2})".format(snippet.user, cat, formatted_age)
                 paste_list.append(name)
-                self.remap[name] = shared_item.get("item")
+                self.remap[name] = snippet.name
 
         return paste_list
 
@@ -272,11 +284,23 @@ class SharePasteWidget(QtWidgets.QDialog, BaseWidget):
         Load the selected cpio file to the destination category
         """
         name = self.remap.get(self.selected_item[0])
-        file_path = "{0}/{1}".format(SHARE_DIR, name)
-        current_dir = hou.pwd().path()
-        hou.cd(self.destination.path())
-        hou.hscript("opread {}".format(file_path))
-        hou.cd(current_dir)
+        store = SnippetStore(SHARE_DIR)
+        try:
+            file_path, temporary = store.extract(name)
+        except (IOError, OSError, ValueError):
+            hou.ui.displayMessage("This version was removed meanwhile, please open Share Paste again.")
+            return
+        try:
+            current_dir = hou.pwd().path()
+            hou.cd(self.destination.path())
+            hou.hscript("opread {}".format(file_path))
+            hou.cd(current_dir)
+        finally:
+            # Compressed snippets are decompressed to a temporary file.
+            if temporary:
+                os.remove(file_path)
+        # Pasted versions are evicted last.
+        store.touch(name)
 
     def cancel_pressed_cb(self):
         self.cancel_pressed.emit(True)
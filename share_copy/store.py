@@ -0,0 +1,804 @@
+# Built-in
+import atexit
+import hashlib
+import heapq
+import itertools
+import json
+import logging
+import os
+import socket
+import tempfile
+import threading
+import time
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# =============================================================================
+# GLOBALS
+# =============================================================================
+# Snippets of older share_copy are raw cpio files. Snippets are now small
+# pointer files to a compressed object named after the hash of its content,
+# so identical snippets are stored once.
+SNIPPET_EXT = ".cpio"
+POINTER_EXT = ".snip"
+OBJECTS_DIR = ".objects"
+
+# zstd when available, faster and smaller than zlib. The codec is recorded
+# in every pointer.
+ZLIB = "zlib"
+ZSTD = "zstd"
+CODEC = ZSTD if zstandard is not None else ZLIB
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 3
+
+# Bytes read at once when hashing, compressing and decompressing.
+CHUNK_SIZE = 1024 * 1024
+
+# Objects modified this many seconds ago or less are never removed: a
+# publish may be about to point to them again.
+OBJECT_GRACE = 10 * 60
+
+# Append-only index of the published snippets, one JSON record per line.
+# Hidden so it is never listed as a snippet.
+INDEX_NAME = ".index.ndjson"
+INDEX_VERSION = 1
+
+# The index is rewritten with one record per snippet once it holds this
+# many records more than snippets.
+COMPACT_SLACK = 256
+
+# Snippets are written here first, then renamed into place. Same filesystem
+# as the snippets, so the rename is atomic.
+STAGING_DIR = ".staging"
+STAGING_COUNTER = itertools.count(1)
+
+# Staging files older than this many seconds were left by a writer killed
+# mid-publish and are removed when the index is rebuilt.
+STAGING_MAX_AGE = 60 * 60
+
+# Seconds a publish waits for another one of the same snippet, only the
+# last one is renamed into place.
+COALESCE_WINDOW = 0.5
+
+# Versions kept per user and category, and quotas of the whole share
+# directory. Past them the least recently used versions are evicted.
+RING_SIZE = 10
+MAX_BYTES = 2 * 1024 * 1024 * 1024
+MAX_AGE = 30 * 24 * 60 * 60
+
+PUBLISHERS = {}
+PUBLISHERS_LOCK = threading.Lock()
+
+LOGGER = logging.getLogger(__name__)
+
+# =============================================================================
+# FUNCTIONS
+# =============================================================================
+def new_version():
+    """
+    Version of a new snippet: the publish time in milliseconds, so writers
+    need not agree on a counter
+    """
+    return int(time.time() * 1000)
+
+def get_snippet_name(user, category, version=None):
+    """
+    File name of a version of the snippet of a user and a node category
+    :param user: user name
+    :param category: node type category name, e.g. Sop
+    :param version: None for the unversioned cpio name of older share_copy
+    """
+    if version is None:
+        return "{0}_{1}{2}".format(user, category, SNIPPET_EXT)
+    return "{0}_{1}.{2}{3}".format(user, category, version, POINTER_EXT)
+
+def parse_snippet_name(name):
+    """
+    User, category and version of a snippet file name, None if it is not a
+    snippet. User names may hold underscores, categories do not. Unversioned
+    snippets of older share_copy are version 0.
+    :param name: file name, e.g. amychu_Driver.1712345678901.snip
+    """
+    if name.startswith("."):
+        return None
+    ext = os.path.splitext(name)[1]
+    if ext not in (POINTER_EXT, SNIPPET_EXT):
+        return None
+    base = name[:-len(ext)]
+    version = 0
+    head, dot, tail = base.rpartition(".")
+    if dot and tail.isdigit():
+        base = head
+        version = int(tail)
+    parts = base.rsplit("_", 1)
+    if len(parts) != 2 or not all(parts):
+        return None
+    return parts[0], parts[1], version
+
+def get_staging_name(name):
+    """
+    Staging file name unique to this writer, host and pid, as writers of
+    several hosts share the directory
+    :param name: snippet file name
+    """
+    return "{0}.{1}.{2}.{3}.tmp".format(name, socket.gethostname(), os.getpid(), next(STAGING_COUNTER))
+
+def get_publisher(root, window=COALESCE_WINDOW):
+    """
+    Publisher of a share directory, one per process
+    :param root: share directory
+    :param window: in seconds
+    """
+    with PUBLISHERS_LOCK:
+        publisher = PUBLISHERS.get(root)
+        if publisher is None:
+            publisher = PUBLISHERS[root] = Publisher(SnippetStore(root), window)
+        return publisher
+
+def make_dirs(path):
+    """
+    Make a folder, which other writers may be making at the same time
+    """
+    if not os.path.isdir(path):
+        try:
+            os.makedirs(path)
+        except OSError:
+            if not os.path.isdir(path):
+                raise
+
+def get_compressor(codec):
+    """
+    :return: streaming compressor with compress() and flush()
+    """
+    if codec == ZSTD:
+        if zstandard is None:
+            raise ValueError("The zstandard module is needed for zstd snippets.")
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+    return zlib.compressobj(ZLIB_LEVEL)
+
+def get_decompressor(codec):
+    """
+    :return: streaming decompressor with decompress()
+    """
+    if codec == ZSTD:
+        if zstandard is None:
+            raise ValueError("The zstandard module is needed for zstd snippets.")
+        return zstandard.ZstdDecompressor().decompressobj()
+    return zlib.decompressobj()
+
+def hash_file(path):
+    """
+    Hash of the content of a file. sha1 is in hashlib of every Python
+    version Houdini ships, so every host names objects the same way.
+    :param path: file path
+    """
+    digest = hashlib.sha1()
+    with open(path, "rb") as input_file:
+        for chunk in iter(lambda: input_file.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def compress_file(source, target, codec=CODEC):
+    """
+    Compress a file chunk by chunk
+    :return: number of bytes written
+    """
+    compressor = get_compressor(codec)
+    written = 0
+    with open(source, "rb") as input_file:
+        with open(target, "wb") as output_file:
+            for chunk in iter(lambda: input_file.read(CHUNK_SIZE), b""):
+                data = compressor.compress(chunk)
+                output_file.write(data)
+                written += len(data)
+            data = compressor.flush()
+            output_file.write(data)
+            written += len(data)
+    return written
+
+def decompress_file(source, target, codec=CODEC):
+    """
+    Decompress a file chunk by chunk
+    :return: number of bytes written
+    """
+    decompressor = get_decompressor(codec)
+    written = 0
+    with open(source, "rb") as input_file:
+        with open(target, "wb") as output_file:
+            for chunk in iter(lambda: input_file.read(CHUNK_SIZE), b""):
+                data = decompressor.decompress(chunk)
+                output_file.write(data)
+                written += len(data)
+            flush = getattr(decompressor, "flush", None)
+            if flush is not None:
+                data = flush()
+                output_file.write(data)
+                written += len(data)
+    return written
+
+def replace_file(source, target):
+    """
+    Rename source over target in one step. os.replace is missing on
+    Python 2, where os.rename does the same on POSIX.
+    """
+    replace = getattr(os, "replace", None)
+    if replace is not None:
+        replace(source, target)
+    else:
+        os.rename(source, target)
+
+# =============================================================================
+# CLASSES
+# =============================================================================
+class Snippet(object):
+    """
+    One published version of a snippet, as recorded in the index and in
+    its pointer file. Size is the one of the cpio content, stored the one
+    of its compressed object.
+    """
+    def __init__(self, user, category, name, mtime, size, nodes=0, version=0, used=None,
+                 object_id=None, codec=None, stored=None):
+        self.user = user
+        self.category = category
+        self.name = name
+        self.mtime = mtime
+        self.size = size
+        self.nodes = nodes
+        self.version = version
+        # Last paste of this version, None if never pasted.
+        self.used = used
+        # Hash of the content and codec of the object, None for the raw
+        # cpio snippets of older share_copy.
+        self.object_id = object_id
+        self.codec = codec
+        self.stored = size if stored is None else stored
+
+    def __repr__(self):
+        return "<Snippet {0} ({1} nodes)>".format(self.name, self.nodes)
+
+    @property
+    def key(self):
+        return (self.user, self.category)
+
+    @property
+    def last_used(self):
+        return max(self.mtime, self.used or 0)
+
+    @property
+    def object_name(self):
+        if self.object_id is None:
+            return None
+        return "{0}.{1}".format(self.object_id, self.codec)
+
+    def to_data(self):
+        return {"user": self.user, "category": self.category, "name": self.name,
+                "mtime": self.mtime, "size": self.size, "nodes": self.nodes,
+                "version": self.version, "used": self.used, "object": self.object_id,
+                "codec": self.codec, "stored": self.stored}
+
+    @classmethod
+    def from_data(cls, data):
+        return cls(data["user"], data["category"], data["name"], data["mtime"], data["size"],
+                   data.get("nodes", 0), data.get("version", 0), data.get("used"),
+                   data.get("object"), data.get("codec"), data.get("stored"))
+
+
+class SnippetStore(object):
+    """
+    Snippets of a share directory and their index. Publishing appends one
+    record to the index, so listing the snippets reads one small file
+    instead of stat-ing every snippet. Nothing here needs Houdini: the
+    snippet file itself is written by a callable.
+
+    A snippet is written to a local staging file of its writer, hashed,
+    compressed into the objects folder unless an identical snippet is
+    there already, then its pointer file is renamed into place. Readers
+    never see a half written snippet and need no lock. Only compressed
+    bytes go to the share directory, and none for a known snippet.
+
+    Every publish is a new version. The last ring_size versions of a user
+    and category are kept, within the max_bytes and max_age quotas of the
+    whole directory. collect() picks the versions to evict from the index,
+    least recently used first, so it costs one unlink per evicted version
+    and no listing.
+
+    Every writer adding or removing snippets records the mtime of the
+    directory in the index after its change. The index is stale when the
+    directory mtime differs from the last one recorded, e.g. snippets
+    published by an older share_copy. The directory is then scanned and
+    the index rewritten. Only mtimes of the file server are compared, so
+    clocks of the hosts need not agree.
+    """
+    def __init__(self, root, ring_size=RING_SIZE, max_bytes=MAX_BYTES, max_age=MAX_AGE):
+        self.root = root
+        self.index_path = os.path.join(root, INDEX_NAME)
+        self.ring_size = ring_size
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+
+    def snippet_path(self, name):
+        return os.path.join(self.root, name)
+
+    def object_path(self, object_name):
+        return os.path.join(self.root, OBJECTS_DIR, object_name[:2], object_name)
+
+    def stage(self, user, category, write_func, nodes=0):
+        """
+        Write a snippet to a local staging file and hash it, not visible to
+        readers yet
+        :param user: user name
+        :param category: node type category name, e.g. Sop
+        :param write_func: called with the path to write the snippet to
+        :param nodes: number of nodes in the snippet
+        :return: tuple, staging file path and its Snippet
+        """
+        staging_dir = os.path.join(tempfile.gettempdir(), "share_copy_staging")
+        make_dirs(staging_dir)
+        version = new_version()
+        name = get_snippet_name(user, category, version)
+        staging_path = os.path.join(staging_dir, get_staging_name(name))
+        try:
+            write_func(staging_path)
+            file_stat = os.stat(staging_path)
+            object_id = hash_file(staging_path)
+        except Exception:
+            if os.path.exists(staging_path):
+                os.remove(staging_path)
+            raise
+        return staging_path, Snippet(user, category, name, file_stat.st_mtime, file_stat.st_size, nodes,
+                                     version, object_id=object_id, codec=CODEC)
+
+    def commit(self, staged):
+        """
+        Store the objects of staged snippets, rename their pointers into
+        place, record them in the index with one write, then evict the
+        versions out of the ring or the quotas
+        :param staged: list of (staging file path, Snippet). The staging
+            file of a committed snippet is removed, so on error the ones
+            still staged are the ones left to commit.
+        """
+        committed = []
+        try:
+            for staging_path, snippet in staged:
+                snippet.stored = self.store_object(staging_path, snippet)
+                self.write_pointer(snippet)
+                os.remove(staging_path)
+                committed.append(snippet)
+        finally:
+            if committed:
+                self.append(committed)
+        self.collect()
+
+    def store_object(self, staging_path, snippet):
+        """
+        Compress a staged snippet into its object, unless the object exists:
+        it is then only touched so a collection does not remove it
+        :return: size of the object
+        """
+        object_path = self.object_path(snippet.object_name)
+        if os.path.isfile(object_path):
+            try:
+                os.utime(object_path, None)
+                return os.path.getsize(object_path)
+            except OSError:
+                # Removed meanwhile, stored again below.
+                pass
+        make_dirs(os.path.dirname(object_path))
+        share_staging_dir = os.path.join(self.root, STAGING_DIR)
+        make_dirs(share_staging_dir)
+        temp_path = os.path.join(share_staging_dir, get_staging_name(snippet.object_name))
+        try:
+            stored = compress_file(staging_path, temp_path, snippet.codec)
+            replace_file(temp_path, object_path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return stored
+
+    def write_pointer(self, snippet):
+        """
+        Write the pointer file of a snippet, through a staging file
+        """
+        share_staging_dir = os.path.join(self.root, STAGING_DIR)
+        make_dirs(share_staging_dir)
+        temp_path = os.path.join(share_staging_dir, get_staging_name(snippet.name))
+        data = snippet.to_data()
+        del data["used"]
+        with open(temp_path, "w") as pointer_file:
+            pointer_file.write(json.dumps(data, sort_keys=True))
+        replace_file(temp_path, self.snippet_path(snippet.name))
+
+    def read_pointer(self, name):
+        """
+        :return: Snippet of a pointer file
+        """
+        with open(self.snippet_path(name)) as pointer_file:
+            return Snippet.from_data(json.load(pointer_file))
+
+    def extract(self, name):
+        """
+        Path of the cpio content of a snippet, decompressed to a temporary
+        file for pointers, e.g. to opread it
+        :param name: snippet file name
+        :return: tuple, cpio path and True if it is a temporary file to
+            remove once read
+        """
+        if not name.endswith(POINTER_EXT):
+            path = self.snippet_path(name)
+            if not os.path.isfile(path):
+                raise IOError("Snippet {0} was removed.".format(name))
+            return path, False
+        snippet = self.read_pointer(name)
+        handle, temp_path = tempfile.mkstemp(prefix="share_paste_", suffix=SNIPPET_EXT)
+        os.close(handle)
+        try:
+            decompress_file(self.object_path(snippet.object_name), temp_path, snippet.codec)
+        except Exception:
+            os.remove(temp_path)
+            raise
+        return temp_path, True
+
+    def publish(self, user, category, write_func, nodes=0):
+        """
+        Write a snippet and record it in the index
+        :param user: user name
+        :param category: node type category name, e.g. Sop
+        :param write_func: called with the path to write the snippet to
+        :param nodes: number of nodes in the snippet
+        :return: the published Snippet
+        """
+        staged = self.stage(user, category, write_func, nodes)
+        self.commit([staged])
+        return staged[1]
+
+    def append(self, snippets):
+        """
+        Add records to the index. A single write in append mode, so records
+        of concurrent writers of one host do not mix. Over NFS appends of
+        several hosts may still interleave: broken records are skipped by
+        readers.
+        :param snippets: list of Snippet, already in the directory
+        """
+        self.append_records([snippet.to_data() for snippet in snippets], changed=True)
+
+    def append_records(self, records, changed=False):
+        """
+        :param records: list of record dicts
+        :param changed: True if the directory was changed by the caller,
+            its mtime is then recorded after the records
+        """
+        # A new index starts from the snippets already in the directory.
+        if not os.path.isfile(self.index_path):
+            self.rebuild()
+        if changed:
+            records = records + [{"dir_mtime": os.stat(self.root).st_mtime}]
+        data = "".join(json.dumps(record, sort_keys=True) + "\n" for record in records)
+        with open(self.index_path, "a") as index_file:
+            index_file.write(data)
+
+    def touch(self, name):
+        """
+        Record a paste of a snippet, so it is evicted last
+        :param name: snippet file name
+        """
+        self.append_records([{"name": name, "used": time.time()}])
+
+    def plan_eviction(self, snippets, now=None):
+        """
+        Versions to evict: out of the ring of their user and category, older
+        than max_age, then the least recently used until the directory fits
+        in max_bytes
+        :param snippets: dict of Snippet by name
+        :param now: time of the eviction, in seconds
+        :return: set of snippet names
+        """
+        now = time.time() if now is None else now
+        evicted = set()
+
+        versions = {}
+        for snippet in snippets.values():
+            versions.setdefault(snippet.key, []).append(snippet)
+        for key_versions in versions.values():
+            if len(key_versions) > self.ring_size:
+                key_versions.sort(key=lambda snippet: snippet.version, reverse=True)
+                evicted.update(snippet.name for snippet in key_versions[self.ring_size:])
+
+        # Identical snippets share their object, which only counts once and
+        # is freed with the last of them.
+        heap = []
+        references = {}
+        total = 0
+        for snippet in snippets.values():
+            if snippet.name in evicted:
+                continue
+            if now - snippet.last_used > self.max_age:
+                evicted.add(snippet.name)
+                continue
+            heap.append((snippet.last_used, snippet.name, snippet.object_name or snippet.name, snippet.stored))
+            key = snippet.object_name or snippet.name
+            if key not in references:
+                total += snippet.stored
+            references[key] = references.get(key, 0) + 1
+
+        if total > self.max_bytes:
+            heapq.heapify(heap)
+            while total > self.max_bytes and heap:
+                _, name, key, stored = heapq.heappop(heap)
+                evicted.add(name)
+                references[key] -= 1
+                if not references[key]:
+                    total -= stored
+        return evicted
+
+    def collect(self, snippets=None, now=None):
+        """
+        Remove the evicted versions, then record them in the index with one
+        write. Concurrent collections may remove the same versions.
+        :param snippets: dict of Snippet by name, read from the index if None
+        :param now: time of the eviction, in seconds
+        :return: list of the removed snippet names
+        """
+        if snippets is None:
+            snippets = self.load()
+        evicted = sorted(self.plan_eviction(snippets, now))
+        for name in evicted:
+            try:
+                os.remove(self.snippet_path(name))
+            except OSError:
+                pass
+        if evicted:
+            self.append_records([{"name": name, "deleted": True} for name in evicted], changed=True)
+
+        # Objects no longer pointed to, unless touched by a recent publish.
+        evicted_set = set(evicted)
+        kept = set(snippet.object_name for name, snippet in snippets.items() if name not in evicted_set)
+        for name in evicted:
+            object_name = snippets[name].object_name
+            if object_name is None or object_name in kept:
+                continue
+            kept.add(object_name)
+            object_path = self.object_path(object_name)
+            try:
+                if time.time() - os.stat(object_path).st_mtime > OBJECT_GRACE:
+                    os.remove(object_path)
+            except OSError:
+                pass
+        return evicted
+
+    def clean_staging(self, max_age=STAGING_MAX_AGE):
+        """
+        Remove the staging files left by writers killed mid-publish
+        :param max_age: in seconds
+        """
+        staging_dir = os.path.join(self.root, STAGING_DIR)
+        if not os.path.isdir(staging_dir):
+            return
+        now = time.time()
+        for name in os.listdir(staging_dir):
+            path = os.path.join(staging_dir, name)
+            try:
+                if now - os.stat(path).st_mtime > max_age:
+                    os.remove(path)
+            except OSError:
+                continue
+
+    def is_stale(self, dir_mtime):
+        """
+        True if the directory changed since the last mtime recorded in the
+        index
+        :param dir_mtime: last directory mtime of the index, None if the
+            index is missing or has none
+        """
+        return dir_mtime is None or os.stat(self.root).st_mtime != dir_mtime
+
+    def read_index(self):
+        """
+        Latest record of every snippet of the index
+        :return: tuple, dict of Snippet by name, number of records read and
+            last directory mtime recorded
+        """
+        snippets = {}
+        records = 0
+        dir_mtime = None
+        with open(self.index_path) as index_file:
+            for line in index_file:
+                try:
+                    data = json.loads(line)
+                except ValueError:
+                    # A record cut short by a writer killed mid-write.
+                    continue
+                records += 1
+                name = data.get("name")
+                if name is None:
+                    dir_mtime = data.get("dir_mtime", dir_mtime)
+                    continue
+                if data.get("deleted"):
+                    snippets.pop(name, None)
+                elif "user" in data:
+                    snippets[name] = Snippet.from_data(data)
+                elif name in snippets:
+                    snippets[name].used = data["used"]
+        return snippets, records, dir_mtime
+
+    def scan(self):
+        """
+        Snippets of the directory, with one stat per raw snippet and one read
+        per pointer
+        :return: dict of Snippet by name
+        """
+        snippets = {}
+        for name in os.listdir(self.root):
+            parsed = parse_snippet_name(name)
+            if parsed is None:
+                continue
+            try:
+                if name.endswith(POINTER_EXT):
+                    snippets[name] = self.read_pointer(name)
+                    continue
+                file_stat = os.stat(self.snippet_path(name))
+            except (OSError, ValueError, KeyError):
+                continue
+            user, category, version = parsed
+            snippets[name] = Snippet(user, category, name, file_stat.st_mtime, file_stat.st_size,
+                                     version=version)
+        return snippets
+
+    def rebuild(self, known=None):
+        """
+        Scan the directory and rewrite the index with one record per
+        snippet. Node counts and pastes of the known records are kept.
+        :param known: dict of Snippet by name from the previous index
+        :return: dict of Snippet by name
+        """
+        self.clean_staging()
+        snippets = self.scan()
+        for name, snippet in snippets.items():
+            previous = (known or {}).get(name)
+            if previous is not None and previous.size == snippet.size:
+                snippet.nodes = previous.nodes
+                snippet.used = previous.used
+        self.write_index(snippets)
+        return snippets
+
+    def write_index(self, snippets):
+        """
+        Replace the index with one record per snippet, through a temporary
+        file so readers never see half of it.
+        """
+        temp_path = "{0}.{1}.tmp".format(self.index_path, os.getpid())
+        with open(temp_path, "w") as index_file:
+            index_file.write(json.dumps({"index_version": INDEX_VERSION}) + "\n")
+            for name in sorted(snippets):
+                index_file.write(json.dumps(snippets[name].to_data(), sort_keys=True) + "\n")
+        replace_file(temp_path, self.index_path)
+        # The rename changed the directory, recorded by an append, which
+        # does not change it.
+        self.append_records([], changed=True)
+
+    def load(self):
+        """
+        Snippets of the index, or of a scan of the directory when the index
+        is stale
+        :return: dict of Snippet by name
+        """
+        snippets = {}
+        records = 0
+        dir_mtime = None
+        if os.path.isfile(self.index_path):
+            snippets, records, dir_mtime = self.read_index()
+        if self.is_stale(dir_mtime):
+            snippets = self.rebuild(snippets)
+        elif records > len(snippets) + COMPACT_SLACK:
+            self.write_index(snippets)
+        return snippets
+
+    def list_snippets(self, category=None):
+        """
+        Snippets sorted from newest to oldest, every version included
+        :param category: only the snippets of this node category
+        :return: list of Snippet
+        """
+        result = [snippet for snippet in self.load().values()
+                  if category is None or snippet.category == category]
+        result.sort(key=lambda snippet: snippet.mtime, reverse=True)
+        return result
+
+    def list_history(self, category=None):
+        """
+        Versions of every user and category, newest first, the users and
+        categories with the newest snippet first
+        :param category: only the snippets of this node category
+        :return: list of list of Snippet
+        """
+        history = {}
+        for snippet in self.list_snippets(category):
+            history.setdefault(snippet.key, []).append(snippet)
+        return sorted(history.values(), key=lambda versions: versions[0].mtime, reverse=True)
+
+
+class Publisher(object):
+    """
+    Publish snippets in batches. A snippet is staged right away, so it holds
+    the nodes selected at the time, and committed after a short window.
+    Copies of the same snippet within the window coalesce: only the last
+    one is renamed into place and the others are dropped. Pending snippets
+    are committed at exit.
+
+    A snippet failing to commit stays pending until the next flush. An
+    error of a commit on the timer is logged, then raised by the next
+    publish or flush, so it is never lost in the timer thread.
+    """
+    def __init__(self, store, window=COALESCE_WINDOW):
+        self.store = store
+        self.window = window
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.timer = None
+        self.coalesced = 0
+        self.error = None
+        atexit.register(self.flush)
+
+    def publish(self, user, category, write_func, nodes=0):
+        """
+        Stage a snippet and schedule its commit
+        :return: the staged Snippet
+        """
+        staging_path, snippet = self.store.stage(user, category, write_func, nodes)
+        with self.lock:
+            previous = self.pending.get(snippet.key)
+            self.pending[snippet.key] = (staging_path, snippet)
+            if previous is not None:
+                self.coalesced += 1
+                os.remove(previous[0])
+            if self.timer is None:
+                self.timer = threading.Timer(self.window, self.flush_later)
+                self.timer.daemon = True
+                self.timer.start()
+            # This snippet is pending all the same.
+            self.raise_error()
+        return snippet
+
+    def flush(self):
+        """
+        Commit the pending snippets now, e.g. before listing them
+        :return: list of the committed Snippet
+        """
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            staged = list(self.pending.values())
+            if staged:
+                try:
+                    self.store.commit(staged)
+                except Exception:
+                    # Keep the snippets still staged for the next flush.
+                    self.pending = dict((key, pending) for key, pending in self.pending.items()
+                                        if os.path.exists(pending[0]))
+                    self.error = None
+                    raise
+            self.pending = {}
+            self.raise_error()
+        return [snippet for _, snippet in staged]
+
+    def flush_later(self):
+        """
+        Flush from the timer, keeping the error for the next call
+        """
+        try:
+            self.flush()
+        except Exception as error:
+            LOGGER.exception("Share copy failed to publish, retried on the next copy or paste.")
+            with self.lock:
+                self.error = error
+
+    def raise_error(self):
+        error, self.error = self.error, None
+        if error is not None:
+            raise error
+
@@ -0,0 +1,120 @@
+"""Scan cache: a folder listing is reused only while the folder keeps its
+mtime and inode.
+"""
+# Built-in
+import os
+import sys
+import time
+
+import pytest
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, REPO_ROOT)
+
+from renumber_images_tool.core import scanner
+from renumber_images_tool.core.cache import MIN_AGE, ScanCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    scan_cache = ScanCache(str(tmp_path / 'cache.sqlite'))
+    yield scan_cache
+    scan_cache.close()
+
+
+@pytest.fixture
+def listings(monkeypatch):
+    """
+    Returns:
+        list: folder paths listed, the others came from the cache
+    """
+    listed = []
+    list_folder = scanner.list_folder
+
+    def counting_list_folder(folder_path, *args, **kwargs):
+        listed.append(folder_path)
+        return list_folder(folder_path, *args, **kwargs)
+    monkeypatch.setattr(scanner, 'list_folder', counting_list_folder)
+    return listed
+
+
+def make_folder(folder_path, frames, age=60.0):
+    os.mkdir(folder_path)
+    for frame in frames:
+        with open(os.path.join(folder_path, 'shot.{}.exr'.format(frame)), 'w') as frame_file:
+            frame_file.write(str(frame))
+    set_age(folder_path, age)
+
+
+def set_age(folder_path, age):
+    mtime = time.time() - age
+    os.utime(folder_path, (mtime, mtime))
+
+
+def scan(folder_path, cache):
+    return [(sequence.pattern, sorted(sequence)) for sequence in scanner.scan_sequences(folder_path, cache=cache)]
+
+
+def test_unchanged_folder_is_not_listed_again(tmp_path, cache, listings):
+    folder_path = str(tmp_path / 'shot')
+    make_folder(folder_path, [1, 2, 3])
+
+    first = scan(folder_path, cache)
+    second = scan(folder_path, cache)
+
+    assert first == second == [(os.path.join(folder_path, 'shot.*.exr'), ['1', '2', '3'])]
+    assert listings == [folder_path]
+
+
+def test_new_mtime_is_a_miss(tmp_path, cache, listings):
+    folder_path = str(tmp_path / 'shot')
+    make_folder(folder_path, [1, 2, 3])
+    scan(folder_path, cache)
+
+    os.remove(os.path.join(folder_path, 'shot.3.exr'))
+    set_age(folder_path, 30.0)
+
+    assert scan(folder_path, cache) == [(os.path.join(folder_path, 'shot.*.exr'), ['1', '2'])]
+    assert len(listings) == 2
+
+
+def test_replaced_folder_with_the_same_mtime_is_a_miss(tmp_path, cache, listings):
+    folder_path = str(tmp_path / 'shot')
+    make_folder(folder_path, [1, 2, 3])
+    scan(folder_path, cache)
+    mtime_ns = os.stat(folder_path).st_mtime_ns
+
+    # Another folder moved in place, e.g. restored from a backup.
+    other_path = str(tmp_path / 'other')
+    make_folder(other_path, [7])
+    os.rename(folder_path, str(tmp_path / 'old'))
+    os.rename(other_path, folder_path)
+    os.utime(folder_path, ns=(mtime_ns, mtime_ns))
+
+    assert scan(folder_path, cache) == [(os.path.join(folder_path, 'shot.*.exr'), ['7'])]
+    assert len(listings) == 2
+
+
+def test_recently_modified_folder_is_not_cached(tmp_path, cache, listings):
+    folder_path = str(tmp_path / 'shot')
+    make_folder(folder_path, [1, 2], age=MIN_AGE / 2)
+
+    scan(folder_path, cache)
+    scan(folder_path, cache)
+
+    assert listings == [folder_path, folder_path]
+
+
+def test_least_recently_used_folder_is_evicted(tmp_path, cache, listings):
+    folder_paths = [str(tmp_path / name) for name in ('a', 'b')]
+    for folder_path in folder_paths:
+        make_folder(folder_path, [1, 2])
+    scan(folder_paths[0], cache)
+    # Room for one listing only.
+    cache.max_size = cache.connection.execute('SELECT size FROM folders').fetchone()[0]
+
+    scan(folder_paths[1], cache)
+    scan(folder_paths[1], cache)
+    scan(folder_paths[0], cache)
+
+    assert listings == folder_paths + folder_paths[:1]
@@ -0,0 +1,142 @@
+"""Rename executor: ordered plans never overwrite a file outside the plan.
+"""
+# Built-in
+import os
+import sys
+
+import pytest
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, REPO_ROOT)
+
+from renumber_images_tool.core.executor import (delayed_rename, execute_plans, execute_renames, order_renames,
+                                                 report_progress)
+from renumber_images_tool.core.planner import plan_sequences
+from renumber_images_tool.core.scanner import scan_sequences
+
+
+def write_frames(folder_path, names):
+    for name in names:
+        with open(os.path.join(folder_path, name), 'w') as frame_file:
+            frame_file.write(name)
+
+
+@pytest.mark.parametrize('jobs', [1, 4])
+def test_ordered_plan_checks_freed_targets(tmp_path, jobs):
+    folder_path = str(tmp_path)
+    write_frames(folder_path, ['shot.{}.exr'.format(frame) for frame in (11, 12, 13)])
+    plans = plan_sequences(scan_sequences(folder_path))
+    assert all(plan.ordered_renames() is not None for plan in plans)
+
+    # Written after the scan, at a name the plan renames a frame to.
+    write_frames(folder_path, ['shot.02.exr'])
+
+    with pytest.raises(OSError):
+        execute_plans(plans, jobs=jobs)
+    assert sorted(os.listdir(folder_path)) == ['shot.02.exr', 'shot.11.exr', 'shot.12.exr', 'shot.13.exr']
+
+
+def test_ordered_plan_renames_over_its_own_sources(tmp_path):
+    folder_path = str(tmp_path)
+    write_frames(folder_path, ['shot.{:02d}.exr'.format(frame) for frame in (2, 3, 5)])
+    plans = plan_sequences(scan_sequences(folder_path))
+
+    result = execute_plans(plans)
+
+    assert sorted(os.listdir(folder_path)) == ['shot.01.exr', 'shot.02.exr', 'shot.03.exr']
+    # Only shot.01.exr is not a source of the plan.
+    assert result.stats == 1
+
+
+def read_folder(folder_path):
+    """
+    Returns:
+        dict: content by name of the files of a folder
+    """
+    contents = {}
+    for name in os.listdir(folder_path):
+        with open(os.path.join(folder_path, name)) as frame_file:
+            contents[name] = frame_file.read()
+    return contents
+
+
+@pytest.mark.parametrize('jobs', [1, 4])
+def test_cycles_take_one_temporary_name_each(tmp_path, jobs):
+    folder_path = str(tmp_path)
+    names = ['a', 'b', 'c', 'd', 'e', 'f']
+    write_frames(folder_path, names)
+    paths = [os.path.join(folder_path, name) for name in names]
+    # a -> b -> c -> a and d <-> e, f is left alone.
+    renames = [(paths[0], paths[1]), (paths[1], paths[2]), (paths[2], paths[0]),
+               (paths[3], paths[4]), (paths[4], paths[3])]
+
+    result = execute_renames(renames, jobs=jobs)
+
+    assert read_folder(folder_path) == {'a': 'c', 'b': 'a', 'c': 'b', 'd': 'e', 'e': 'd', 'f': 'f'}
+    assert (result.frames, result.renames, result.temp_renames) == (5, 7, 2)
+
+
+def test_chains_run_from_their_free_end(tmp_path):
+    folder_path = str(tmp_path)
+    write_frames(folder_path, ['a', 'b', 'c'])
+    paths = [os.path.join(folder_path, name) for name in ('a', 'b', 'c', 'd')]
+    renames = [(paths[0], paths[1]), (paths[1], paths[2]), (paths[2], paths[3])]
+
+    chains, targets = order_renames(renames)
+
+    assert chains == [renames[::-1]]
+    assert targets == [paths[3]]
+    result = execute_renames(renames)
+    assert read_folder(folder_path) == {'b': 'a', 'c': 'b', 'd': 'c'}
+    assert result.temp_renames == 0
+
+
+def test_reversed_sequence_is_renamed_in_place(tmp_path):
+    folder_path = str(tmp_path)
+    write_frames(folder_path, ['shot.{:02d}.exr'.format(frame) for frame in range(1, 6)])
+    paths = [os.path.join(folder_path, 'shot.{:02d}.exr'.format(frame)) for frame in range(1, 6)]
+
+    # Plans leave out identity renames, as the middle frame here.
+    result = execute_renames([(old, new) for old, new in zip(paths, paths[::-1]) if old != new])
+
+    assert read_folder(folder_path) == {'shot.{:02d}.exr'.format(frame): 'shot.{:02d}.exr'.format(6 - frame)
+                                        for frame in range(1, 6)}
+    # 1 <-> 5 and 2 <-> 4.
+    assert result.temp_renames == 2
+
+
+@pytest.mark.parametrize('renames', [
+    [('a', 'b'), ('a', 'c')],
+    [('a', 'c'), ('b', 'c')],
+])
+def test_ambiguous_renames_are_refused(renames):
+    with pytest.raises(ValueError):
+        order_renames(renames)
+
+
+def test_jobs_overlap_the_latency_of_independent_renames(tmp_path):
+    folder_path = str(tmp_path)
+    tokens = [str(frame) for frame in range(101, 141)]
+    write_frames(folder_path, ['shot.{}.exr'.format(token) for token in tokens])
+    progress = []
+
+    # 40 renames of 20ms each: 0.8s one after the other.
+    rename = delayed_rename(0.02)
+    result = execute_plans(plan_sequences(scan_sequences(folder_path)), rename_func=rename, jobs=8,
+                           progress=lambda done, total: progress.append((done, total)))
+
+    assert sorted(os.listdir(folder_path)) == ['shot.{:02d}.exr'.format(frame) for frame in range(1, 41)]
+    assert result.renames == 40
+    assert result.elapsed < 0.4
+    assert result.rate > 100
+
+
+def test_report_progress_counts_every_rename():
+    progress = []
+    rename = report_progress(lambda old, new: None, lambda done, total: progress.append((done, total)),
+                             total=5, step=2)
+
+    for index in range(5):
+        rename(index, index + 1)
+
+    assert progress == [(2, 5), (4, 5)]
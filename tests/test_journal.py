@@ -0,0 +1,116 @@
+"""Rename journal: an interrupted re-numbering can be resumed or undone,
+replaying only the renames which actually completed.
+"""
+# Built-in
+import json
+import os
+import sys
+
+import pytest
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, REPO_ROOT)
+
+from renumber_images_tool.core.executor import execute_renames
+from renumber_images_tool.core.journal import Journal, resume_journal, undo_journal
+
+
+class Interrupted(Exception):
+    pass
+
+
+def write_frames(folder_path, names):
+    for name in names:
+        with open(os.path.join(folder_path, name), 'w') as frame_file:
+            frame_file.write(name)
+
+
+def read_folder(folder_path):
+    contents = {}
+    for name in os.listdir(folder_path):
+        if name.endswith('.ndjson'):
+            continue
+        with open(os.path.join(folder_path, name)) as frame_file:
+            contents[name] = frame_file.read()
+    return contents
+
+
+def interrupted_rename(count):
+    """
+    Returns:
+        callable: os.rename stand-in interrupted after count renames
+    """
+    done = []
+
+    def rename(old, new):
+        if len(done) >= count:
+            raise Interrupted()
+        os.rename(old, new)
+        done.append(old)
+    return rename
+
+
+@pytest.fixture
+def renamed(tmp_path):
+    """
+    Returns:
+        tuple: folder path, renames of a chain and of a cycle, journal path
+    """
+    folder_path = str(tmp_path)
+    write_frames(folder_path, ['a', 'b', 'c', 'x', 'y'])
+    paths = dict((name, os.path.join(folder_path, name)) for name in 'abcdxy')
+    # c -> d, b -> c, a -> b is a chain, x <-> y a cycle broken by a temporary name.
+    renames = [(paths['a'], paths['b']), (paths['b'], paths['c']), (paths['c'], paths['d']),
+               (paths['x'], paths['y']), (paths['y'], paths['x'])]
+    return folder_path, renames, str(tmp_path / 'journal.ndjson')
+
+
+RENAMED = {'b': 'a', 'c': 'b', 'd': 'c', 'x': 'y', 'y': 'x'}
+ORIGINAL = {'a': 'a', 'b': 'b', 'c': 'c', 'x': 'x', 'y': 'y'}
+
+
+@pytest.mark.parametrize('count', [0, 2, 4, 5])
+def test_resume_an_interrupted_run(renamed, count):
+    folder_path, renames, journal_path = renamed
+
+    with pytest.raises(Interrupted):
+        execute_renames(renames, rename_func=interrupted_rename(count), journal=Journal(journal_path))
+    result = resume_journal(journal_path)
+
+    assert read_folder(folder_path) == RENAMED
+    assert result.renames == 6 - count
+
+
+@pytest.mark.parametrize('count', [2, 4, 6])
+def test_undo_renames_back_what_completed(renamed, count):
+    folder_path, renames, journal_path = renamed
+
+    try:
+        execute_renames(renames, rename_func=interrupted_rename(count), journal=Journal(journal_path))
+    except Interrupted:
+        pass
+    result = undo_journal(journal_path)
+
+    assert read_folder(folder_path) == ORIGINAL
+    assert result.renames == count
+    with pytest.raises(OSError):
+        undo_journal(journal_path)
+    with pytest.raises(OSError):
+        resume_journal(journal_path)
+
+
+def test_resume_without_the_done_records(renamed):
+    folder_path, renames, journal_path = renamed
+    with pytest.raises(Interrupted):
+        execute_renames(renames, rename_func=interrupted_rename(4), journal=Journal(journal_path))
+
+    # A crash before the done records were synced: the inodes on disk tell
+    # which steps completed.
+    with open(journal_path) as journal_file:
+        records = [line for line in journal_file if 'done' not in json.loads(line)]
+    with open(journal_path, 'w') as journal_file:
+        journal_file.writelines(records)
+    result = resume_journal(journal_path)
+
+    assert read_folder(folder_path) == RENAMED
+    assert result.renames == 2
@@ -0,0 +1,110 @@
+"""Linking re-numbered frames into an output folder.
+"""
+# Built-in
+import os
+import sys
+
+import pytest
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, REPO_ROOT)
+
+from renumber_images_tool.core import linker
+
+
+def write_frames(folder_path, sizes):
+    """
+    Returns:
+        list: (source path, output path) of frames named after their size
+    """
+    pairs = []
+    for index, size in enumerate(sizes):
+        path = os.path.join(folder_path, 'shot.{}.exr'.format(1001 + index))
+        with open(path, 'wb') as frame_file:
+            frame_file.write(os.urandom(size))
+        pairs.append((path, os.path.join(folder_path, 'out', 'shot.{:04d}.exr'.format(index + 1))))
+    return pairs
+
+
+def read_file(path):
+    with open(path, 'rb') as frame_file:
+        return frame_file.read()
+
+
+@pytest.mark.parametrize('mode', [linker.AUTO, linker.COPY])
+def test_link_again_into_the_same_folder(tmp_path, mode):
+    pairs = write_frames(str(tmp_path), [10, 2000, 0])
+
+    first = linker.Linker(mode).link(pairs)
+    second = linker.Linker(mode).link(pairs)
+
+    assert first.frames == second.frames == 3
+    assert second.methods == {linker.SKIPPED: 3}
+    for source, target in pairs:
+        assert read_file(target) == read_file(source)
+    assert sorted(os.listdir(str(tmp_path / 'out'))) == ['shot.0001.exr', 'shot.0002.exr', 'shot.0003.exr']
+
+
+def test_link_replaces_a_different_target(tmp_path):
+    pairs = write_frames(str(tmp_path), [100])
+    os.mkdir(str(tmp_path / 'out'))
+    with open(pairs[0][1], 'wb') as frame_file:
+        frame_file.write(b'older frame')
+
+    result = linker.Linker(linker.COPY).link(pairs)
+
+    assert linker.SKIPPED not in result.methods
+    assert read_file(pairs[0][1]) == read_file(pairs[0][0])
+
+
+def test_short_copy_range_is_completed(tmp_path, monkeypatch):
+    if not hasattr(os, 'copy_file_range'):
+        pytest.skip('No copy_file_range on this platform')
+    copy_file_range = os.copy_file_range
+
+    def short_copy_file_range(source_fd, target_fd, count, offset_src, offset_dst):
+        # Stops after the first kilobyte, as some filesystems do.
+        if offset_src >= 1024:
+            return 0
+        return copy_file_range(source_fd, target_fd, min(count, 1024), offset_src, offset_dst)
+    monkeypatch.setattr(os, 'copy_file_range', short_copy_file_range)
+    source = write_frames(str(tmp_path), [5000])[0][0]
+    target = str(tmp_path / 'copy.exr')
+
+    assert linker.copy_range(source, target) == 5000
+    assert read_file(target) == read_file(source)
+
+
+def test_failed_copy_leaves_no_partial_frame(tmp_path, monkeypatch):
+    pairs = write_frames(str(tmp_path), [3000, 3000])
+    copy_chunk = linker.copy_chunk
+
+    def failing_copy_chunk(source, target, offset, size):
+        if source == pairs[1][0]:
+            raise OSError(5, 'Input/output error')
+        copy_chunk(source, target, offset, size)
+    monkeypatch.setattr(linker, 'copy_chunk', failing_copy_chunk)
+    # Left to the chunked copy.
+    monkeypatch.delattr(os, 'copy_file_range', raising=False)
+
+    with pytest.raises(OSError):
+        linker.Linker(linker.COPY).link(pairs)
+    assert os.listdir(str(tmp_path / 'out')) == []
+
+
+def test_stale_temporary_frames_are_swept(tmp_path, monkeypatch):
+    pairs = write_frames(str(tmp_path), [100])
+    out_path = str(tmp_path / 'out')
+    os.mkdir(out_path)
+    names = ['.shot.0001.exr.1.tmp', '.shot.0002.exr.{}.tmp'.format(os.getpid()), 'notes.1.tmp']
+    for name in names:
+        with open(os.path.join(out_path, name), 'wb') as temp_file:
+            temp_file.write(b'partial')
+
+    # Temporary files of other runs are kept while they may still be written.
+    linker.Linker(linker.COPY).link(pairs)
+    assert sorted(os.listdir(out_path)) == sorted(names + ['shot.0001.exr'])
+
+    monkeypatch.setattr(linker, 'STALE_TEMP_AGE', 0)
+    linker.Linker(linker.COPY).link(pairs)
+    assert sorted(os.listdir(out_path)) == sorted(names[1:] + ['shot.0001.exr'])
@@ -0,0 +1,53 @@
+"""Manifests of re-numbered sequences: hashes are only reused for frames
+which are still the same file.
+"""
+# Built-in
+import os
+import shutil
+import sys
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, REPO_ROOT)
+
+from renumber_images_tool.core.executor import execute_plans
+from renumber_images_tool.core.manifest import BLAKE2B, check_manifests, write_manifests
+from renumber_images_tool.core.planner import plan_sequences
+from renumber_images_tool.core.scanner import scan_sequences
+
+
+def renumber(folder_path, frames):
+    for frame in frames:
+        with open(os.path.join(folder_path, 'shot.{}.exr'.format(frame)), 'w') as frame_file:
+            frame_file.write('frame {}'.format(frame))
+    plans = plan_sequences(scan_sequences(folder_path))
+    execute_plans(plans)
+    return plans
+
+
+def test_unchanged_frames_are_not_hashed_again(tmp_path):
+    folder_path = str(tmp_path)
+    plans = renumber(folder_path, [1001, 1002, 1003])
+    write_manifests(plans, algorithm=BLAKE2B)
+
+    result = write_manifests(plans, algorithm=BLAKE2B)
+
+    assert (result.frames, result.reused, result.hashed_bytes) == (3, 3, 0)
+
+
+def test_replaced_frame_with_the_same_size_and_mtime_is_hashed_again(tmp_path):
+    folder_path = str(tmp_path)
+    plans = renumber(folder_path, [1001, 1002, 1003])
+    write_manifests(plans, algorithm=BLAKE2B)
+
+    # Same size and mtime, other content, as cp -p of another render.
+    path = os.path.join(folder_path, 'shot.02.exr')
+    replacement = os.path.join(folder_path, 'replacement')
+    with open(replacement, 'w') as frame_file:
+        frame_file.write('frame 9999')
+    shutil.copystat(path, replacement)
+    os.rename(replacement, path)
+
+    result = write_manifests(plans, algorithm=BLAKE2B)
+
+    assert (result.frames, result.reused) == (3, 2)
+    assert check_manifests(folder_path)[1] == {}
@@ -0,0 +1,75 @@
+"""Multi-folder mode of the command line: folders from arguments, @listfile
+and stdin are re-numbered concurrently into one summary, and a bad folder
+does not stop the others.
+"""
+# Built-in
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, REPO_ROOT)
+
+COMMAND = os.path.join(REPO_ROOT, 'renumber_images_tool', 'bin', 'renumber_tool_cmd')
+
+
+def make_folders(root_path, count, frames=(11, 12, 13)):
+    folder_paths = []
+    for index in range(count):
+        folder_path = os.path.join(root_path, 'shot{:03d}'.format(index))
+        os.mkdir(folder_path)
+        for frame in frames:
+            with open(os.path.join(folder_path, 'img.{}.exr'.format(frame)), 'w') as frame_file:
+                frame_file.write(str(frame))
+        folder_paths.append(folder_path)
+    return folder_paths
+
+
+def run_command(tmp_path, args, stdin=''):
+    # Journals go under the cache folder.
+    env = dict(os.environ, XDG_CACHE_HOME=str(tmp_path / 'cache'))
+    process = subprocess.run([sys.executable, COMMAND, '--summary-format', 'json', '--no-cache'] + args,
+                             input=stdin, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                             universal_newlines=True)
+    summary = json.loads(process.stdout[process.stdout.index('{\n'):])
+    return process.returncode, summary
+
+
+@pytest.mark.parametrize('source', ['args', 'listfile', 'stdin'])
+def test_folders_are_renamed_into_one_summary(tmp_path, source):
+    folder_paths = make_folders(str(tmp_path), 6)
+    stdin = ''
+    if source == 'args':
+        args = folder_paths
+    elif source == 'listfile':
+        list_path = str(tmp_path / 'folders.txt')
+        with open(list_path, 'w') as list_file:
+            list_file.write('\n'.join(folder_paths) + '\n')
+        args = ['@' + list_path]
+    else:
+        args = ['-']
+        stdin = '\n'.join(folder_paths) + '\n'
+
+    returncode, summary = run_command(tmp_path, ['--folder-jobs', '3'] + args, stdin)
+
+    assert returncode == 0
+    assert (summary['folders'], summary['sequences'], summary['frames'], summary['renames']) == (6, 6, 18, 18)
+    assert summary['failures'] == []
+    for folder_path in folder_paths:
+        assert sorted(os.listdir(folder_path)) == ['img.01.exr', 'img.02.exr', 'img.03.exr']
+
+
+def test_bad_folder_does_not_stop_the_others(tmp_path):
+    folder_paths = make_folders(str(tmp_path), 2)
+    missing_path = str(tmp_path / 'missing')
+
+    returncode, summary = run_command(tmp_path, [folder_paths[0], missing_path, folder_paths[1]])
+
+    assert returncode == 1
+    assert (summary['folders'], summary['frames']) == (3, 6)
+    assert [path for path, _ in summary['failures']] == [missing_path]
+    for folder_path in folder_paths:
+        assert sorted(os.listdir(folder_path)) == ['img.01.exr', 'img.02.exr', 'img.03.exr']
@@ -0,0 +1,85 @@
+"""Plan files: a plan written without renaming is applied later, as is,
+once its sources are checked.
+"""
+# Built-in
+import os
+import sys
+
+import pytest
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, REPO_ROOT)
+
+from renumber_images_tool.core.planfile import PlanWriter, apply_plan, read_plan
+from renumber_images_tool.core.planner import plan_sequences
+from renumber_images_tool.core.scanner import scan_sequences
+
+
+@pytest.fixture
+def plan_path(tmp_path):
+    """
+    Returns:
+        str: plan file of a folder with shot.11-13.exr, written without renaming
+    """
+    folder_path = tmp_path / 'shot'
+    folder_path.mkdir()
+    for frame in (11, 12, 13):
+        with open(str(folder_path / 'shot.{}.exr'.format(frame)), 'w') as frame_file:
+            frame_file.write(str(frame))
+
+    path = str(tmp_path / 'plan.ndjson')
+    with PlanWriter(path) as writer:
+        writer.write_plans(plan_sequences(scan_sequences(str(folder_path))))
+    return path
+
+
+def read_folder(folder_path):
+    contents = {}
+    for name in os.listdir(folder_path):
+        with open(os.path.join(folder_path, name)) as frame_file:
+            contents[name] = frame_file.read()
+    return contents
+
+
+def test_plan_round_trip(tmp_path, plan_path):
+    folder_path = str(tmp_path / 'shot')
+
+    renames = read_plan(plan_path)
+
+    assert [(os.path.basename(old), os.path.basename(new)) for old, new, _, _ in renames] == [
+        ('shot.11.exr', 'shot.01.exr'), ('shot.12.exr', 'shot.02.exr'), ('shot.13.exr', 'shot.03.exr')]
+    assert all(os.path.isabs(old) and os.path.isabs(new) for old, new, _, _ in renames)
+    # Nothing is renamed until the plan is applied.
+    assert sorted(os.listdir(folder_path)) == ['shot.11.exr', 'shot.12.exr', 'shot.13.exr']
+
+
+def test_apply_plan(tmp_path, plan_path):
+    result = apply_plan(plan_path)
+
+    assert read_folder(str(tmp_path / 'shot')) == {'shot.01.exr': '11', 'shot.02.exr': '12', 'shot.03.exr': '13'}
+    assert result.renames == 3
+    # One stat per source, then one per target.
+    assert result.stats == 6
+
+
+def test_modified_source_stops_the_plan(tmp_path, plan_path):
+    folder_path = str(tmp_path / 'shot')
+    with open(os.path.join(folder_path, 'shot.12.exr'), 'w') as frame_file:
+        frame_file.write('re-rendered')
+    os.remove(os.path.join(folder_path, 'shot.13.exr'))
+
+    with pytest.raises(OSError) as error:
+        apply_plan(plan_path)
+
+    assert 'shot.12.exr was modified' in str(error.value)
+    assert 'shot.13.exr is missing' in str(error.value)
+    assert sorted(os.listdir(folder_path)) == ['shot.11.exr', 'shot.12.exr']
+
+
+def test_other_files_are_not_plans(tmp_path):
+    path = str(tmp_path / 'notes.ndjson')
+    with open(path, 'w') as notes_file:
+        notes_file.write('{"version": 2}\n')
+
+    with pytest.raises(ValueError):
+        read_plan(path)
@@ -0,0 +1,82 @@
+"""Rename planner: frames are re-numbered in integer order, without any
+filesystem call.
+"""
+# Built-in
+import os
+import sys
+
+import pytest
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, REPO_ROOT)
+
+from renumber_images_tool.core.planner import ASCENDING, DESCENDING, RenamePlan
+from renumber_images_tool.core.sequence import Sequence
+
+
+def make_sequence(tokens):
+    sequence = Sequence('/shots', 'test', '', '.exr')
+    for token in tokens:
+        sequence.add(token)
+    return sequence
+
+
+def names(renames):
+    return [(os.path.basename(old), os.path.basename(new)) for old, new in renames]
+
+
+def test_frames_are_sorted_by_value():
+    plan = RenamePlan(make_sequence(['2340', '11', '500']))
+
+    assert names(plan.renames) == [('test11.exr', 'test01.exr'),
+                                   ('test500.exr', 'test02.exr'),
+                                   ('test2340.exr', 'test03.exr')]
+    assert plan.preview == '/shots/test[01-03].exr'
+    assert plan.source == '/shots/test[11-2340].exr'
+
+
+def test_mixed_paddings_keep_their_own_token():
+    plan = RenamePlan(make_sequence(['0010', '5', '07']))
+
+    assert names(plan.renames) == [('test5.exr', 'test01.exr'),
+                                   ('test07.exr', 'test02.exr'),
+                                   ('test0010.exr', 'test03.exr')]
+
+
+def test_identity_renames_are_left_out():
+    plan = RenamePlan(make_sequence(['01', '02', '05']))
+
+    assert names(plan.renames) == [('test05.exr', 'test03.exr')]
+    assert plan.frame_count == 3
+    assert len(list(plan.mappings())) == 3
+
+
+@pytest.mark.parametrize('tokens, start, step, order', [
+    (['11', '12', '13'], 1, 1, ASCENDING),
+    (['1', '2', '3'], 10, 1, DESCENDING),
+    (['1', '5', '9'], 3, 1, None),
+    # Two files with the same frame value have no safe order.
+    (['1', '01', '5'], 1, 1, None),
+])
+def test_order(tokens, start, step, order):
+    plan = RenamePlan(make_sequence(tokens), start=start, step=step)
+
+    assert plan.order == order
+    if order is None:
+        assert plan.ordered_renames() is None
+
+
+def test_start_step_and_padding():
+    plan = RenamePlan(make_sequence(['1', '2', '3']), start=1001, step=2, padding=5)
+
+    assert names(plan.renames) == [('test1.exr', 'test01001.exr'),
+                                   ('test2.exr', 'test01003.exr'),
+                                   ('test3.exr', 'test01005.exr')]
+    assert names(plan.ordered_renames()) == names(plan.renames)[::-1]
+
+
+def test_bad_options():
+    with pytest.raises(ValueError):
+        RenamePlan(make_sequence(['1']), start=-1)
+    with pytest.raises(ValueError):
+        RenamePlan(make_sequence(['1']), step=0)
@@ -0,0 +1,68 @@
+"""Frame reports: ranges are printed in the syntax the GUI accepts back.
+"""
+# Built-in
+import os
+import re
+import sys
+
+import pytest
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, REPO_ROOT)
+
+from renumber_images_tool.core.report import FRAME_RANGE_SYNTAX, SequenceReport, format_ranges, iter_gaps, iter_ranges
+from renumber_images_tool.core.sequence import Sequence
+
+
+def expand_ranges(text):
+    """
+    Returns:
+        list: frames of ranges typed in the framerangevalidator syntax
+    """
+    frames = []
+    for part in text.split(',')[:-1]:
+        match = re.match(r'(\d+)(?:-(\d+)(?:x(\d+))?)?$', part)
+        start, end, step = match.groups()
+        frames.extend(range(int(start), int(end or start) + 1, int(step or 1)))
+    return frames
+
+
+@pytest.mark.parametrize('frames', [
+    [7],
+    [1, 2, 3, 4],
+    [1, 5],
+    [1, 2, 3, 5, 10, 20, 30, 40, 41],
+    [1001, 1003, 1005, 1007, 1010],
+])
+def test_format_ranges_round_trip(frames):
+    text = format_ranges(iter_ranges(frames))
+
+    assert re.match('(?:{})$'.format(FRAME_RANGE_SYNTAX), text)
+    assert expand_ranges(text) == frames
+
+
+def test_format_gaps_round_trip():
+    text = format_ranges(iter_gaps([1, 2, 5, 6, 10], 1))
+
+    assert text == '3-4,7-9,'
+    assert re.match('(?:{})$'.format(FRAME_RANGE_SYNTAX), text)
+
+
+@pytest.mark.parametrize('frames, step, missing', [
+    # A difference seen once is a gap, not the step.
+    ([1, 5], None, '2-4,'),
+    ([1, 3, 5, 7, 11], None, '9,'),
+    ([1001, 1002, 1004, 1005, 1006], None, '1003,'),
+    ([1, 3, 5, 6], None, ''),
+    ([1, 5], 4, ''),
+    ([1, 3, 5], 1, '2,4,'),
+])
+def test_report_missing_frames(frames, step, missing):
+    sequence = Sequence('/shots', 'shot.', '', '.exr')
+    for frame in frames:
+        sequence.add(str(frame))
+
+    report = SequenceReport(sequence, step=step)
+
+    assert format_ranges(report.gaps) == missing
+    assert report.is_complete == (not missing)
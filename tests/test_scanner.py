@@ -0,0 +1,118 @@
+"""Single-pass scanner: file names are split on their last run of digits and
+grouped into sequences.
+"""
+# Built-in
+import os
+import sys
+
+import pytest
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, REPO_ROOT)
+
+from renumber_images_tool.core import scanner
+from renumber_images_tool.core.scanner import scan_sequences, split_frame, walk_sequences
+
+
+def write_files(folder_path, names):
+    for name in names:
+        with open(os.path.join(folder_path, name), 'w') as image_file:
+            image_file.write(name)
+
+
+@pytest.mark.parametrize('filename, parts', [
+    ('test0011.exr', ('test', '0011', '', '.exr')),
+    # The version digits are part of the prefix, only the last run is the frame.
+    ('shot_v002.1001.exr', ('shot_v002.', '1001', '', '.exr')),
+    ('shot.1001_beauty.exr', ('shot.', '1001', '_beauty', '.exr')),
+    ('42.exr', ('', '42', '', '.exr')),
+    ('shot.1001.exr.bak', ('shot.', '1001', '.exr', '.bak')),
+    ('noframe.exr', None),
+    # The digits are taken for the extension.
+    ('shot.1001', None),
+])
+def test_split_frame(filename, parts):
+    assert split_frame(filename) == parts
+
+
+def test_scan_groups_files_in_one_pass(tmp_path):
+    folder_path = str(tmp_path)
+    write_files(folder_path, ['test2340.exr', 'test11.exr', 'test500.exr',
+                              'test0001.jpg', 'test2.jpg',
+                              'shot.1001_beauty.exr', 'shot.1002_beauty.exr',
+                              'notes.txt', '.test12.exr'])
+    os.mkdir(os.path.join(folder_path, 'test13.exr'))
+
+    sequences = scan_sequences(folder_path)
+
+    assert [(sequence.pattern, len(sequence)) for sequence in sequences] == [
+        (os.path.join(folder_path, 'shot.*_beauty.exr'), 2),
+        (os.path.join(folder_path, 'test*.exr'), 3),
+        (os.path.join(folder_path, 'test*.jpg'), 2),
+    ]
+    assert sorted(sequences[1].paths()) == sorted(os.path.join(folder_path, name)
+                                                  for name in ('test2340.exr', 'test11.exr', 'test500.exr'))
+
+
+def test_scan_keeps_the_padding_of_every_frame(tmp_path):
+    folder_path = str(tmp_path)
+    write_files(folder_path, ['shot.0001.exr', 'shot.0002.exr', 'mixed.5.exr', 'mixed.0010.exr'])
+
+    mixed, shot = scan_sequences(folder_path)
+
+    assert shot.padding == 4
+    assert mixed.padding is None
+    assert sorted(mixed) == ['0010', '5']
+
+
+def test_scan_filters_extensions(tmp_path):
+    folder_path = str(tmp_path)
+    write_files(folder_path, ['shot.1.exr', 'shot.1.txt'])
+
+    sequences = scan_sequences(folder_path, extensions=['.exr'])
+
+    assert [sequence.ext for sequence in sequences] == ['.exr']
+
+
+def test_scan_missing_folder(tmp_path):
+    with pytest.raises(OSError):
+        scan_sequences(str(tmp_path / 'missing'))
+
+
+def test_walk_lists_every_folder_once(tmp_path):
+    root_path = str(tmp_path)
+    for folder in ('shot010/comp', 'shot010/light', 'shot020', '.snapshot'):
+        os.makedirs(os.path.join(root_path, folder))
+        write_files(os.path.join(root_path, folder), ['img.1.exr', 'img.2.exr'])
+    os.symlink(os.path.join(root_path, 'shot020'), os.path.join(root_path, 'link'))
+
+    walked = {os.path.relpath(folder_path, root_path): [len(sequence) for sequence in sequences]
+              for folder_path, sequences, _, _ in walk_sequences(root_path, jobs=3)}
+
+    # Hidden and symlinked folders are not walked.
+    assert walked == {'.': [], 'shot010': [], 'shot010/comp': [2], 'shot010/light': [2], 'shot020': [2]}
+
+
+def test_walk_goes_on_after_a_folder_fails(tmp_path, monkeypatch):
+    root_path = str(tmp_path)
+    for folder in ('bad', 'good'):
+        os.makedirs(os.path.join(root_path, folder, 'sub'))
+        write_files(os.path.join(root_path, folder, 'sub'), ['img.1.exr'])
+    bad_path = os.path.join(root_path, 'bad')
+    list_folder = scanner.list_folder
+
+    def failing_list_folder(folder_path, *args, **kwargs):
+        if folder_path == bad_path:
+            raise OSError(13, 'Permission denied', folder_path)
+        return list_folder(folder_path, *args, **kwargs)
+    monkeypatch.setattr(scanner, 'list_folder', failing_list_folder)
+
+    errors = {}
+    sequences = {}
+    for folder_path, folder_sequences, _, error in walk_sequences(root_path):
+        errors[os.path.relpath(folder_path, root_path)] = error
+        sequences[os.path.relpath(folder_path, root_path)] = len(folder_sequences)
+
+    assert isinstance(errors.pop('bad'), OSError)
+    assert not any(errors.values())
+    assert sequences == {'.': 0, 'bad': 0, 'good': 0, 'good/sub': 1}
@@ -0,0 +1,245 @@
+"""Headless tests of share_copy and its snippet store.
+
+Houdini and Qt are replaced by fake modules in sys.modules, so the shelf
+tool functions run against a temporary SHARE_DIR.
+"""
+# Built-in
+import importlib
+import json
+import os
+import sys
+import time
+import types
+
+import pytest
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, REPO_ROOT)
+
+from share_copy import store
+
+
+# =============================================================================
+# FAKES
+# =============================================================================
+class FakeQtMeta(type):
+    """
+    Qt classes of the fake modules: any enum value is 0.
+    """
+    def __getattr__(cls, name):
+        return 0
+
+
+class FakeQtModule(types.ModuleType):
+    """
+    A Qt module where every name is a class doing nothing.
+    """
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        value = FakeQtMeta(name, (object,), {'__init__': lambda self, *args, **kwargs: None})
+        setattr(self, name, value)
+        return value
+
+
+class FakeCategory(object):
+    def __init__(self, name):
+        self._name = name
+
+    def name(self):
+        return self._name
+
+
+class FakeNodeType(object):
+    def __init__(self, category):
+        self._category = category
+
+    def category(self):
+        return FakeCategory(self._category)
+
+
+class FakeItem(object):
+    def __init__(self, name, item_type, parent=None):
+        self.name = name
+        self.item_type = item_type
+        self.parent_node = parent
+
+    def networkItemType(self):
+        return self.item_type
+
+    def parent(self):
+        return self.parent_node
+
+
+class FakeNode(FakeItem):
+    def __init__(self, name, category, parent=None):
+        super(FakeNode, self).__init__(name, 'node', parent)
+        self.category = category
+
+    def type(self):
+        return FakeNodeType(self.category)
+
+    def childTypeCategory(self):
+        return FakeCategory(self.category)
+
+    def saveItemsToFile(self, items, file_name, save_hda_fallbacks=False):
+        with open(file_name, 'wb') as snippet_file:
+            snippet_file.write('\n'.join(item.name for item in items).encode('ascii'))
+
+
+def make_fake_hou():
+    hou = types.ModuleType('hou')
+    hou.networkItemType = types.SimpleNamespace(Node='node', NetworkBox='netbox')
+    hou.selected = []
+    hou.messages = []
+    hou.selectedItems = lambda include_hidden=False: list(hou.selected)
+    hou.isUIAvailable = lambda: False
+    hou.ui = types.SimpleNamespace(displayMessage=hou.messages.append)
+    return hou
+
+
+# =============================================================================
+# FIXTURES
+# =============================================================================
+@pytest.fixture
+def hou(monkeypatch):
+    fake_hou = make_fake_hou()
+    monkeypatch.setitem(sys.modules, 'hou', fake_hou)
+    qt = types.ModuleType('PySide2')
+    for name in ('QtCore', 'QtGui', 'QtWidgets'):
+        module = FakeQtModule('PySide2.' + name)
+        setattr(qt, name, module)
+        monkeypatch.setitem(sys.modules, 'PySide2.' + name, module)
+    monkeypatch.setitem(sys.modules, 'PySide2', qt)
+    return fake_hou
+
+
+@pytest.fixture
+def share_dir(tmp_path):
+    path = tmp_path / 'share'
+    path.mkdir()
+    return str(path)
+
+
+@pytest.fixture
+def share_copy(hou, share_dir, monkeypatch):
+    sys.modules.pop('share_copy.share_copy', None)
+    module = importlib.import_module('share_copy.share_copy')
+    monkeypatch.setattr(module, 'SHARE_DIR', share_dir)
+    monkeypatch.setenv('USER', 'amychu')
+    yield module
+    sys.modules.pop('share_copy.share_copy', None)
+
+
+def copy_nodes(share_copy, hou, category, names):
+    parent = FakeNode('/obj/geo1', 'Object')
+    hou.selected = [FakeNode(name, category, parent) for name in names]
+    hou.selected.append(FakeItem('netbox1', hou.networkItemType.NetworkBox, parent))
+    share_copy.share_copy()
+    store.get_publisher(share_copy.SHARE_DIR).flush()
+    # Versions are publish times in milliseconds.
+    time.sleep(0.002)
+
+
+def get_paste_widget(share_copy, category):
+    widget = share_copy.SharePasteWidget.__new__(share_copy.SharePasteWidget)
+    widget.destination = FakeNode('/obj/geo1', category)
+    widget.remap = {}
+    return widget
+
+
+def read_snippet(snippet_store, name):
+    path, temporary = snippet_store.extract(name)
+    with open(path, 'rb') as snippet_file:
+        data = snippet_file.read()
+    if temporary:
+        os.remove(path)
+    return data
+
+
+def read_index_lines(snippet_store):
+    with open(snippet_store.index_path) as index_file:
+        return index_file.readlines()
+
+
+# =============================================================================
+# TESTS
+# =============================================================================
+def test_share_copy_publishes_selection(share_copy, hou, share_dir):
+    copy_nodes(share_copy, hou, 'Sop', ['box1', 'xform1'])
+
+    snippets = store.SnippetStore(share_dir).list_snippets()
+    assert len(snippets) == 1
+    snippet = snippets[0]
+    assert (snippet.user, snippet.category, snippet.nodes) == ('amychu', 'Sop', 2)
+    assert read_snippet(store.SnippetStore(share_dir), snippet.name) == b'box1\nxform1\nnetbox1'
+    assert not hou.messages
+
+
+def test_share_copy_without_selection(share_copy, hou, share_dir):
+    share_copy.share_copy()
+
+    assert hou.messages == ['Please select node(s).']
+    assert store.SnippetStore(share_dir).list_snippets() == []
+
+
+def test_get_share_files_lists_versions(share_copy, hou):
+    copy_nodes(share_copy, hou, 'Sop', ['box1'])
+    copy_nodes(share_copy, hou, 'Sop', ['box1', 'xform1'])
+    copy_nodes(share_copy, hou, 'Driver', ['mantra1'])
+
+    widget = get_paste_widget(share_copy, 'Sop')
+    items = widget.get_share_files()
+
+    assert items == ['amychu: Sop, 2 nodes (0 seconds)', '    amychu: Sop, 1 nodes (0 seconds, -1)']
+    latest, older = [widget.remap[item] for item in items]
+    assert store.parse_snippet_name(latest)[2] > store.parse_snippet_name(older)[2]
+    assert get_paste_widget(share_copy, 'Driver').get_share_files() == ['amychu: Rop, 1 nodes (0 seconds)']
+
+
+def test_stale_index_is_rebuilt(share_copy, hou, share_dir):
+    copy_nodes(share_copy, hou, 'Sop', ['box1'])
+    snippet_store = store.SnippetStore(share_dir)
+    # A snippet written in place by an older share_copy, not indexed.
+    with open(os.path.join(share_dir, 'bob_Sop.cpio'), 'wb') as snippet_file:
+        snippet_file.write(b'grid1')
+    # The index mtime is not used: a skewed clock does not hide the change.
+    future = time.time() + 3600
+    os.utime(snippet_store.index_path, (future, future))
+
+    items = get_paste_widget(share_copy, 'Sop').get_share_files()
+
+    assert 'bob: Sop (0 seconds)' in items
+    names = [json.loads(line).get('name') for line in read_index_lines(snippet_store)]
+    assert 'bob_Sop.cpio' in names
+    assert read_snippet(snippet_store, 'bob_Sop.cpio') == b'grid1'
+
+
+def test_index_is_append_only(share_copy, hou, share_dir):
+    copy_nodes(share_copy, hou, 'Sop', ['box1'])
+    snippet_store = store.SnippetStore(share_dir)
+    before = read_index_lines(snippet_store)
+
+    copy_nodes(share_copy, hou, 'Object', ['geo1'])
+    after = read_index_lines(snippet_store)
+
+    assert after[:len(before)] == before
+    assert len(after) > len(before)
+    assert len(store.SnippetStore(share_dir).list_snippets()) == 2
+
+
+def test_index_reads_skip_torn_and_deleted_records(share_copy, hou, share_dir):
+    copy_nodes(share_copy, hou, 'Sop', ['box1'])
+    copy_nodes(share_copy, hou, 'Object', ['geo1'])
+    snippet_store = store.SnippetStore(share_dir)
+    sop, obj = sorted(snippet.name for snippet in snippet_store.list_snippets())
+    snippet_store.touch(obj)
+    with open(snippet_store.index_path, 'a') as index_file:
+        index_file.write(json.dumps({'name': sop, 'deleted': True}) + '\n')
+        # Cut short by a writer killed mid-write.
+        index_file.write('{"name": "amychu_Sop.1')
+
+    snippets, _, _ = snippet_store.read_index()
+
+    assert list(snippets) == [obj]
+    assert snippets[obj].used is not None
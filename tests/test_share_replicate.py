@@ -0,0 +1,125 @@
+"""Replication of a share directory to local directories standing in for
+the other sites.
+"""
+# Built-in
+import hashlib
+import os
+import sys
+
+import pytest
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, REPO_ROOT)
+
+from share_copy import replicate
+from share_copy.store import SnippetStore
+
+
+# =============================================================================
+# FIXTURES
+# =============================================================================
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / 'source'
+    path.mkdir()
+    return str(path)
+
+
+@pytest.fixture
+def site(tmp_path):
+    path = tmp_path / 'site'
+    path.mkdir()
+    return str(path)
+
+
+def publish(root, user, payload):
+    def write(path):
+        with open(path, 'wb') as snippet_file:
+            snippet_file.write(payload)
+    return SnippetStore(root).publish(user, 'Sop', write)
+
+
+def read_snippet(root, name):
+    path, temporary = SnippetStore(root).extract(name)
+    with open(path, 'rb') as snippet_file:
+        data = snippet_file.read()
+    if temporary:
+        os.remove(path)
+    return data
+
+
+def get_pending(root, site_root):
+    queue = replicate.TransferQueue(os.path.join(root, replicate.QUEUE_DIR,
+                                                 replicate.get_site_id(site_root) + '.ndjson'))
+    queue.open()
+    try:
+        return queue.pending()
+    finally:
+        queue.close()
+
+
+# =============================================================================
+# TESTS
+# =============================================================================
+def test_replicate_snippets(source, site):
+    payloads = {publish(source, user, (user * 5000).encode('ascii')).name: (user * 5000).encode('ascii')
+                for user in ('amychu', 'bob')}
+
+    result, = replicate.replicate(source, [site])
+
+    assert not result.failures
+    assert sorted(snippet.name for snippet in SnippetStore(site).list_snippets()) == sorted(payloads)
+    for name, payload in payloads.items():
+        assert read_snippet(site, name) == payload
+    assert get_pending(source, site) == []
+
+
+def test_failing_file_does_not_stop_the_others(source, site, monkeypatch):
+    bad = publish(source, 'amychu', b'box1' * 5000)
+    good = publish(source, 'bob', b'grid1' * 5000)
+    bad_object = replicate.get_object_file(bad.object_name)
+    assemble = replicate.Site.assemble
+
+    def failing_assemble(self, name, *args, **kwargs):
+        if name == bad_object:
+            raise OSError(28, 'No space left on device')
+        return assemble(self, name, *args, **kwargs)
+    monkeypatch.setattr(replicate.Site, 'assemble', failing_assemble)
+
+    result, = replicate.replicate(source, [site])
+
+    assert [name for name, _ in result.failures] == [bad_object, bad.name]
+    assert [snippet.name for snippet in SnippetStore(site).list_snippets()] == [good.name]
+    assert get_pending(source, site) == sorted([bad_object, bad.name])
+
+    # The next run sends what is left.
+    monkeypatch.setattr(replicate.Site, 'assemble', assemble)
+    result, = replicate.replicate(source, [site])
+
+    assert not result.failures
+    assert read_snippet(site, bad.name) == b'box1' * 5000
+    assert get_pending(source, site) == []
+
+
+def test_chunk_changed_at_the_site_is_sent_again(source, site):
+    payload = b''.join(hashlib.sha1(str(index).encode('ascii')).digest() for index in range(4000))
+    first = publish(source, 'amychu', payload)
+    replicate.replicate(source, [site])
+    # The object of the first snippet rewritten at the site: its chunks are
+    # no longer where the catalog says.
+    object_file = replicate.get_object_file(first.object_name)
+    compressor = replicate.get_compressor(replicate.get_codec(object_file))
+    with open(replicate.get_path(site, object_file), 'wb') as object_file_handle:
+        object_file_handle.write(compressor.compress(b'\0' * len(payload)) + compressor.flush())
+
+    second = publish(source, 'bob', payload + b'edit')
+    result, = replicate.replicate(source, [site])
+
+    assert not result.failures
+    assert read_snippet(site, second.name) == payload + b'edit'
+    assert result.sent_bytes > 0
+    assert get_pending(source, site) == []
+    # The rewritten object is no longer in the catalog.
+    site_catalog = replicate.Site(site)
+    site_catalog.load()
+    assert object_file not in site_catalog.files
@@ -0,0 +1,103 @@
+"""Frame verifier: bad frames are found from their header and last bytes.
+"""
+# Built-in
+import os
+import struct
+import sys
+
+import pytest
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, REPO_ROOT)
+
+from renumber_images_tool.core.verifier import EXR_MAGIC, JPEG_END, JPEG_MAGIC, PNG_END, PNG_MAGIC, verify_paths
+
+
+def make_exr(lines=4, line_size=64):
+    """
+    Returns:
+        bytes: uncompressed scanline OpenEXR file, one chunk per line
+    """
+    def attribute(name, type_name, value):
+        return name + b'\0' + type_name + b'\0' + struct.pack('<i', len(value)) + value
+
+    header = (EXR_MAGIC + struct.pack('<i', 2) +
+              attribute(b'compression', b'compression', b'\0') +
+              attribute(b'dataWindow', b'box2i', struct.pack('<4i', 0, 0, 15, lines - 1)) + b'\0')
+    chunks_start = len(header) + lines * 8
+    chunk_size = 8 + line_size
+    offsets = struct.pack('<{}q'.format(lines), *(chunks_start + line * chunk_size for line in range(lines)))
+    chunks = b''.join(struct.pack('<ii', line, line_size) + b'\x01' * line_size for line in range(lines))
+    return header + offsets + chunks
+
+
+def make_tiff(entries=3):
+    return b'II*\x00' + struct.pack('<I', 8) + struct.pack('<H', entries) + b'\0' * (entries * 12 + 4)
+
+
+FRAMES = {
+    'exr': make_exr(),
+    'png': PNG_MAGIC + b'\0' * 100 + PNG_END,
+    'jpg': JPEG_MAGIC + b'\0' * 100 + JPEG_END,
+    'tif': make_tiff(),
+}
+
+
+@pytest.mark.parametrize('ext', sorted(FRAMES))
+def test_complete_frames_pass(tmp_path, ext):
+    path = str(tmp_path / 'shot.1001.{}'.format(ext))
+    with open(path, 'wb') as frame_file:
+        frame_file.write(FRAMES[ext])
+
+    assert verify_paths([path]) == {}
+
+
+@pytest.mark.parametrize('ext, cut, problem', [
+    ('exr', 10, 'truncated'),
+    ('exr', len(FRAMES['exr']) - 30, 'truncated header'),
+    ('png', 4, 'truncated, no IEND chunk'),
+    ('jpg', 1, 'truncated, no end of image marker'),
+    ('tif', 2, 'truncated directory'),
+])
+def test_truncated_frames_fail(tmp_path, ext, cut, problem):
+    path = str(tmp_path / 'shot.1001.{}'.format(ext))
+    with open(path, 'wb') as frame_file:
+        frame_file.write(FRAMES[ext][:-cut])
+
+    assert verify_paths([path]) == {path: problem}
+
+
+def test_jpeg_padded_with_zeros_passes(tmp_path):
+    path = str(tmp_path / 'shot.1001.jpg')
+    with open(path, 'wb') as frame_file:
+        frame_file.write(FRAMES['jpg'] + b'\0' * 16)
+
+    assert verify_paths([path]) == {}
+
+
+def test_empty_and_wrong_format_frames_fail(tmp_path):
+    paths = {}
+    for name, data in (('empty.1.exr', b''), ('png.1.exr', FRAMES['png']), ('exr.1.png', FRAMES['exr']),
+                       ('exr.1.tif', FRAMES['exr'])):
+        paths[name] = str(tmp_path / name)
+        with open(paths[name], 'wb') as frame_file:
+            frame_file.write(data)
+
+    assert verify_paths(sorted(paths.values())) == {
+        paths['empty.1.exr']: 'empty',
+        paths['png.1.exr']: 'not an OpenEXR file',
+        paths['exr.1.png']: 'not a PNG file',
+        paths['exr.1.tif']: 'not a TIFF file',
+    }
+
+
+def test_many_frames_are_checked_in_batches(tmp_path):
+    paths = []
+    for frame in range(1200):
+        paths.append(str(tmp_path / 'shot.{}.png'.format(frame)))
+        with open(paths[-1], 'wb') as frame_file:
+            frame_file.write(FRAMES['png'] if frame % 100 else FRAMES['png'][:-1])
+
+    problems = verify_paths(paths, jobs=4)
+
+    assert sorted(problems) == sorted(paths[::100])
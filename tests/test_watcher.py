@@ -0,0 +1,229 @@
+"""Watch mode against a writer dropping frames while the watcher runs.
+"""
+# Built-in
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, REPO_ROOT)
+
+from renumber_images_tool.core import journal, watcher
+
+BATCH_WINDOW = 0.2
+POLL_INTERVAL = 0.05
+TIMEOUT = 10.0
+
+
+# =============================================================================
+# FUNCTIONS
+# =============================================================================
+def write_frame(folder_path, name, via_temp=False):
+    """Write a frame the way renderers do: in place, or to a hidden
+    temporary name then renamed.
+    """
+    path = os.path.join(folder_path, name)
+    temp_path = os.path.join(folder_path, '.{}.part'.format(name)) if via_temp else path
+    with open(temp_path, 'w') as frame_file:
+        frame_file.write(name)
+    if via_temp:
+        os.rename(temp_path, path)
+
+
+def read_folder(folder_path):
+    """
+    Returns:
+        dict: content by name of the visible files
+    """
+    contents = {}
+    for name in os.listdir(folder_path):
+        path = os.path.join(folder_path, name)
+        if not name.startswith('.') and os.path.isfile(path):
+            with open(path) as frame_file:
+                contents[name] = frame_file.read()
+    return contents
+
+
+def wait_for(condition, timeout=TIMEOUT):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(POLL_INTERVAL)
+    return condition()
+
+
+# =============================================================================
+# FIXTURES
+# =============================================================================
+@pytest.fixture
+def journal_dir(tmp_path, monkeypatch):
+    path = str(tmp_path / 'journals')
+    monkeypatch.setattr(journal, 'JOURNAL_DIR', path)
+    return path
+
+
+@pytest.fixture
+def watch(tmp_path, journal_dir):
+    """
+    Start watch_folder on a thread, stopped at the end of the test.
+    """
+    folder_path = str(tmp_path / 'renders')
+    os.mkdir(folder_path)
+    batches = []
+    errors = []
+    stop_event = threading.Event()
+    thread_errors = []
+    threads = []
+
+    def start():
+        def run():
+            try:
+                watcher.watch_folder(folder_path, batch_window=BATCH_WINDOW, poll_interval=POLL_INTERVAL,
+                                     callback=lambda result, path: batches.append((result, path)),
+                                     error_callback=lambda path, error: errors.append((path, error)),
+                                     stop_event=stop_event)
+            except Exception as error:
+                thread_errors.append(error)
+        thread = threading.Thread(target=run)
+        thread.start()
+        threads.append(thread)
+
+    state = {'folder': folder_path, 'batches': batches, 'errors': errors, 'start': start}
+    yield state
+    stop_event.set()
+    for thread in threads:
+        thread.join(TIMEOUT)
+    assert not thread_errors
+
+
+# =============================================================================
+# TESTS
+# =============================================================================
+def test_watch_renumbers_dropped_frames(watch):
+    folder_path = watch['folder']
+    for frame in (1001, 1002, 1003):
+        write_frame(folder_path, 'shot.{}.exr'.format(frame))
+    watch['start']()
+    assert wait_for(lambda: sorted(read_folder(folder_path)) == ['shot.0001.exr', 'shot.0002.exr',
+                                                                 'shot.0003.exr'])
+
+    # Frames landing out of order, one before every frame re-numbered.
+    write_frame(folder_path, 'shot.1006.exr', via_temp=True)
+    write_frame(folder_path, 'shot.1004.exr')
+    write_frame(folder_path, 'shot.1005.exr', via_temp=True)
+    write_frame(folder_path, 'shot.1000.exr')
+
+    expected = {'shot.{:04d}.exr'.format(rank + 1): 'shot.{}.exr'.format(frame)
+                for rank, frame in enumerate(range(1000, 1007))}
+    # The callback of a batch comes after its renames.
+    assert wait_for(lambda: read_folder(folder_path) == expected and len(watch['batches']) >= 2)
+    assert not watch['errors']
+    # Every batch is journaled.
+    assert all(os.path.isfile(path) for _, path in watch['batches'])
+
+
+def test_watch_batch_can_be_undone(watch):
+    folder_path = watch['folder']
+    write_frame(folder_path, 'shot.1001.exr')
+    watch['start']()
+    assert wait_for(lambda: 'shot.0001.exr' in read_folder(folder_path))
+    write_frame(folder_path, 'shot.1000.exr')
+    assert wait_for(lambda: len(watch['batches']) == 2 and sorted(read_folder(folder_path)) == [
+        'shot.0001.exr', 'shot.0002.exr'])
+
+    journal.undo_journal(watch['batches'][-1][1])
+
+    assert read_folder(folder_path) == {'shot.1000.exr': 'shot.1000.exr', 'shot.0001.exr': 'shot.1001.exr'}
+
+
+def test_watch_skips_failing_arrival(watch):
+    folder_path = watch['folder']
+    for frame in (1001, 1002):
+        write_frame(folder_path, 'shot.{}.exr'.format(frame))
+    watch['start']()
+    assert wait_for(lambda: sorted(read_folder(folder_path)) == ['shot.0001.exr', 'shot.0002.exr'])
+
+    # The next new frame of shot cannot be renamed: its name is taken.
+    os.mkdir(os.path.join(folder_path, 'shot.0003.exr'))
+    write_frame(folder_path, 'shot.1003.exr')
+    write_frame(folder_path, 'other.0010.exr')
+    assert wait_for(lambda: watch['errors'] and 'other.0001.exr' in read_folder(folder_path))
+
+    # The watch goes on.
+    write_frame(folder_path, 'other.0011.exr')
+    assert wait_for(lambda: 'other.0002.exr' in read_folder(folder_path))
+    assert [path for path, _ in watch['errors']] == [os.path.join(folder_path, 'shot.1003.exr')]
+    assert read_folder(folder_path)['shot.1003.exr'] == 'shot.1003.exr'
+
+
+def test_watch_holds_frames_the_renderer_may_write(watch):
+    folder_path = watch['folder']
+    for frame in (1, 2, 3):
+        write_frame(folder_path, 'shot.{:04d}.exr'.format(frame))
+    watch['start']()
+
+    # Renamed to shot.0004.exr, the renderer would overwrite it next.
+    write_frame(folder_path, 'shot.0005.exr')
+    time.sleep(BATCH_WINDOW * 3)
+    assert sorted(read_folder(folder_path)) == ['shot.0001.exr', 'shot.0002.exr', 'shot.0003.exr',
+                                                'shot.0005.exr']
+
+    write_frame(folder_path, 'shot.0004.exr')
+    time.sleep(BATCH_WINDOW * 3)
+    assert read_folder(folder_path) == {'shot.{:04d}.exr'.format(frame): 'shot.{:04d}.exr'.format(frame)
+                                        for frame in range(1, 6)}
+    # Every frame is at its new name already, nothing is renamed.
+    assert not watch['batches']
+    assert not watch['errors']
+
+
+def write_frames(folder_path, names):
+    for name in names:
+        write_frame(folder_path, name)
+    return names
+
+
+def plan_index(index, names):
+    renames, pending = index.plan_arrivals(names)
+    index.commit(pending)
+    return sorted((os.path.basename(old), os.path.basename(new)) for old, new in renames)
+
+
+@pytest.mark.parametrize('start, frames, held', [
+    # Frame 5 would take the name of frame 4, not rendered yet.
+    (1, [1, 2, 3, 5], [5]),
+    # A render from 1001 kept at its numbers, frame 1003 failed.
+    (1001, [1001, 1002, 1004, 1005], [1004, 1005]),
+])
+def test_index_holds_names_shared_with_the_renderer(tmp_path, start, frames, held):
+    folder_path = str(tmp_path)
+    index = watcher.SequenceIndex(folder_path, start=start, padding=4)
+    names = write_frames(folder_path, ['shot.{:04d}.exr'.format(frame) for frame in frames])
+
+    assert plan_index(index, names) == []
+    assert sorted(frame for frame, _, _ in index.get('shot.', '', '.exr').held.values()) == held
+
+    # Once the missing frame lands, every frame is at its new name.
+    missing = [frame for frame in range(start, start + len(frames) + 1) if frame not in frames]
+    assert plan_index(index, write_frames(folder_path, ['shot.{:04d}.exr'.format(missing[0])])) == []
+    watched = index.get('shot.', '', '.exr')
+    assert not watched.held
+    assert list(watched.originals) == list(range(start, start + len(frames) + 1))
+
+
+def test_index_renames_frames_named_apart_from_the_new_ones(tmp_path):
+    folder_path = str(tmp_path)
+    index = watcher.SequenceIndex(folder_path, start=1, padding=4)
+    names = write_frames(folder_path, ['shot.{}.exr'.format(frame) for frame in (5, 7)] +
+                         ['plate.{}.exr'.format(frame) for frame in (1001, 1003)])
+
+    # Unpadded frames never take the names of the new frames, nor frames
+    # numbered above them.
+    assert plan_index(index, names) == [('plate.1001.exr', 'plate.0001.exr'),
+                                        ('plate.1003.exr', 'plate.0002.exr'),
+                                        ('shot.5.exr', 'shot.0001.exr'),
+                                        ('shot.7.exr', 'shot.0002.exr')]